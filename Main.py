@@ -1,88 +1,206 @@
+import re
+import time
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
+from psycopg2 import sql
 import pandas as pd
+import db
+import query_cache
 from export_excel import export_to_excel
 
-DB_NAME = "techno_events_db"
-DB_USER = "postgres"
-DB_PASSWORD = "0000"
-DB_HOST = "localhost"
-DB_PORT = "5432"
+CHUNK_SIZE = 50_000
+
+# Columns left out of the Excel report: embedded player HTML (iframes) is large and useless in a sheet
+EXCLUDED_EXPORT_COLUMNS = {
+    "artists": {"spotify", "soundcloud", "youtube"},
+}
 
 def fetch_table_as_df(table_name):
     """Забирает данные из таблицы и возвращает DataFrame"""
-    connection = None
     try:
-        connection = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
         query = f"SELECT * FROM {table_name};"
-        df = pd.read_sql(query, connection)
-        return df
+        return query_cache.cached_query(query)
     except Exception as e:
         print(f"Error fetching {table_name}: {e}")
         return pd.DataFrame()
-    finally:
-        if connection is not None:
-            connection.close()
+
+def export_columns(table_name):
+    """Возвращает колонки таблицы для выгрузки (без исключённых)"""
+    excluded = EXCLUDED_EXPORT_COLUMNS.get(table_name, set())
+    with db.get_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = 'public' AND table_name = %s ORDER BY ordinal_position",
+                (table_name,)
+            )
+            return [row[0] for row in cursor.fetchall() if row[0].lower() not in excluded]
+
+def downcast(df):
+    """Уменьшает типы колонок чанка: int/float до минимальной разрядности, повторяющиеся строки в category"""
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="float")
+        elif series.dtype == object and len(series) and series.nunique() < len(series) / 2:
+            df[column] = series.astype("category")
+    return df
+
+def fetch_table_chunks(table_name, columns=None, chunksize=CHUNK_SIZE):
+    """Читает таблицу по частям через серверный (named) курсор и отдаёт DataFrame-чанки"""
+    projection = sql.SQL(", ").join(map(sql.Identifier, columns)) if columns else sql.SQL("*")
+    query = sql.SQL("SELECT {} FROM {}").format(projection, sql.Identifier(table_name))
+    with db.get_connection() as connection:
+        # A named cursor keeps the result on the server; only one chunk is in memory at a time
+        with connection.cursor(name=f"export_{table_name}") as cursor:
+            cursor.itersize = chunksize
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                names = [desc[0] for desc in cursor.description]
+                yield downcast(pd.DataFrame.from_records(rows, columns=names))
+
+def stream_table(table_name, chunksize=CHUNK_SIZE):
+    """Возвращает поток чанков таблицы или None, если таблица пустая или недоступна"""
+    try:
+        chunks = fetch_table_chunks(table_name, export_columns(table_name), chunksize)
+        first = next(chunks)
+    except StopIteration:
+        return None
+    except Exception as e:
+        print(f"Error fetching {table_name}: {e}")
+        return None
+    return itertools.chain([first], chunks)
+
+def split_queries(sql_content):
+    return [q.strip() for q in sql_content.split(";") if q.strip()]
 
 def execute_queries_from_file(file_path):
-    connection = None
-    cursor = None
     try:
-        connection = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = connection.cursor()
-        print("Connected to database successfully!")
-
-        # Read SQL file safely
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-            sql_content = file.read()
-
-        queries = [q.strip() for q in sql_content.split(";") if q.strip()]
-
-        for i, query in enumerate(queries, start=1):
-            print(f"\nExecuting Query {i}:")
-            cursor.execute(query)
-            try:
-                results = cursor.fetchall()
-                for row in results:
-                    print(row)
-            except psycopg2.ProgrammingError:
-                print("Query executed successfully (no results to display).")
+        with db.get_connection() as connection:
+            cursor = connection.cursor()
+            print("Connected to database successfully!")
+
+            # Read SQL file safely
+            with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+                sql_content = file.read()
+
+            queries = split_queries(sql_content)
 
-        connection.commit()
+            for i, query in enumerate(queries, start=1):
+                print(f"\nExecuting Query {i}:")
+                cursor.execute(query)
+                try:
+                    results = cursor.fetchall()
+                    for row in results:
+                        print(row)
+                except psycopg2.ProgrammingError:
+                    print("Query executed successfully (no results to display).")
+
+            connection.commit()
+            cursor.close()
+        print("\nConnection returned to pool.")
 
     except Exception as e:
         print("Error:", e)
 
-    finally:
-        if cursor is not None:
-            cursor.close()
-        if connection is not None:
-            connection.close()
-            print("\nConnection closed.")
+def is_read_only(query):
+    """SELECT/WITH без изменяющих данные команд можно выполнять параллельно"""
+    body = re.sub(r"--[^\n]*", " ", query).strip()
+    if not re.match(r"(SELECT|WITH)\b", body, re.IGNORECASE):
+        return False
+    return not re.search(r"\b(INSERT|UPDATE|DELETE|MERGE|CREATE|ALTER|DROP|TRUNCATE|GRANT)\b", body, re.IGNORECASE)
 
-if __name__ == "__main__":
-    """execute_queries_from_file("queries.sql")"""
+def run_report_query(task):
+    """Выполняет один запрос на своём соединении из пула и возвращает DataFrame с метриками"""
+    number, query, read_only = task
+    start = time.perf_counter()
+    if read_only and db.QUERY_BACKEND == "duckdb":
+        # Отчётные SELECT выполняются на Parquet-снимке, основная база не нагружается
+        df = db.run_query(query)
+        return number, df, time.perf_counter() - start
+    with db.get_connection() as connection:
+        with connection.cursor() as cursor:
+            if read_only:
+                cursor.execute("SET TRANSACTION READ ONLY")
+            cursor.execute(query)
+            if cursor.description is not None:
+                df = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+            else:
+                df = pd.DataFrame()
+        if not read_only:
+            connection.commit()
+    elapsed = time.perf_counter() - start
+    return number, df, elapsed
+
+def run_queries_concurrently(file_path, jobs=4):
+    """Выполняет запросы из SQL-файла: подряд идущие SELECT параллельно (до jobs соединений), остальные по очереди"""
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+        queries = split_queries(file.read())
 
-    tables = ["artists", "events"]
+    batches = []
+    for number, query in enumerate(queries, start=1):
+        read_only = is_read_only(query)
+        if read_only and batches and batches[-1][0][2]:
+            batches[-1].append((number, query, True))
+        else:
+            batches.append([(number, query, read_only)])
 
-    dataframes_dict = {}
-    for table in tables:
-        df = fetch_table_as_df(table)
-        if not df.empty:
-            dataframes_dict[table.capitalize()] = df
+    results = {}
+    stats = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for batch in batches:
+            try:
+                for number, df, elapsed in executor.map(run_report_query, batch):
+                    results[number] = df
+                    stats.append((number, elapsed, len(df), int(df.memory_usage(deep=True).sum())))
+            except Exception as e:
+                print(f"Error in batch starting at query {batch[0][0]}: {e}")
+                break
+    wall_time = time.perf_counter() - start
 
-    if dataframes_dict:
-        export_to_excel(dataframes_dict, "report.xlsx")
+    for number, elapsed, rows, size_bytes in sorted(stats):
+        print(f"Query {number:>2}: {elapsed * 1000:8.1f} ms | {rows:>7} rows | {size_bytes / 1024:8.1f} KB")
+    print(f"Ran {len(stats)} of {len(queries)} queries in {wall_time * 1000:.1f} ms "
+          f"(sum of query times {sum(s[1] for s in stats) * 1000:.1f} ms, jobs={jobs})")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export tables to Excel or run the report queries")
+    parser.add_argument("--queries", metavar="FILE",
+                        help="run the queries in FILE (e.g. queries.sql) instead of the Excel export")
+    parser.add_argument("--jobs", type=int, default=4, help="concurrent read-only queries (with --queries)")
+    parser.add_argument("--sequential", action="store_true",
+                        help="with --queries: run them one by one on a single cursor and print every row")
+    args = parser.parse_args()
+
+    if args.queries:
+        if args.sequential:
+            execute_queries_from_file(args.queries)
+        else:
+            for number, df in run_queries_concurrently(args.queries, args.jobs).items():
+                print(f"\nQuery {number}:")
+                print(df.to_string(index=False))
     else:
-        print("No data fetched from database.")
+        tables = ["artists", "events"]
+
+        # Chunks flow straight from the server-side cursors into the Excel writer
+        dataframes_dict = {}
+        for table in tables:
+            chunks = stream_table(table)
+            if chunks is not None:
+                dataframes_dict[table.capitalize()] = chunks
+
+        if dataframes_dict:
+            export_to_excel(dataframes_dict, "report.xlsx")
+        else:
+            print("No data fetched from database.")
+
+    db.print_acquire_stats()
@@ -1,139 +1,237 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import matplotlib.pyplot as plt
-from sqlalchemy import create_engine
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+import db
+import chart_cache
+import query_cache
+import kpi_summary
 
-# Database connection details
-DB_NAME = "techno_events_db"
-DB_USER = "postgres"
-DB_PASSWORD = "0000"
-DB_HOST = "localhost"
-DB_PORT = "5432"
+CHARTS_DIR = "charts"
 
-engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-
-# Helper function to run queries
+# Helper function to run queries (cached, on the shared connection pool)
 def run_query(query):
-    return pd.read_sql(query, engine)
+    return query_cache.cached_query(query)
+
+# Chart renderers: each builds its own Figure (no pyplot global state), so they can run in any process
 
 # Helper function to save simple charts
 def save_chart(df, kind, title, xlabel, ylabel, filename, **kwargs):
-    ax = df.plot(kind=kind, **kwargs)
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.tight_layout()
-    plt.savefig(f"charts/{filename}")
-    plt.close()
-    print(f"✅ Saved {kind} chart: {title}\n   Rows: {len(df)} | File: charts/{filename}\n")
-
-def generate_charts():
-    # 1. Pie chart: Events distribution by country
-    df = run_query("""
-        SELECT c.name AS country, COUNT(*) AS event_count
-        FROM events e
-        JOIN locations l ON e.location_id = l.id
-        JOIN countries c ON l.country_id = c.id
-        GROUP BY c.name
-        ORDER BY event_count DESC;
-    """)
-    df.set_index("country")["event_count"].plot.pie(autopct='%1.1f%%')
-    plt.title("Events Distribution by Country")
-    plt.ylabel("")
-    plt.tight_layout()
-    plt.savefig("charts/events_by_country.png")
-    plt.close()
-    print(f"✅ Saved pie chart: Events Distribution by Country\n   Rows: {len(df)} | File: charts/events_by_country.png\n")
-
-    # 2. Bar chart: Top 10 Artists by Performances
-    df = run_query("""
-        SELECT a.name, COUNT(ea.id) AS performances
-        FROM eventartists ea
-        JOIN artists a ON ea.artist_id = a.id
-        JOIN events e ON ea.event_id = e.id
-        GROUP BY a.id, a.name
-        ORDER BY performances DESC
-        LIMIT 10;
-    """)
-    save_chart(df.set_index("name"), "bar", "Top 10 Artists by Performances", "Artists", "Performances", "top_artists.png")
-
-    # 3. Horizontal bar chart: Average Event Rating by Country
-    df = run_query("""
-        SELECT c.name AS country, ROUND(AVG(eh.rate), 2) AS avg_rating
-        FROM eventhistory eh
-        JOIN events e ON eh.event_id = e.id
-        JOIN locations l ON e.location_id = l.id
-        JOIN countries c ON l.country_id = c.id
-        WHERE eh.rate IS NOT NULL
-        GROUP BY c.name
-        ORDER BY avg_rating DESC;
-    """)
-    save_chart(df.set_index("country"), "barh", "Average Event Rating by Country", "Avg Rating", "Country", "avg_rating_country.png")
-
-    # 4. Line chart: Attendance by Day of the Week
-    df = run_query("""
-        SELECT TO_CHAR(e.date, 'Dy') AS day_of_week,
-               COUNT(eh.id) FILTER (WHERE eh.has_attended) AS total_attendances
-        FROM events e
-        LEFT JOIN eventhistory eh ON eh.event_id = e.id
-        JOIN locations l ON e.location_id = l.id
-        JOIN countries c ON l.country_id = c.id
-        GROUP BY TO_CHAR(e.date, 'Dy'), EXTRACT(DOW FROM e.date)
-        ORDER BY EXTRACT(DOW FROM e.date);
-    """)
-    save_chart(df.set_index("day_of_week"), "line", "Attendance by Day of the Week", "Day", "Attendances", "attendance_by_day.png", marker="o")
-
-    # 5. Top Countries by Attendance and Average Rating
-    df = run_query("""
-                   SELECT c.name                                      AS country,
-                          COUNT(e.id)                                 AS total_events,
-                          COUNT(CASE WHEN eh.has_attended THEN 1 END) AS total_attendance,
-                          ROUND(AVG(eh.rate), 2)                      AS avg_rating
-                   FROM events e
-                            JOIN locations l ON e.location_id = l.id
-                            JOIN countries c ON l.country_id = c.id
-                            LEFT JOIN eventhistory eh ON e.id = eh.event_id
-                   GROUP BY c.name
-                   ORDER BY total_attendance DESC, avg_rating DESC LIMIT 10;
-                   """)
-
-    fig, ax1 = plt.subplots(figsize=(10, 6))
+    fig = Figure()
+    ax = fig.subplots()
+    df.plot(kind=kind, ax=ax, **kwargs)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    fig.tight_layout()
+    fig.savefig(os.path.join(CHARTS_DIR, filename))
+
+def save_pie_chart(df, title, filename):
+    fig = Figure()
+    ax = fig.subplots()
+    df["event_count"].plot.pie(ax=ax, autopct='%1.1f%%')
+    ax.set_title(title)
+    ax.set_ylabel("")
+    fig.tight_layout()
+    fig.savefig(os.path.join(CHARTS_DIR, filename))
+
+def save_attendance_rating_chart(df, title, filename):
+    fig = Figure(figsize=(10, 6))
+    ax1 = fig.subplots()
 
     # Bar chart: total attendance
     ax1.bar(df["country"], df["total_attendance"], color="skyblue", label="Total Attendance")
     ax1.set_xlabel("Country")
     ax1.set_ylabel("Total Attendance", color="blue")
+    ax1.tick_params(axis="x", labelrotation=45)
 
     # Line chart: average rating
     ax2 = ax1.twinx()
     ax2.plot(df["country"], df["avg_rating"], color="red", marker="o", label="Avg Rating")
     ax2.set_ylabel("Average Rating", color="red")
 
-    plt.title("Top Countries by Attendance and Average Rating")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig("charts/top_countries_attendance_rating.png")
-    plt.close()
-    print(
-        f"✅ Saved chart: Top Countries by Attendance and Average Rating\n   Rows: {len(df)} | File: charts/top_countries_attendance_rating.png\n")
-
-    # 6. Scatter plot: Ratings over Time (attendance highlighted)
-    df = run_query("""
-        SELECT e.date, eh.rate, eh.has_attended
-        FROM eventhistory eh
-        JOIN events e ON eh.event_id = e.id
-        WHERE eh.rate IS NOT NULL;
-    """)
-    plt.figure(figsize=(10, 6))
-    colors = df["has_attended"].map({True: "green", False: "red"})
-    plt.scatter(df["date"], df["rate"], c=colors, alpha=0.6)
-    plt.title("Scatter: Ratings Over Time (Attendance Highlighted)")
-    plt.xlabel("Event Date")
-    plt.ylabel("Rating")
-    plt.tight_layout()
-    plt.savefig("charts/scatter_ratings_over_time.png")
-    plt.close()
-    print(f"✅ Saved scatter plot: Ratings over Time\n   Rows: {len(df)} | File: charts/scatter_ratings_over_time.png\n")
+    ax1.set_title(title)
+    fig.tight_layout()
+    fig.savefig(os.path.join(CHARTS_DIR, filename))
 
+def save_scatter_chart(df, title, filename):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    colors = df["has_attended"].map({True: "green", False: "red"})
+    ax.scatter(df["date"], df["rate"], c=colors, alpha=0.6)
+    ax.set_title(title)
+    ax.set_xlabel("Event Date")
+    ax.set_ylabel("Rating")
+    fig.tight_layout()
+    fig.savefig(os.path.join(CHARTS_DIR, filename))
+
+# One scan of the fact data at event × rating × attendance grain. Country, genre, date and
+# day of week are attributes of the event, so every chart below is a groupby over this cube.
+CUBE_QUERY = """
+    SELECT e.id AS event_id,
+           e.date AS event_date,
+           c.name AS country,
+           g.name AS genre,
+           eh.rate,
+           eh.has_attended,
+           COUNT(*) AS row_count,
+           COUNT(eh.id) AS history_count,
+           COUNT(eh.id) FILTER (WHERE eh.has_attended) AS attendances
+    FROM events e
+    LEFT JOIN eventhistory eh ON eh.event_id = e.id
+    LEFT JOIN locations l ON e.location_id = l.id
+    LEFT JOIN countries c ON l.country_id = c.id
+    LEFT JOIN genres g ON e.genre_id = g.id
+    GROUP BY e.id, e.date, c.name, g.name, eh.rate, eh.has_attended;
+"""
+
+TOP_ARTISTS_QUERY = """
+    SELECT a.name, COUNT(ea.id) AS performances
+    FROM eventartists ea
+    JOIN artists a ON ea.artist_id = a.id
+    JOIN events e ON ea.event_id = e.id
+    GROUP BY a.id, a.name
+    ORDER BY performances DESC
+    LIMIT 10;
+"""
+
+def build_cube():
+    """Fetches the fact cube and adds the derived columns the chart slices need"""
+    cube = run_query(CUBE_QUERY)
+    cube["event_date"] = pd.to_datetime(cube["event_date"])
+    rated = cube["rate"].notna()
+    cube["rating_count"] = cube["history_count"].where(rated, 0)
+    cube["rating_sum"] = (cube["rate"] * cube["history_count"]).where(rated, 0)
+    # PostgreSQL numbering (Sunday = 0) so weekdays sort like EXTRACT(DOW ...)
+    cube["dow"] = (cube["event_date"].dt.dayofweek + 1) % 7
+    cube["day_of_week"] = cube["event_date"].dt.day_name().str[:3]
+    return cube
+
+def _avg_rating(grouped):
+    return (grouped["rating_sum"] / grouped["rating_count"].where(grouped["rating_count"] > 0)).round(2)
+
+def events_by_country(cube):
+    df = cube[cube["country"].notna()].groupby("country")["event_id"].nunique()
+    return df.rename("event_count").sort_values(ascending=False).reset_index()
+
+def avg_rating_by_country(cube):
+    grouped = cube[cube["country"].notna() & (cube["rating_count"] > 0)].groupby("country")[["rating_sum", "rating_count"]].sum()
+    return _avg_rating(grouped).rename("avg_rating").sort_values(ascending=False).reset_index()
+
+def attendance_by_day(cube):
+    df = cube[cube["country"].notna()].groupby(["dow", "day_of_week"])["attendances"].sum()
+    return df.rename("total_attendances").reset_index().sort_values("dow")[["day_of_week", "total_attendances"]]
+
+def top_countries(cube, limit=10):
+    grouped = cube[cube["country"].notna()].groupby("country").agg(
+        total_events=("row_count", "sum"),
+        total_attendance=("attendances", "sum"),
+        rating_sum=("rating_sum", "sum"),
+        rating_count=("rating_count", "sum"),
+    )
+    grouped["avg_rating"] = _avg_rating(grouped)
+    df = grouped.reset_index()[["country", "total_events", "total_attendance", "avg_rating"]]
+    # NULL ratings first, as ORDER BY ... DESC does in PostgreSQL
+    return df.sort_values(["total_attendance", "avg_rating"], ascending=False, na_position="first").head(limit)
+
+def ratings_over_time(cube):
+    df = cube[cube["rate"].notna()]
+    return df[["event_date", "rate", "has_attended"]].rename(columns={"event_date": "date"})
+
+def chart_tasks(cube, top_artists):
+    """Every chart as (renderer, data, spec); the data is already sliced, so rendering needs no database"""
+    return [
+        # 1. Pie chart: Events distribution by country
+        (save_pie_chart, events_by_country(cube).set_index("country"),
+         {"title": "Events Distribution by Country", "filename": "events_by_country.png"}),
+        # 2. Bar chart: Top 10 Artists by Performances
+        (save_chart, top_artists.set_index("name"),
+         {"kind": "bar", "title": "Top 10 Artists by Performances", "xlabel": "Artists",
+          "ylabel": "Performances", "filename": "top_artists.png"}),
+        # 3. Horizontal bar chart: Average Event Rating by Country
+        (save_chart, avg_rating_by_country(cube).set_index("country"),
+         {"kind": "barh", "title": "Average Event Rating by Country", "xlabel": "Avg Rating",
+          "ylabel": "Country", "filename": "avg_rating_country.png"}),
+        # 4. Line chart: Attendance by Day of the Week
+        (save_chart, attendance_by_day(cube).set_index("day_of_week"),
+         {"kind": "line", "title": "Attendance by Day of the Week", "xlabel": "Day",
+          "ylabel": "Attendances", "filename": "attendance_by_day.png", "marker": "o"}),
+        # 5. Top Countries by Attendance and Average Rating
+        (save_attendance_rating_chart, top_countries(cube),
+         {"title": "Top Countries by Attendance and Average Rating",
+          "filename": "top_countries_attendance_rating.png"}),
+        # 6. Scatter plot: Ratings over Time (attendance highlighted)
+        (save_scatter_chart, ratings_over_time(cube),
+         {"title": "Scatter: Ratings Over Time (Attendance Highlighted)",
+          "filename": "scatter_ratings_over_time.png"}),
+    ]
+
+def render(task):
+    """Renders one chart task and returns how long it took"""
+    renderer, df, spec = task
+    start = time.perf_counter()
+    renderer(df, **spec)
+    return time.perf_counter() - start
+
+def generate_charts(jobs=1, use_cache=True):
+    # Headline KPIs come from the trigger-maintained summary: one row, whatever the history size
+    kpi_summary.print_kpis()
+
+    start = time.perf_counter()
+    cube = build_cube()
+    top_artists = run_query(TOP_ARTISTS_QUERY)
+    print(f"Built analytics cube: {len(cube)} rows in {time.perf_counter() - start:.2f}s\n")
+
+    os.makedirs(CHARTS_DIR, exist_ok=True)
+    tasks = chart_tasks(cube, top_artists)
+
+    # Skip charts whose data and spec are unchanged since they were last rendered
+    manifest = chart_cache.load_manifest() if use_cache else None
+    keys = {}
+    pending = []
+    for task in tasks:
+        renderer, df, spec = task
+        output_path = os.path.join(CHARTS_DIR, spec["filename"])
+        if use_cache:
+            keys[output_path] = chart_cache.chart_key(df, renderer, spec)
+            status = chart_cache.lookup(manifest, keys[output_path], output_path)
+            if status is not None:
+                print(f"⏭ Unchanged chart ({status} from cache): {spec['title']}\n   File: {output_path}\n")
+                continue
+        pending.append(task)
+
+    render_start = time.perf_counter()
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as executor:
+            timings = list(executor.map(render, pending))
+    else:
+        timings = [render(task) for task in pending]
+
+    for (renderer, df, spec), elapsed in zip(pending, timings):
+        output_path = os.path.join(CHARTS_DIR, spec["filename"])
+        if use_cache:
+            chart_cache.store(manifest, keys[output_path], output_path)
+        print(f"✅ Saved chart: {spec['title']}\n"
+              f"   Rows: {len(df)} | File: {output_path} | Render: {elapsed:.2f}s\n")
+
+    if use_cache:
+        evicted = chart_cache.evict(manifest)
+        chart_cache.save_manifest(manifest)
+        if evicted:
+            print(f"Evicted {evicted} old chart variants from the cache")
+    print(f"Rendered {len(pending)} of {len(tasks)} charts in {time.perf_counter() - render_start:.2f}s "
+          f"(sum of chart times {sum(timings):.2f}s, jobs={jobs})")
 
 if __name__ == "__main__":
-    generate_charts()
+    parser = argparse.ArgumentParser(description="Generate the analytics charts into charts/")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes rendering charts in parallel (1 renders in-process)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-render every chart even if its data and spec are unchanged")
+    args = parser.parse_args()
+    generate_charts(args.jobs, not args.no_cache)
+    db.print_acquire_stats()
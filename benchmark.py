@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import time
+import argparse
+import statistics
+import psycopg2
+import db
+import data_import
+import generate_data
+from db_create import create_database
+from tables_create import SCHEMA, load_levels
+from analytics import CUBE_QUERY, TOP_ARTISTS_QUERY
+from Main import split_queries
+
+BENCH_DB = "techno_events_bench"
+BENCH_DIR = "bench"
+QUERIES_FILE = "queries.sql"
+
+# Tables that grow with the scale factor; countries, genres, locations and artists stay fixed
+REPLICATED_TABLES = {"users", "events", "eventhistory", "eventartists", "favoriteartists", "favoritegenres"}
+# Foreign keys pointing into replicated tables move with their copy
+SHIFTED_REFERENCES = {"UserId": "users", "EventId": "events"}
+
+
+def snake_case_schema(schema=SCHEMA):
+    """tables_create.SCHEMA with the snake_case column names the live database and queries.sql use"""
+    def convert(match):
+        name = re.sub(r"(?<=[a-z])(?=[A-Z])", "_", match.group(0)).lower()
+        return {"user_name": "username"}.get(name, name)
+    return re.sub(r"\b[A-Z][a-z]+(?:[A-Z][a-z]+)+\b", convert, schema)
+
+
+def scale_datasets(factor, out_dir, source_dir=data_import.DATASETS_FOLDER):
+    """Writes factor× copies of the fact tables with shifted ids (dimension tables are copied once)"""
+    os.makedirs(out_dir, exist_ok=True)
+    frames = {}
+    for file in sorted(os.listdir(source_dir)):
+        if file.endswith(".csv"):
+            table = os.path.splitext(file)[0].lower()
+            frames[table] = data_import.read_csv_chunks(os.path.join(source_dir, file), table, chunksize=None)
+    id_span = {table: int(df["Id"].max()) for table, df in frames.items()}
+
+    for table, df in frames.items():
+        path = os.path.join(out_dir, f"{table}.csv")
+        copies = factor if table in REPLICATED_TABLES else 1
+        for k in range(copies):
+            chunk = df.copy()
+            if k:
+                chunk["Id"] += k * id_span[table]
+                for column, target in SHIFTED_REFERENCES.items():
+                    if column in chunk.columns:
+                        chunk[column] += k * id_span[target]
+                if "UserName" in chunk.columns:
+                    chunk["UserName"] = chunk["UserName"] + f"_{k}"
+            chunk.to_csv(path, mode="w" if k == 0 else "a", header=k == 0, index=False)
+
+
+def bench_connection(db_name):
+    return psycopg2.connect(dbname=db_name, user=db.DB_USER, password=db.DB_PASSWORD, host=db.DB_HOST, port=db.DB_PORT)
+
+
+def load_scale(db_name, data_dir):
+    """Recreates the schema in the benchmark database and bulk loads data_dir with COPY.
+
+    Foreign keys and secondary indexes are deferred as in data_import.import_data_copy, so rows
+    referencing something the CSVs lack don't abort the load; a file that fails is reported and skipped.
+    """
+    connection = bench_connection(db_name)
+    try:
+        tables = [table for level in load_levels() for table in level]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {', '.join(tables)} CASCADE")
+            cursor.execute(snake_case_schema())
+            deferred = data_import.capture_deferred_constraints(cursor, tables)
+            for drop, _, _ in deferred:
+                cursor.execute(drop)
+        connection.commit()
+
+        for table in tables:
+            path = os.path.join(data_dir, f"{table}.csv")
+            if os.path.exists(path):
+                try:
+                    start = time.perf_counter()
+                    rows = data_import.copy_file(connection, path, table)
+                    data_import.report_throughput(f"{table}.csv", table, rows, os.path.getsize(path),
+                                                  time.perf_counter() - start)
+                except Exception as e:
+                    connection.rollback()
+                    print(f"❌ Error loading {table}.csv: {e}")
+        data_import.rebuild_deferred_constraints(connection, deferred)
+
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    finally:
+        connection.close()
+
+
+def benchmark_queries():
+    """Every query we care about, by a stable name"""
+    with open(QUERIES_FILE, "r", encoding="utf-8", errors="ignore") as file:
+        queries = {f"queries.sql#{i}": query for i, query in enumerate(split_queries(file.read()), start=1)}
+    queries["analytics#cube"] = CUBE_QUERY.strip().rstrip(";")
+    queries["analytics#top_artists"] = TOP_ARTISTS_QUERY.strip().rstrip(";")
+    return queries
+
+
+def plan_shape(node):
+    """Compact plan tree such as Sort(Hash Join(Seq Scan[eventhistory], Hash(Seq Scan[events])))"""
+    label = node["Node Type"]
+    if "Relation Name" in node:
+        label += f"[{node['Relation Name']}]"
+    if "Index Name" in node:
+        label += f"<{node['Index Name']}>"
+    children = node.get("Plans", [])
+    if children:
+        label += "(" + ", ".join(plan_shape(child) for child in children) + ")"
+    return label
+
+
+def explain(cursor, query):
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+    result = cursor.fetchone()[0]
+    return (json.loads(result) if isinstance(result, str) else result)[0]
+
+
+def profile_queries(db_name, repeat=3):
+    """Runs each query `repeat` times under EXPLAIN ANALYZE and keeps the median run"""
+    connection = bench_connection(db_name)
+    connection.autocommit = True
+    results = {}
+    try:
+        with connection.cursor() as cursor:
+            for name, query in benchmark_queries().items():
+                runs = [explain(cursor, query) for _ in range(repeat)]
+                times = [run["Execution Time"] for run in runs]
+                # median_low is always one of the runs, so time, plan and buffers all come from the same run
+                median_ms = statistics.median_low(times)
+                median_run = runs[times.index(median_ms)]
+                plan = median_run["Plan"]
+                results[name] = {
+                    "execution_ms": round(median_ms, 3),
+                    "planning_ms": round(median_run["Planning Time"], 3),
+                    "rows": plan.get("Actual Rows"),
+                    "shared_hit_blocks": plan.get("Shared Hit Blocks"),
+                    "shared_read_blocks": plan.get("Shared Read Blocks"),
+                    "shape": plan_shape(plan),
+                }
+                print(f"  {name:<24} {results[name]['execution_ms']:>10.2f} ms  {results[name]['shape'][:80]}")
+    finally:
+        connection.close()
+    return results
+
+
+def compare(results, baseline, threshold=0.25, min_ms=1.0):
+    """Lists regressions: slower by more than threshold (and min_ms), or a changed plan shape"""
+    regressions = []
+    for scale, queries in results.items():
+        for name, current in queries.items():
+            previous = baseline.get(scale, {}).get(name)
+            if previous is None:
+                continue
+            before, after = previous["execution_ms"], current["execution_ms"]
+            if after > before * (1 + threshold) and after - before > min_ms:
+                regressions.append(f"x{scale} {name}: {before:.2f} ms → {after:.2f} ms (+{(after / before - 1) * 100:.0f}%)")
+            if previous["shape"] != current["shape"]:
+                regressions.append(f"x{scale} {name}: plan changed\n    was: {previous['shape']}\n    now: {current['shape']}")
+    return regressions
+
+
+def run_benchmark(scales, db_name=BENCH_DB, repeat=3, synthetic=False):
+    create_database(db_name, user=db.DB_USER, password=db.DB_PASSWORD, host=db.DB_HOST, port=db.DB_PORT)
+    results = {}
+    for factor in scales:
+        print(f"\n=== Scale factor x{factor} ===")
+        data_dir = os.path.join(BENCH_DIR, "data", f"{'synthetic' if synthetic else 'x'}{factor}")
+        if synthetic:
+            generate_data.generate(factor, data_dir)
+        else:
+            scale_datasets(factor, data_dir)
+        load_scale(db_name, data_dir)
+        results[str(factor)] = profile_queries(db_name, repeat)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile queries.sql and the analytics queries at several data scales")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 100, 10000],
+                        help="multiples of the datasets/ CSVs to load")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="use generate_data.py at these scale factors instead of replicating datasets/")
+    parser.add_argument("--db", default=BENCH_DB, help="scratch database (dropped and reloaded per scale)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.scales, args.db, args.repeat, args.synthetic)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions against {args.baseline}:")
+            for line in regressions:
+                print("  " + line)
+            raise SystemExit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import pandas as pd
+
+CACHE_DIR = os.path.join("charts", ".cache")
+MANIFEST_FILE = "manifest.json"
+MAX_VARIANTS = 60
+MAX_BYTES = 50 * 1024 * 1024
+
+
+def code_fingerprint(code):
+    """Bytecode, constants and names of a code object and the functions nested in it.
+
+    Changing a renderer's colors, labels or axes changes this; nested code objects are walked
+    instead of repr()'d, since their repr holds a memory address.
+    """
+    parts = [code.co_code.hex(), list(code.co_names)]
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            parts.append(code_fingerprint(const))
+        elif isinstance(const, frozenset):
+            # `x in {"a", "b"}` constants: their repr order changes with string hash randomization
+            parts.append(sorted(map(repr, const)))
+        else:
+            parts.append(repr(const))
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def chart_key(df, renderer, spec):
+    """Content address of a chart: the data it plots, the renderer's code and everything passed to it"""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(json.dumps([str(col) for col in df.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in df.dtypes]).encode())
+    digest.update(json.dumps({"renderer": renderer.__name__, "code": code_fingerprint(renderer.__code__), **spec},
+                             sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def load_manifest(cache_dir=CACHE_DIR):
+    """{"variants": {key: {file, size, last_used}}, "outputs": {chart path: key}}"""
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"variants": {}, "outputs": {}}
+
+
+def save_manifest(manifest, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def lookup(manifest, key, output_path, cache_dir=CACHE_DIR):
+    """Tries to satisfy a chart from the cache.
+
+    Returns "hit" when output_path already holds this exact chart, "restored" when an older
+    variant was copied back from the cache, or None when the chart has to be rendered.
+    """
+    variant = manifest["variants"].get(key)
+    if variant is None:
+        return None
+    variant_path = os.path.join(cache_dir, variant["file"])
+    if not os.path.exists(variant_path):
+        del manifest["variants"][key]
+        return None
+
+    variant["last_used"] = time.time()
+    if manifest["outputs"].get(output_path) == key and os.path.exists(output_path):
+        return "hit"
+    shutil.copyfile(variant_path, output_path)
+    manifest["outputs"][output_path] = key
+    return "restored"
+
+
+def store(manifest, key, output_path, cache_dir=CACHE_DIR):
+    """Records a freshly rendered chart as a cache variant"""
+    os.makedirs(cache_dir, exist_ok=True)
+    file = key + os.path.splitext(output_path)[1]
+    shutil.copyfile(output_path, os.path.join(cache_dir, file))
+    manifest["variants"][key] = {"file": file, "size": os.path.getsize(output_path), "last_used": time.time()}
+    manifest["outputs"][output_path] = key
+
+
+def evict(manifest, max_variants=MAX_VARIANTS, max_bytes=MAX_BYTES, cache_dir=CACHE_DIR):
+    """Drops least recently used variants until the cache fits; charts currently on disk are kept"""
+    in_use = set(manifest["outputs"].values())
+    variants = manifest["variants"]
+    candidates = sorted((key for key in variants if key not in in_use), key=lambda k: variants[k]["last_used"])
+    total_bytes = sum(v["size"] for v in variants.values())
+    evicted = 0
+    for key in candidates:
+        if len(variants) <= max_variants and total_bytes <= max_bytes:
+            break
+        variant = variants.pop(key)
+        total_bytes -= variant["size"]
+        try:
+            os.remove(os.path.join(cache_dir, variant["file"]))
+        except FileNotFoundError:
+            pass
+        evicted += 1
+    return evicted
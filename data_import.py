@@ -1,6 +1,15 @@
+import io
 import os
+import re
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import psycopg2
 from sqlalchemy import create_engine
+from tables_create import load_levels, ensure_partitions
+import query_cache
 
 DB_NAME = "techno_events"
 DB_USER = "postgres"
@@ -8,8 +17,478 @@ DB_PASSWORD = "0000"
 DB_HOST = "localhost"
 DB_PORT = "5432"
 DATASETS_FOLDER = "datasets"
+CHUNK_SIZE = 100_000
+WATERMARK_BLOCK = 64 * 1024
 
-def import_data():
+# Per-file state for incremental imports: where the last import stopped and what the file looked like
+WATERMARK_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS import_watermarks (
+      FileName VARCHAR(255) PRIMARY KEY,
+      TableName VARCHAR(100) NOT NULL,
+      MaxId BIGINT,
+      FileSize BIGINT NOT NULL,
+      FileMtime DOUBLE PRECISION NOT NULL,
+      TailHash VARCHAR(64) NOT NULL,
+      ImportedAt TIMESTAMP DEFAULT now()
+    );
+"""
+
+# Explicit dtypes per CSV so the C parser never has to guess (or re-scan) a column.
+# Date/time columns stay as text: PostgreSQL parses them during COPY.
+TABLE_DTYPES = {
+    "countries": {"Id": "Int64", "Name": "string"},
+    "genres": {"Id": "Int64", "Name": "string"},
+    "locations": {"Id": "Int64", "Name": "string", "CountryId": "Int64"},
+    "artists": {"Id": "Int64", "Name": "string", "GenreId": "Int64", "Bio": "string",
+                "PictureUrl": "string", "SoundCloud": "string", "Spotify": "string", "Youtube": "string"},
+    "users": {"Id": "Int64", "UserName": "string", "FullName": "string", "Email": "string",
+              "Password": "string", "LocationId": "Int64", "Bio": "string", "RegistrationDate": "string"},
+    "events": {"Id": "Int64", "Name": "string", "Description": "string", "Venue": "string",
+               "Date": "string", "CoverUrl": "string", "LocationId": "Int64", "GenreId": "Int64"},
+    "eventhistory": {"Id": "Int64", "UserId": "Int64", "EventId": "Int64", "Rate": "Int16",
+                     "HasAttended": "Int8", "IsInterested": "Int8"},
+    "eventartists": {"Id": "Int64", "EventId": "Int64", "ArtistId": "Int64"},
+    "favoriteartists": {"Id": "Int64", "UserId": "Int64", "ArtistId": "Int64"},
+    "favoritegenres": {"Id": "Int64", "UserId": "Int64", "GenreId": "Int64"},
+}
+
+# Partition key (CSV header name) of the tables tables_create can range-partition by month.
+# eventhistory's CSV has no date of its own; EventDate is looked up from events while loading.
+PARTITION_KEYS = {"events": "Date", "eventhistory": "EventDate"}
+
+
+def get_connection():
+    return psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+
+
+def _normalize(name):
+    return name.replace("_", "").lower()
+
+
+def resolve_columns(cursor, table_name, header):
+    """Maps CSV header names (UserId) to the table's real columns (userid or user_id)"""
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = %s",
+        (table_name,)
+    )
+    table_columns = {_normalize(row[0]): row[0] for row in cursor.fetchall()}
+    if not table_columns:
+        raise ValueError(f"table '{table_name}' does not exist")
+    return {col: table_columns[_normalize(col)] for col in header if _normalize(col) in table_columns}
+
+
+def read_csv_chunks(filepath, table_name, chunksize=CHUNK_SIZE, names=None):
+    """Reads a dataset CSV in chunks with the C parser and the table's explicit dtypes.
+
+    filepath may also be an open file positioned mid-file; pass the header as names then.
+    """
+    return pd.read_csv(
+        filepath,
+        sep=",",
+        engine="c",
+        header=None if names is not None else "infer",
+        names=names,
+        dtype=TABLE_DTYPES.get(table_name),
+        keep_default_na=False,
+        na_values=["", "NULL"],
+        on_bad_lines="skip",
+        chunksize=chunksize,
+    )
+
+
+def copy_chunk(cursor, table_name, chunk, columns):
+    """Pushes one DataFrame chunk into table_name through COPY FROM STDIN"""
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False, na_rep="")
+    buffer.seek(0)
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    cursor.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def chunk_mapping(cursor, table_name, header):
+    mapping = resolve_columns(cursor, table_name, header)
+    skipped = [col for col in header if col not in mapping]
+    if skipped:
+        print(f"⚠ {table_name}: no matching column for {', '.join(skipped)}, skipping")
+    return mapping
+
+
+def is_partitioned(cursor, table_name):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table_name,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def add_event_dates(cursor, chunk):
+    """Adds EventDate to an eventhistory chunk from the events table (loaded one level earlier)"""
+    event_ids = [int(event_id) for event_id in chunk["EventId"].dropna().unique()]
+    cursor.execute("SELECT id, date FROM events WHERE id = ANY(%s)", (event_ids,))
+    return chunk.assign(EventDate=chunk["EventId"].map(dict(cursor.fetchall())))
+
+
+def prepare_partitioned_chunk(cursor, table_name, chunk):
+    """Fills in the partition key if needed and creates the monthly partitions the chunk falls into"""
+    key = PARTITION_KEYS[table_name]
+    if key not in chunk.columns:
+        chunk = add_event_dates(cursor, chunk)
+    dates = pd.to_datetime(chunk[key], errors="coerce")
+    missing = dates.isna()
+    if missing.any():
+        print(f"⚠ {table_name}: skipping {missing.sum()} rows without {key} (it is the partition key)")
+        chunk, dates = chunk[~missing], dates[~missing]
+    if len(chunk):
+        ensure_partitions(cursor, table_name, dates.min().date(), dates.max().date())
+    return chunk
+
+
+def copy_file(connection, filepath, table_name, chunksize=CHUNK_SIZE):
+    """Streams a whole CSV into table_name in chunks; returns the number of rows loaded"""
+    rows = 0
+    with connection.cursor() as cursor:
+        partitioned = table_name in PARTITION_KEYS and is_partitioned(cursor, table_name)
+        mapping = None
+        for chunk in read_csv_chunks(filepath, table_name, chunksize):
+            if partitioned:
+                chunk = prepare_partitioned_chunk(cursor, table_name, chunk)
+            if mapping is None:
+                mapping = chunk_mapping(cursor, table_name, chunk.columns)
+            copy_chunk(cursor, table_name, chunk[list(mapping)], list(mapping.values()))
+            rows += len(chunk)
+    connection.commit()
+    return rows
+
+
+def report_throughput(file, table_name, rows, size_bytes, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    print(f"✅ Imported {file} → table '{table_name}' ({rows} rows) "
+          f"in {elapsed:.2f}s | {rows / elapsed:,.0f} rows/s | {size_bytes / elapsed / 1024 / 1024:.2f} MB/s")
+
+
+def dataset_files():
+    return sorted(file for file in os.listdir(DATASETS_FOLDER) if file.endswith(".csv"))
+
+
+def import_schedule(files):
+    """Orders files by the FK levels of tables_create; files of one level can load concurrently"""
+    by_table = {os.path.splitext(file)[0].lower(): file for file in files}
+    schedule = []
+    for level in load_levels():
+        schedule.append([by_table.pop(table) for table in level if table in by_table])
+    # CSVs without a table in the schema have no known dependencies, load them last
+    schedule.append(sorted(by_table.values()))
+    return [level for level in schedule if level]
+
+
+def capture_deferred_constraints(cursor, tables):
+    """Returns (drop, create, foreign_key) statements for FK constraints and secondary indexes on tables.
+
+    foreign_key is (table, name) for FK constraints and None for indexes.
+    """
+    statements = []
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype = 'f' AND conrelid::regclass::text = ANY(%s)
+    """, (tables,))
+    for table, name, definition in cursor.fetchall():
+        statements.append((f'ALTER TABLE {table} DROP CONSTRAINT "{name}"',
+                           f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}', (table, name)))
+
+    # Indexes backing PRIMARY KEY/UNIQUE constraints stay, everything else is rebuilt after the load
+    cursor.execute("""
+        SELECT i.indexname, i.indexdef, t.relkind = 'p'
+        FROM pg_indexes i
+        JOIN pg_class t ON t.oid = to_regclass(quote_ident(i.schemaname) || '.' || quote_ident(i.tablename))
+        WHERE i.schemaname = 'public' AND i.tablename = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+    """, (tables,))
+    for name, definition, partitioned in cursor.fetchall():
+        if partitioned:
+            # A partitioned parent's indexdef reads "ON ONLY": replayed as is, no partition gets the index
+            definition = definition.replace(" ON ONLY ", " ON ", 1)
+        statements.append((f'DROP INDEX "{name}"', definition, None))
+    return statements
+
+
+def count_orphans(cursor, table, name):
+    """Number of rows in table whose foreign key `name` points at a missing row"""
+    cursor.execute("""
+        SELECT confrelid::regclass::text,
+               ARRAY(SELECT attname FROM unnest(conkey) WITH ORDINALITY k(attnum, n)
+                     JOIN pg_attribute ON attrelid = conrelid AND attnum = k.attnum ORDER BY n),
+               ARRAY(SELECT attname FROM unnest(confkey) WITH ORDINALITY k(attnum, n)
+                     JOIN pg_attribute ON attrelid = confrelid AND attnum = k.attnum ORDER BY n)
+        FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s
+    """, (table, name))
+    referenced, columns, referenced_columns = cursor.fetchone()
+    matches = " AND ".join(f'r."{ref}" = t."{col}"' for col, ref in zip(columns, referenced_columns))
+    not_null = " AND ".join(f't."{col}" IS NOT NULL' for col in columns)
+    cursor.execute(f"SELECT count(*) FROM {table} t WHERE {not_null} "
+                   f"AND NOT EXISTS (SELECT 1 FROM {referenced} r WHERE {matches})")
+    return cursor.fetchone()[0]
+
+
+def rebuild_deferred_constraints(connection, deferred):
+    """Recreates what capture_deferred_constraints dropped; returns the statements that failed.
+
+    Every statement runs under its own savepoint, so one failure never takes the others with it.
+    Foreign keys go back as NOT VALID first - they guard new writes from then on - and are validated
+    separately: a key with orphan rows stays NOT VALID and the orphans are reported.
+    """
+    failed = []
+    to_validate = []
+    with connection.cursor() as cursor:
+        for _, create, foreign_key in deferred:
+            # PostgreSQL can't add a NOT VALID foreign key on a partitioned table, those are checked right away
+            not_valid = foreign_key is not None and not is_partitioned(cursor, foreign_key[0])
+            cursor.execute("SAVEPOINT rebuild")
+            try:
+                cursor.execute(create + " NOT VALID" if not_valid else create)
+                cursor.execute("RELEASE SAVEPOINT rebuild")
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT rebuild")
+                print(f"❌ Could not restore: {create}\n   {str(e).strip()}")
+                failed.append(create)
+                continue
+            if not_valid:
+                to_validate.append(foreign_key)
+
+        for table, name in to_validate:
+            cursor.execute("SAVEPOINT rebuild")
+            try:
+                cursor.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT "{name}"')
+                cursor.execute("RELEASE SAVEPOINT rebuild")
+            except psycopg2.Error:
+                cursor.execute("ROLLBACK TO SAVEPOINT rebuild")
+                print(f"⚠ {table}.{name} left NOT VALID: {count_orphans(cursor, table, name)} rows reference "
+                      f"missing rows. Fix them, then run ALTER TABLE {table} VALIDATE CONSTRAINT \"{name}\"")
+                failed.append(f'ALTER TABLE {table} VALIDATE CONSTRAINT "{name}"')
+    connection.commit()
+    return failed
+
+
+def _copy_worker(task):
+    """Loads one file on its own connection; runs inside the process pool"""
+    filepath, chunksize = task
+    file = os.path.basename(filepath)
+    table_name = os.path.splitext(file)[0].lower()
+    connection = get_connection()
+    try:
+        start = time.perf_counter()
+        rows = copy_file(connection, filepath, table_name, chunksize)
+        return file, table_name, rows, os.path.getsize(filepath), time.perf_counter() - start, None
+    except Exception as e:
+        connection.rollback()
+        return file, table_name, 0, 0, 0, e
+    finally:
+        connection.close()
+
+
+def _run_level(files, chunksize, executor):
+    tasks = [(os.path.join(DATASETS_FOLDER, file), chunksize) for file in files]
+    results = executor.map(_copy_worker, tasks) if executor else map(_copy_worker, tasks)
+    loaded = []
+    for file, table_name, rows, size_bytes, elapsed, error in results:
+        if error is None:
+            report_throughput(file, table_name, rows, size_bytes, elapsed)
+            loaded.append(table_name)
+        else:
+            print(f"❌ Error importing {file}: {error}")
+    return loaded
+
+
+def import_data_copy(chunksize=CHUNK_SIZE, jobs=1, defer_constraints=True):
+    """Bulk loads every CSV in the datasets folder with COPY, level by level in FK order.
+
+    Files within a level load concurrently on `jobs` worker processes. With defer_constraints,
+    foreign keys and secondary indexes are dropped before the load and rebuilt once at the end.
+    """
+    schedule = import_schedule(dataset_files())
+    tables = [os.path.splitext(file)[0].lower() for level in schedule for file in level]
+
+    connection = get_connection()
+    deferred = []
+    try:
+        if defer_constraints:
+            with connection.cursor() as cursor:
+                captured = capture_deferred_constraints(cursor, tables)
+                for drop, _, _ in captured:
+                    cursor.execute(drop)
+            connection.commit()
+            deferred = captured
+            print(f"Deferred {len(deferred)} foreign keys/indexes until after the load")
+
+        start = time.perf_counter()
+        executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        loaded = []
+        try:
+            for i, level in enumerate(schedule, start=1):
+                print(f"Level {i}: {', '.join(level)}")
+                loaded += _run_level(level, chunksize, executor)
+        finally:
+            if executor:
+                executor.shutdown()
+            query_cache.invalidate_tables(loaded)
+        print(f"Loaded {len(tables)} files in {time.perf_counter() - start:.2f}s")
+    finally:
+        if deferred:
+            start = time.perf_counter()
+            connection.rollback()
+            failed = rebuild_deferred_constraints(connection, deferred)
+            print(f"Rebuilt {len(deferred) - len(failed)} of {len(deferred)} foreign keys/indexes "
+                  f"in {time.perf_counter() - start:.2f}s")
+        connection.close()
+
+
+def tail_hash(filepath, size):
+    """Hashes the block just before `size` bytes - enough to tell an append from a rewrite"""
+    with open(filepath, "rb") as f:
+        start = max(0, size - WATERMARK_BLOCK)
+        f.seek(start)
+        return hashlib.sha256(f.read(size - start)).hexdigest()
+
+
+def get_watermark(cursor, file):
+    cursor.execute(
+        "SELECT MaxId, FileSize, FileMtime, TailHash FROM import_watermarks WHERE FileName = %s", (file,)
+    )
+    row = cursor.fetchone()
+    return dict(zip(("max_id", "size", "mtime", "tail_hash"), row)) if row else None
+
+
+def save_watermark(cursor, file, table_name, max_id, size, mtime, file_hash):
+    cursor.execute("""
+        INSERT INTO import_watermarks (FileName, TableName, MaxId, FileSize, FileMtime, TailHash, ImportedAt)
+        VALUES (%s, %s, %s, %s, %s, %s, now())
+        ON CONFLICT (FileName) DO UPDATE SET
+            TableName = EXCLUDED.TableName, MaxId = EXCLUDED.MaxId, FileSize = EXCLUDED.FileSize,
+            FileMtime = EXCLUDED.FileMtime, TailHash = EXCLUDED.TailHash, ImportedAt = now()
+    """, (file, table_name, max_id, size, mtime, file_hash))
+
+
+def appended_offset(filepath, watermark, size):
+    """Byte offset to resume from if the file only grew since the watermark, else None"""
+    old_size = watermark["size"]
+    if size <= old_size or old_size == 0:
+        return None
+    with open(filepath, "rb") as f:
+        f.seek(old_size - 1)
+        if f.read(1) != b"\n":
+            return None
+    if tail_hash(filepath, old_size) != watermark["tail_hash"]:
+        return None
+    return old_size
+
+
+def primary_key_columns(cursor, table_name):
+    cursor.execute("""
+        SELECT a.attname FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND i.indisprimary
+    """, (table_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def upsert_chunk(cursor, table_name, chunk, columns):
+    """COPYs a chunk into a staging table, then merges it with INSERT ... ON CONFLICT on the primary key.
+
+    On a partitioned table the primary key includes the partition key, e.g. (id, eventdate).
+    """
+    staging = f"staging_{table_name}"
+    cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table_name} INCLUDING DEFAULTS) "
+                   f"ON COMMIT DROP")
+    cursor.execute(f"TRUNCATE {staging}")
+    copy_chunk(cursor, staging, chunk, columns)
+
+    keys = primary_key_columns(cursor, table_name) or [next(col for col in columns if _normalize(col) == "id")]
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    key_list = ", ".join(f'"{col}"' for col in keys)
+    updates = ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in columns if col not in keys)
+    conflict_action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    cursor.execute(f"""
+        INSERT INTO {table_name} ({column_list})
+        SELECT {column_list} FROM {staging}
+        ON CONFLICT ({key_list}) {conflict_action}
+    """)
+
+
+def incremental_file(connection, file, chunksize=CHUNK_SIZE):
+    """Upserts only what changed in one CSV since its watermark.
+
+    Returns (rows, bytes_read, mode) where mode is unchanged, append (only the new tail
+    was parsed) or full (new or rewritten file).
+    """
+    filepath = os.path.join(DATASETS_FOLDER, file)
+    table_name = os.path.splitext(file)[0].lower()
+    stat = os.stat(filepath)
+
+    with connection.cursor() as cursor:
+        watermark = get_watermark(cursor, filepath)
+        if watermark and watermark["size"] == stat.st_size and watermark["mtime"] == stat.st_mtime:
+            return 0, 0, "unchanged"
+
+        offset = appended_offset(filepath, watermark, stat.st_size) if watermark else None
+        header = list(pd.read_csv(filepath, nrows=0).columns)
+        partitioned = table_name in PARTITION_KEYS and is_partitioned(cursor, table_name)
+        derived = [PARTITION_KEYS[table_name]] if partitioned and PARTITION_KEYS[table_name] not in header else []
+        mapping = chunk_mapping(cursor, table_name, header + derived)
+        if not any(_normalize(col) == "id" for col in mapping.values()):
+            raise ValueError(f"{file} has no Id column to upsert on")
+
+        rows = 0
+        max_id = watermark["max_id"] if offset is not None else None
+        with open(filepath, "rb") as f:
+            f.seek(offset or 0)
+            source = io.TextIOWrapper(f, encoding="utf-8", newline="")
+            names = header if offset is not None else None
+            for chunk in read_csv_chunks(source, table_name, chunksize, names=names):
+                if partitioned:
+                    chunk = prepare_partitioned_chunk(cursor, table_name, chunk)
+                if chunk.empty:
+                    continue
+                upsert_chunk(cursor, table_name, chunk[list(mapping)], list(mapping.values()))
+                rows += len(chunk)
+                id_header = next(col for col in mapping if _normalize(col) == "id")
+                chunk_max = chunk[id_header].max()
+                if pd.notna(chunk_max):
+                    max_id = int(chunk_max) if max_id is None else max(max_id, int(chunk_max))
+
+        save_watermark(cursor, filepath, table_name, max_id, stat.st_size, stat.st_mtime,
+                       tail_hash(filepath, stat.st_size))
+    connection.commit()
+    return rows, stat.st_size - (offset or 0), "append" if offset is not None else "full"
+
+
+def import_data_incremental(chunksize=CHUNK_SIZE):
+    """Nightly refresh: upserts new rows per file in FK order, driven by import_watermarks"""
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(WATERMARK_SCHEMA)
+        connection.commit()
+
+        for level in import_schedule(dataset_files()):
+            for file in level:
+                table_name = os.path.splitext(file)[0].lower()
+                try:
+                    start = time.perf_counter()
+                    rows, bytes_read, mode = incremental_file(connection, file, chunksize)
+                    if rows:
+                        query_cache.invalidate_tables([table_name])
+                    if mode == "unchanged":
+                        print(f"⏭ {file} unchanged since last import")
+                    else:
+                        print(f"[{mode}]", end=" ")
+                        report_throughput(file, table_name, rows, bytes_read, time.perf_counter() - start)
+                except Exception as e:
+                    connection.rollback()
+                    print(f"❌ Error importing {file}: {e}")
+    finally:
+        connection.close()
+
+
+def import_data_to_sql():
     engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 
     for file in os.listdir(DATASETS_FOLDER):
@@ -22,10 +501,169 @@ def import_data():
                 df = pd.read_csv(filepath, sep=None, engine="python", on_bad_lines="skip")
 
                 df.to_sql(table_name, engine, if_exists="append", index=False)
+                query_cache.invalidate_tables([table_name])
                 print(f"✅ Imported {file} → table '{table_name}' ({len(df)} rows).")
 
             except Exception as e:
                 print(f"❌ Error importing {file}: {e}")
 
+
+def table_columns(cursor, table_name):
+    cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' "
+                   "AND table_name = %s ORDER BY ordinal_position", (table_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def migrate_to_partitioned():
+    """Converts existing events/eventhistory heap tables into monthly range-partitioned ones.
+
+    Everything happens in one transaction: the old tables are renamed, partitioned copies are created
+    with the same columns (whatever naming the database uses), rows are copied partition by partition,
+    indexes and foreign keys are rebuilt and the old tables dropped. eventhistory gets an event date
+    column copied from its event. Foreign keys from other tables into events (eventartists) are
+    dropped, since they would have to include the event date. Events without a date (and their history)
+    can't be partitioned; if there are any, the old tables are kept as *_unpartitioned and reported.
+    """
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            if is_partitioned(cursor, "events") and is_partitioned(cursor, "eventhistory"):
+                print("⏭ events and eventhistory are already partitioned")
+                return
+            start = time.perf_counter()
+            event = resolve_columns(cursor, "events", ["Id", "Date"])
+            history = resolve_columns(cursor, "eventhistory", ["Id", "EventId"])
+            # eventid -> eventdate, event_id -> event_date
+            history_date = history["EventId"][:-2] + "date"
+
+            deferred = capture_deferred_constraints(cursor, ["events", "eventhistory"])
+            cursor.execute("""
+                SELECT conrelid::regclass::text, conname FROM pg_constraint
+                WHERE contype = 'f' AND confrelid = 'events'::regclass AND conrelid <> 'eventhistory'::regclass
+            """)
+            for table, name in cursor.fetchall():
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+                print(f"⚠ Dropped foreign key {table}.{name}: it can't reference a partitioned events table")
+            for drop, _, _ in deferred:
+                cursor.execute(drop)
+
+            columns = {}
+            for table in ("events", "eventhistory"):
+                columns[table] = table_columns(cursor, table)
+                cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+                cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                               (f"{table}_unpartitioned",))
+                for (name,) in cursor.fetchall():
+                    cursor.execute(f'ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT "{name}" '
+                                   f'TO {table}_unpartitioned_pkey')
+
+            cursor.execute(f"""
+                CREATE TABLE events (LIKE events_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                PARTITION BY RANGE ("{event['Date']}")
+            """)
+            cursor.execute(f'ALTER TABLE events ADD PRIMARY KEY ("{event["Id"]}", "{event["Date"]}")')
+            cursor.execute(f"""
+                CREATE TABLE eventhistory (LIKE eventhistory_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+                                           "{history_date}" TIMESTAMP NOT NULL)
+                PARTITION BY RANGE ("{history_date}")
+            """)
+            cursor.execute(f'ALTER TABLE eventhistory ADD PRIMARY KEY ("{history["Id"]}", "{history_date}")')
+            for table in ("events", "eventhistory"):
+                cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+            cursor.execute(f'SELECT min("{event["Date"]}"), max("{event["Date"]}") FROM events_unpartitioned')
+            first, last = cursor.fetchone()
+            if first is not None:
+                for table in ("events", "eventhistory"):
+                    ensure_partitions(cursor, table, first.date(), last.date())
+
+            event_list = ", ".join(f'"{col}"' for col in columns["events"])
+            cursor.execute(f'INSERT INTO events ({event_list}) SELECT {event_list} FROM events_unpartitioned '
+                           f'WHERE "{event["Date"]}" IS NOT NULL')
+            events_copied = cursor.rowcount
+            history_list = ", ".join(f'"{col}"' for col in columns["eventhistory"])
+            cursor.execute(f"""
+                INSERT INTO eventhistory ({history_list}, "{history_date}")
+                SELECT {", ".join(f'h."{col}"' for col in columns["eventhistory"])}, e."{event['Date']}"
+                FROM eventhistory_unpartitioned h
+                JOIN events e ON e."{event['Id']}" = h."{history['EventId']}"
+            """)
+            history_copied = cursor.rowcount
+
+            for table, id_column in (("events", event["Id"]), ("eventhistory", history["Id"])):
+                cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (f"{table}_unpartitioned", id_column))
+                sequence = cursor.fetchone()[0]
+                if sequence:
+                    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}."{id_column}"')
+
+            # Secondary indexes and the remaining foreign keys go back onto the partitioned parents
+            for _, create, _ in deferred:
+                if not re.search(r"REFERENCES (public\.)?events\(", create):
+                    cursor.execute(create)
+            cursor.execute(f"""
+                ALTER TABLE eventhistory ADD FOREIGN KEY ("{history['EventId']}", "{history_date}")
+                REFERENCES events ("{event['Id']}", "{event['Date']}")
+            """)
+
+            cursor.execute("SELECT (SELECT count(*) FROM events_unpartitioned), "
+                           "(SELECT count(*) FROM eventhistory_unpartitioned)")
+            events_total, history_total = cursor.fetchone()
+            # Rows without a partition key were left behind: keep the old tables rather than lose them
+            complete = events_copied == events_total and history_copied == history_total
+            if complete:
+                cursor.execute("DROP TABLE eventhistory_unpartitioned, events_unpartitioned")
+        connection.commit()
+        query_cache.invalidate_tables(["events", "eventhistory"])
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE events, eventhistory")
+        connection.commit()
+        print(f"✅ Partitioned events ({events_copied} rows) and eventhistory ({history_copied} rows) by month "
+              f"in {time.perf_counter() - start:.2f}s")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('kpi_summary') IS NOT NULL")
+            if cursor.fetchone()[0]:
+                print("⚠ The KPI summary triggers went with the old tables: run `python kpi_summary.py` "
+                      "to install them again")
+        if not complete:
+            print(f"⚠ {events_total - events_copied} events without a date and "
+                  f"{history_total - history_copied} eventhistory rows without a dated event were not copied. "
+                  f"All old rows are kept in events_unpartitioned and eventhistory_unpartitioned: give those "
+                  f"events a date and copy them over, then drop both tables")
+    except Exception as e:
+        connection.rollback()
+        print(f"❌ Error partitioning events/eventhistory: {e}")
+    finally:
+        connection.close()
+
+
+def import_data(method="copy", chunksize=CHUNK_SIZE, jobs=1, defer_constraints=True):
+    if method == "copy":
+        import_data_copy(chunksize, jobs, defer_constraints)
+    elif method == "incremental":
+        import_data_incremental(chunksize)
+    elif method == "to_sql":
+        import_data_to_sql()
+    else:
+        raise ValueError(f"Unknown import method: {method}")
+
+
 if __name__ == "__main__":
-    import_data()
+    parser = argparse.ArgumentParser(description="Import datasets/*.csv into PostgreSQL")
+    parser.add_argument("--method", choices=["copy", "incremental", "to_sql"], default="copy",
+                        help="copy streams files with COPY FROM STDIN; incremental upserts only rows added "
+                             "since the last run; to_sql is the old DataFrame.to_sql path")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes loading independent tables concurrently (copy method)")
+    parser.add_argument("--keep-constraints", action="store_true",
+                        help="load with foreign keys and indexes in place instead of rebuilding them afterwards")
+    parser.add_argument("--datasets", default=DATASETS_FOLDER,
+                        help="folder with the CSVs to import (e.g. the output of generate_data.py)")
+    parser.add_argument("--migrate-partitions", action="store_true",
+                        help="first convert existing events/eventhistory tables to monthly partitions")
+    args = parser.parse_args()
+    DATASETS_FOLDER = args.datasets
+    if args.migrate_partitions:
+        migrate_to_partitioned()
+    import_data(args.method, args.chunksize, args.jobs, not args.keep_constraints)
@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from sqlalchemy import create_engine, event
+
+# Connection settings shared by every entry point; override with environment variables
+DB_NAME = os.getenv("DB_NAME", "techno_events_db")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "0000")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "60000")),
+}
+
+# "duckdb" sends run_query to the local Parquet snapshot (snapshot.py) instead of the primary
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "postgres")
+
+_engine = None
+_engine_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"acquired": 0, "acquire_seconds": 0.0, "max_acquire_seconds": 0.0, "connections_opened": 0}
+
+
+def database_url():
+    return f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+
+def configure(**settings):
+    """Changes pool settings (pool_size, max_overflow, pool_recycle, statement_timeout_ms).
+
+    Takes effect on the next get_engine() call; an existing pool is disposed.
+    """
+    global _engine
+    unknown = set(settings) - set(POOL_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown pool settings: {', '.join(sorted(unknown))}")
+    with _engine_lock:
+        POOL_SETTINGS.update(settings)
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def _on_connect(dbapi_connection, connection_record):
+    with _stats_lock:
+        _stats["connections_opened"] += 1
+
+
+def get_engine():
+    """Returns the shared SQLAlchemy engine, creating its connection pool on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    database_url(),
+                    pool_size=POOL_SETTINGS["pool_size"],
+                    max_overflow=POOL_SETTINGS["max_overflow"],
+                    pool_recycle=POOL_SETTINGS["pool_recycle"],
+                    pool_pre_ping=True,
+                    connect_args={"options": f"-c statement_timeout={POOL_SETTINGS['statement_timeout_ms']}"},
+                )
+                event.listen(engine, "connect", _on_connect)
+                _engine = engine
+    return _engine
+
+
+def _record_acquire(seconds):
+    with _stats_lock:
+        _stats["acquired"] += 1
+        _stats["acquire_seconds"] += seconds
+        _stats["max_acquire_seconds"] = max(_stats["max_acquire_seconds"], seconds)
+
+
+@contextmanager
+def get_connection():
+    """Borrows a raw psycopg2 connection from the pool and hands it back on exit"""
+    start = time.perf_counter()
+    connection = get_engine().raw_connection()
+    _record_acquire(time.perf_counter() - start)
+    try:
+        yield connection
+    finally:
+        # Returns the connection to the pool (uncommitted work is rolled back)
+        connection.close()
+
+
+def run_query(query, params=None):
+    """Runs a SELECT on a pooled connection (or the DuckDB snapshot) and returns the result as a DataFrame"""
+    if QUERY_BACKEND == "duckdb":
+        import snapshot
+        return snapshot.run_query(query, params)
+    start = time.perf_counter()
+    with get_engine().connect() as connection:
+        _record_acquire(time.perf_counter() - start)
+        return pd.read_sql(query, connection, params=params)
+
+
+def acquire_stats():
+    """Connection-acquire latency and pool usage since the process started"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_acquire_seconds"] = stats["acquire_seconds"] / stats["acquired"] if stats["acquired"] else 0.0
+    return stats
+
+
+def print_acquire_stats():
+    stats = acquire_stats()
+    print(f"DB pool: {stats['acquired']} acquires, {stats['connections_opened']} connections opened, "
+          f"avg {stats['avg_acquire_seconds'] * 1000:.2f} ms, max {stats['max_acquire_seconds'] * 1000:.2f} ms")
+
+
+def _reset_after_fork():
+    # A forked worker must not reuse the parent's sockets; it builds its own pool on first use
+    global _engine, _engine_lock, _stats_lock
+    _engine = None
+    _engine_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,46 +1,75 @@
 import os
 import pandas as pd
-from openpyxl import load_workbook
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
 
-def export_to_excel(dataframes_dict, filename):
-    # Ensure exports folder exists
-    export_dir = "exports"
-    os.makedirs(export_dir, exist_ok=True)
-    filepath = os.path.join(export_dir, filename)
+def _as_chunks(data):
+    """A sheet can be a whole DataFrame or an iterable of DataFrame chunks"""
+    if isinstance(data, pd.DataFrame):
+        return [data]
+    return data
 
-    # Write DataFrames to Excel
-    with pd.ExcelWriter(filepath, engine="openpyxl") as writer:
-        total_rows = 0
-        for sheet_name, df in dataframes_dict.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-            total_rows += len(df)
+def _rows(df):
+    # Missing values (NaN, NaT, pd.NA) become empty cells
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
 
-    # Load workbook with openpyxl for formatting
-    wb = load_workbook(filepath)
+def _write_sheet(wb, sheet_name, data):
+    """Streams one sheet row by row; formatting is decided from dtypes, never by re-reading cells"""
+    ws = wb.create_sheet(title=sheet_name)
 
-    for sheet_name in dataframes_dict.keys():
-        ws = wb[sheet_name]
+    # Freeze header row + first column (must be set before the first row is written)
+    ws.freeze_panes = "B2"
 
-        # Freeze header row + first column
-        ws.freeze_panes = "B2"
+    columns = None
+    numeric_columns = []
+    rows = 0
+    for chunk in _as_chunks(data):
+        if columns is None:
+            columns = list(chunk.columns)
+            numeric_columns = [i for i, dtype in enumerate(chunk.dtypes, start=1)
+                               if pd.api.types.is_numeric_dtype(dtype)]
+            header = []
+            for name in columns:
+                cell = WriteOnlyCell(ws, value=str(name))
+                cell.font = Font(bold=True)
+                header.append(cell)
+            ws.append(header)
+        for row in _rows(chunk):
+            ws.append(row)
+        rows += len(chunk)
 
+    if columns:
+        last_row = rows + 1
         # Apply filters to all columns
-        ws.auto_filter.ref = ws.dimensions
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{last_row}"
 
         # Apply conditional formatting to numeric columns
-        for col in ws.iter_cols(min_row=2, max_row=ws.max_row,
-                                min_col=1, max_col=ws.max_column):
-            # Check if column is numeric (based on first non-empty cell)
-            if all((isinstance(cell.value, (int, float)) or cell.value is None) for cell in col):
-                col_letter = col[0].column_letter
+        if rows:
+            for col_idx in numeric_columns:
+                col_letter = get_column_letter(col_idx)
                 rule = ColorScaleRule(
                     start_type="min", start_color="FFAA0000",
                     mid_type="percentile", mid_value=50, mid_color="FFFFFF00",
                     end_type="max", end_color="FF00AA00"
                 )
-                ws.conditional_formatting.add(f"{col_letter}2:{col_letter}{ws.max_row}", rule)
+                ws.conditional_formatting.add(f"{col_letter}2:{col_letter}{last_row}", rule)
+    return rows
+
+def export_to_excel(dataframes_dict, filename):
+    # Ensure exports folder exists
+    export_dir = "exports"
+    os.makedirs(export_dir, exist_ok=True)
+    filepath = os.path.join(export_dir, filename)
 
+    # Write-only workbook: rows go straight to disk, memory stays bounded by one chunk
+    wb = Workbook(write_only=True)
+    total_rows = 0
+    for sheet_name, data in dataframes_dict.items():
+        total_rows += _write_sheet(wb, sheet_name, data)
     wb.save(filepath)
 
     # Print console message
@@ -0,0 +1,192 @@
+import os
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import data_import
+
+OUTPUT_FOLDER = os.path.join("datasets", "synthetic")
+CHUNK_ROWS = 1_000_000
+
+# Rows per unit of scale factor; eventhistory reaches hundreds of millions around scale 1000+
+ROWS_PER_SCALE = {
+    "users": 10_000,
+    "events": 500,
+    "eventhistory": 100_000,
+}
+ARTISTS_PER_EVENT = 2.5
+FAVORITE_ARTISTS_PER_USER = 4.0
+FAVORITE_GENRES_PER_USER = 2.0
+
+# Dimension tables are small and real; they are copied from datasets/ as they are
+DIMENSION_TABLES = ["countries", "genres", "locations", "artists"]
+
+FIRST_DATE = np.datetime64("2020-01-06")  # a Monday
+WEEKS = 312
+WEEKDAY_WEIGHTS = np.array([0.04, 0.04, 0.07, 0.10, 0.30, 0.35, 0.10])  # Mon..Sun, weekend-heavy
+RATING_WEIGHTS = np.array([0.04, 0.07, 0.17, 0.36, 0.36])  # 1..5 stars
+ATTENDED_SHARE = 0.7
+RATED_SHARE_OF_ATTENDED = 0.8
+INTERESTED_SHARE = 0.6
+ZIPF_EXPONENT = 1.1
+VENUES = ["Berghain", "KitKatClub", "Tresor", "Fabric", "De School", "Printworks", "Amnesia",
+          "DC10", "Bassiani", "Output", "Shelter", "Dekmantel Selectors", "Gewölbe", "Concrete"]
+PASSWORD_HASH = "AQAAAAIAAYagAAAAEMWwMqqz7D3wBOnxjrWMi2Nu7JOXWzGsAUXGoUMm7q5UqBb36SC2e6C/wjNUEWmFrQ=="
+
+
+def zipf_weights(n, exponent=ZIPF_EXPONENT, rng=None):
+    """Zipf popularity over n items; ranks are shuffled so popular items aren't simply the lowest ids"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    if rng is not None:
+        rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def chunk_ranges(total, chunk_rows=CHUNK_ROWS):
+    for start in range(0, total, chunk_rows):
+        yield start, min(start + chunk_rows, total)
+
+
+def write_chunk(df, path, first):
+    df.to_csv(path, mode="w" if first else "a", header=first, index=False)
+
+
+def random_dates(rng, n, weekday_weights=WEEKDAY_WEIGHTS, first_hour=21, hours=4):
+    """Event start times: weekend-heavy weekdays over WEEKS weeks, starting in the late evening"""
+    weeks = rng.integers(0, WEEKS, n)
+    weekdays = rng.choice(7, n, p=weekday_weights)
+    minutes = (first_hour + rng.integers(0, hours, n)) * 60 + rng.choice([0, 30], n)
+    dates = FIRST_DATE + (weeks * 7 + weekdays).astype("timedelta64[D]") + minutes.astype("timedelta64[m]")
+    return np.datetime_as_string(dates, unit="s")
+
+
+def load_dimension_ids(source_dir):
+    ids = {}
+    for table in DIMENSION_TABLES:
+        df = data_import.read_csv_chunks(os.path.join(source_dir, f"{table}.csv"), table, chunksize=None)
+        ids[table] = df["Id"].dropna().to_numpy(dtype=np.int64)
+    return ids
+
+
+def generate_users(rng, path, count, location_ids):
+    location_weights = zipf_weights(len(location_ids), 0.8, rng)
+    for start, end in chunk_ranges(count):
+        ids = np.arange(start + 1, end + 1)
+        id_text = pd.Series(ids).astype(str)
+        registered = FIRST_DATE - np.timedelta64(730, "D") + rng.integers(0, (WEEKS * 7 + 730) * 86400, end - start).astype("timedelta64[s]")
+        write_chunk(pd.DataFrame({
+            "Id": ids,
+            "UserName": "user" + id_text,
+            "FullName": "User " + id_text,
+            "Email": "user" + id_text + "@example.com",
+            "Password": PASSWORD_HASH,
+            "LocationId": rng.choice(location_ids, end - start, p=location_weights),
+            "Bio": "",
+            "RegistrationDate": np.datetime_as_string(registered, unit="s"),
+        }), path, start == 0)
+
+
+def generate_events(rng, path, count, location_ids, genre_ids):
+    location_weights = zipf_weights(len(location_ids), 0.8, rng)
+    genre_weights = zipf_weights(len(genre_ids), 1.0, rng)
+    for start, end in chunk_ranges(count):
+        ids = np.arange(start + 1, end + 1)
+        id_text = pd.Series(ids).astype(str)
+        write_chunk(pd.DataFrame({
+            "Id": ids,
+            "Name": "Techno Night #" + id_text,
+            "Description": "",
+            "Venue": rng.choice(VENUES, end - start),
+            "Date": random_dates(rng, end - start),
+            "CoverUrl": "event-" + id_text + ".jpg",
+            "LocationId": rng.choice(location_ids, end - start, p=location_weights),
+            "GenreId": rng.choice(genre_ids, end - start, p=genre_weights),
+        }), path, start == 0)
+
+
+def generate_eventhistory(rng, path, count, user_count, event_count):
+    """Attendance/rating rows: popular events (Zipf) and heavy users dominate, ratings skew high"""
+    event_weights = zipf_weights(event_count, 0.9, rng)
+    user_weights = rng.lognormal(0, 1, user_count)
+    user_weights /= user_weights.sum()
+    for start, end in chunk_ranges(count):
+        n = end - start
+        attended = rng.random(n) < ATTENDED_SHARE
+        rated = attended & (rng.random(n) < RATED_SHARE_OF_ATTENDED)
+        rates = pd.array(rng.choice(np.arange(1, 6), n, p=RATING_WEIGHTS), dtype="Int16")
+        rates[~rated] = pd.NA
+        write_chunk(pd.DataFrame({
+            "Id": np.arange(start + 1, end + 1),
+            "UserId": rng.choice(user_count, n, p=user_weights) + 1,
+            "EventId": rng.choice(event_count, n, p=event_weights) + 1,
+            "Rate": rates,
+            "HasAttended": attended.astype(np.int8),
+            "IsInterested": (attended | (rng.random(n) < INTERESTED_SHARE)).astype(np.int8),
+        }), path, start == 0)
+
+
+def generate_links(rng, path, owner_column, owner_count, target_column, target_ids, per_owner, target_weights):
+    """Many-to-many rows (eventartists, favorite*) with Poisson counts per owner"""
+    next_id = 1
+    first = True
+    # Owners are processed in blocks sized so one block yields roughly CHUNK_ROWS links
+    block = max(1, int(CHUNK_ROWS / max(per_owner, 1e-9)))
+    for start, end in chunk_ranges(owner_count, block):
+        counts = rng.poisson(per_owner, end - start)
+        owners = np.repeat(np.arange(start + 1, end + 1), counts)
+        n = len(owners)
+        if n == 0:
+            continue
+        write_chunk(pd.DataFrame({
+            "Id": np.arange(next_id, next_id + n),
+            owner_column: owners,
+            target_column: rng.choice(target_ids, n, p=target_weights),
+        }), path, first)
+        next_id += n
+        first = False
+    if first:
+        pd.DataFrame(columns=["Id", owner_column, target_column]).to_csv(path, index=False)
+
+
+def generate(scale, out_dir=OUTPUT_FOLDER, seed=42, source_dir=data_import.DATASETS_FOLDER):
+    """Writes a full, referentially consistent dataset for `scale` into out_dir (same layout as datasets/)"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    ids = load_dimension_ids(source_dir)
+    for table in DIMENSION_TABLES:
+        shutil.copyfile(os.path.join(source_dir, f"{table}.csv"), os.path.join(out_dir, f"{table}.csv"))
+
+    counts = {table: max(1, int(rows * scale)) for table, rows in ROWS_PER_SCALE.items()}
+    artist_weights = zipf_weights(len(ids["artists"]), ZIPF_EXPONENT, rng)
+    genre_weights = zipf_weights(len(ids["genres"]), 1.0, rng)
+    event_ids = np.arange(1, counts["events"] + 1)
+
+    steps = [
+        ("users", lambda path: generate_users(rng, path, counts["users"], ids["locations"])),
+        ("events", lambda path: generate_events(rng, path, counts["events"], ids["locations"], ids["genres"])),
+        ("eventhistory", lambda path: generate_eventhistory(rng, path, counts["eventhistory"],
+                                                            counts["users"], counts["events"])),
+        ("eventartists", lambda path: generate_links(rng, path, "EventId", len(event_ids), "ArtistId",
+                                                     ids["artists"], ARTISTS_PER_EVENT, artist_weights)),
+        ("favoriteartists", lambda path: generate_links(rng, path, "UserId", counts["users"], "ArtistId",
+                                                        ids["artists"], FAVORITE_ARTISTS_PER_USER, artist_weights)),
+        ("favoritegenres", lambda path: generate_links(rng, path, "UserId", counts["users"], "GenreId",
+                                                       ids["genres"], FAVORITE_GENRES_PER_USER, genre_weights)),
+    ]
+    for table, step in steps:
+        path = os.path.join(out_dir, f"{table}.csv")
+        start = time.perf_counter()
+        step(path)
+        elapsed = time.perf_counter() - start
+        print(f"✅ Generated {table}.csv in {elapsed:.2f}s ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic techno events datasets at scale")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="scale factor: 1 = 10k users, 500 events, 100k eventhistory rows")
+    parser.add_argument("--output", default=OUTPUT_FOLDER)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate(args.scale, args.output, args.seed)
@@ -0,0 +1,273 @@
+import re
+import argparse
+from collections import Counter
+import db
+from benchmark import bench_connection, benchmark_queries, explain
+from Main import is_read_only
+
+MIN_ROWS = 10_000
+MAX_COVERING_COLUMNS = 4
+# Index names are cut to PostgreSQL's identifier limit
+MAX_NAME_LENGTH = 63
+
+_KEYWORDS = {"on", "where", "join", "left", "right", "inner", "outer", "full", "cross", "group", "order",
+             "limit", "using", "natural", "lateral"}
+# "FROM e.date" inside EXTRACT(...) is a column, not a table
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\b(?!\s*\.)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_COLUMN_REF = re.compile(r"\b(\w+)\.(\w+)\b")
+_JOIN_ON = re.compile(r"\bON\s+(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)", re.IGNORECASE)
+_WHERE = re.compile(r"\bWHERE\b(.*?)(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\)|$)", re.IGNORECASE | re.DOTALL)
+_NOT_NULL = re.compile(r"\b(\w+)\.(\w+)\s+IS\s+NOT\s+NULL\b", re.IGNORECASE)
+_IS_TRUE = re.compile(r"\b(\w+)\.(\w+)\s*(?:=\s*true\b|(?=\s*(?:AND\b|OR\b|$)))", re.IGNORECASE)
+_GROUP_BY = re.compile(r"\bGROUP\s+BY\b(.*?)(?=\bORDER\s+BY\b|\bLIMIT\b|\bHAVING\b|\)|$)", re.IGNORECASE | re.DOTALL)
+
+
+def aliases(sql):
+    """{alias: table} for every FROM/JOIN in the query (a table without alias maps to itself)"""
+    mapping = {}
+    for table, alias in _TABLE_ALIAS.findall(sql):
+        if alias and alias.lower() not in _KEYWORDS:
+            mapping[alias.lower()] = table.lower()
+        mapping[table.lower()] = table.lower()
+    return mapping
+
+
+def analyze_sql(sql):
+    """Splits the column references of one query into joins, WHERE predicates, GROUP BY and everything else.
+
+    Returns {table: {"join": set, "group": set, "partial": set of predicates, "all": set, "referenced": bool}}.
+    "join" only holds referencing (fact side) columns; "referenced" marks a table joined on its own id.
+    """
+    alias_map = aliases(sql)
+    usage = {}
+
+    def entry(alias):
+        table = alias_map.get(alias.lower())
+        if table is None:
+            return None
+        return usage.setdefault(table, {"join": set(), "group": set(), "partial": set(), "all": set(),
+                                        "referenced": False})
+
+    for alias, column in _COLUMN_REF.findall(sql):
+        target = entry(alias)
+        if target is not None:
+            target["all"].add(column.lower())
+    for left_alias, left_col, right_alias, right_col in _JOIN_ON.findall(sql):
+        for alias, column in ((left_alias, left_col), (right_alias, right_col)):
+            target = entry(alias)
+            if target is None:
+                continue
+            if column.lower() == "id":
+                target["referenced"] = True
+            else:
+                target["join"].add(column.lower())
+    for match in _WHERE.finditer(sql):
+        # FILTER (WHERE ...) only narrows one aggregate, not the rows that are scanned
+        if re.search(r"FILTER\s*\(\s*$", sql[:match.start()], re.IGNORECASE):
+            continue
+        clause = match.group(1)
+        for alias, column in _NOT_NULL.findall(clause):
+            target = entry(alias)
+            if target is not None:
+                target["partial"].add(f"{column.lower()} IS NOT NULL")
+        for alias, column in _IS_TRUE.findall(clause):
+            target = entry(alias)
+            if target is not None and column.lower().startswith(("has_", "is_")):
+                target["partial"].add(column.lower())
+    for match in _GROUP_BY.finditer(sql):
+        for alias, column in _COLUMN_REF.findall(match.group(1)):
+            target = entry(alias)
+            if target is not None:
+                target["group"].add(column.lower())
+    return usage
+
+
+def seq_scanned_tables(plan):
+    tables = set()
+    if plan.get("Node Type") == "Seq Scan" and "Relation Name" in plan:
+        tables.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        tables |= seq_scanned_tables(child)
+    return tables
+
+
+def table_stats(cursor):
+    """Estimated rows, columns and existing index key columns per table"""
+    cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p') "
+                   "AND relnamespace = 'public'::regnamespace")
+    rows = {name: max(tuples, 0) for name, tuples in cursor.fetchall()}
+    cursor.execute("SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = 'public'")
+    columns = {}
+    for table, column in cursor.fetchall():
+        columns.setdefault(table, set()).add(column)
+    cursor.execute("""
+        SELECT t.relname, array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord) ON true
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE t.relnamespace = 'public'::regnamespace
+        GROUP BY i.indexrelid, t.relname
+    """)
+    indexes = {}
+    for table, keys in cursor.fetchall():
+        indexes.setdefault(table, []).append(list(keys))
+    return rows, columns, indexes
+
+
+def top_statements(cursor, limit=20):
+    """Heaviest read-only statements from pg_stat_statements, if the extension is installed.
+
+    INSERT ... SELECT, data-modifying CTEs and the like are left out: measure() runs EXPLAIN ANALYZE,
+    which executes the statement.
+    """
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+    if cursor.fetchone() is None:
+        return []
+    for time_column in ("total_exec_time", "total_time"):
+        try:
+            cursor.execute(f"SELECT query, {time_column} FROM pg_stat_statements "
+                           f"WHERE query ~* '^\\s*(select|with)\\M' ORDER BY {time_column} DESC LIMIT %s", (limit,))
+            return [(query, total) for query, total in cursor.fetchall() if is_read_only(query)]
+        except Exception:
+            cursor.connection.rollback()
+    return []
+
+
+def propose(workload, scanned, rows, columns, indexes, min_rows=MIN_ROWS):
+    """Turns column usage into index proposals for large, sequentially scanned tables.
+
+    Each join gets its own single-column key on the referencing side; the referenced side is served
+    by its primary key. Queries needing the same key columns and predicate share one proposal; its
+    INCLUDE list keeps the columns most of them read, within MAX_COVERING_COLUMNS.
+    """
+    proposals = {}
+    for name, sql in workload.items():
+        for table, usage in analyze_sql(sql).items():
+            if table not in scanned.get(name, {table}) or rows.get(table, 0) < min_rows:
+                continue
+            known = columns.get(table, set())
+            key_sets = [[col] for col in sorted(usage["join"]) if col in known]
+            if not key_sets and not usage["referenced"]:
+                group = sorted(col for col in usage["group"] if col in known and col != "id")
+                key_sets = [group] if group else []
+            predicates = sorted(p for p in usage["partial"] if p.split()[0] in known)
+            where = " AND ".join(predicates)
+            where_columns = {p.split()[0] for p in predicates}
+            for keys in key_sets:
+                proposal = proposals.setdefault((table, tuple(keys), where), {
+                    "table": table, "columns": keys, "where": where, "queries": [], "reads": Counter(),
+                })
+                proposal["queries"].append(name)
+                proposal["reads"].update(col for col in usage["all"]
+                                         if col in known and col not in keys and col not in where_columns)
+
+    result = []
+    for proposal in proposals.values():
+        # An index (or primary key) on the same leading keys already serves these queries
+        keys = proposal["columns"]
+        if any(existing[:len(keys)] == keys for existing in indexes.get(proposal["table"], [])):
+            continue
+        room = MAX_COVERING_COLUMNS - len(keys)
+        proposal["include"] = sorted(col for col, _ in proposal.pop("reads").most_common(max(room, 0)))
+        if proposal["where"]:
+            proposal["kind"] = "partial"
+        elif proposal["include"]:
+            proposal["kind"] = "covering"
+        else:
+            proposal["kind"] = "composite" if len(keys) > 1 else "join"
+        result.append(proposal)
+    return result
+
+
+def index_name(proposal):
+    name = f"idx_{proposal['table']}_{'_'.join(proposal['columns'])}"
+    if proposal["include"]:
+        name += "_cov"
+    if proposal["where"]:
+        name += "_" + re.sub(r"\W+", "_", proposal["where"].lower()).strip("_")
+    return name[:MAX_NAME_LENGTH]
+
+
+def index_ddl(proposal, concurrently=True):
+    ddl = (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name(proposal)} "
+           f"ON {proposal['table']} ({', '.join(proposal['columns'])})")
+    if proposal["include"]:
+        ddl += f" INCLUDE ({', '.join(proposal['include'])})"
+    if proposal["where"]:
+        ddl += f" WHERE {proposal['where']}"
+    return ddl
+
+
+def measure(cursor, workload):
+    """EXPLAIN ANALYZE each query: {name: (execution ms, seq-scanned tables)}
+
+    Each run is in its own transaction that is always rolled back, so a statement that does
+    write something leaves no trace.
+    """
+    connection = cursor.connection
+    autocommit = connection.autocommit
+    connection.autocommit = False
+    results = {}
+    try:
+        for name, sql in workload.items():
+            try:
+                run = explain(cursor, sql)
+                results[name] = (run["Execution Time"], seq_scanned_tables(run["Plan"]))
+            except Exception as e:
+                print(f"⚠ Could not explain {name}: {e}")
+            finally:
+                connection.rollback()
+    finally:
+        connection.autocommit = autocommit
+    return results
+
+
+def advise(db_name, apply=False, min_rows=MIN_ROWS):
+    connection = bench_connection(db_name)
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            workload = benchmark_queries()
+            for i, (sql, total_ms) in enumerate(top_statements(cursor), start=1):
+                # Parameterized statements can't be EXPLAINed, but their column usage still counts
+                workload[f"pg_stat_statements#{i} ({total_ms:.0f} ms total)"] = sql
+
+            before = measure(cursor, workload)
+            scanned = {name: tables for name, (_, tables) in before.items()}
+            rows, columns, indexes = table_stats(cursor)
+            proposals = propose(workload, scanned, rows, columns, indexes, min_rows)
+
+            if not proposals:
+                print(f"No sequential scans on tables over {min_rows} rows that an index would help.")
+                return []
+            print(f"{len(proposals)} proposed indexes:")
+            for proposal in proposals:
+                print(f"  [{proposal['kind']}] {index_ddl(proposal)};\n      used by: {', '.join(proposal['queries'])}")
+
+            if apply:
+                for proposal in proposals:
+                    print(f"Creating {index_name(proposal)} ...")
+                    cursor.execute(index_ddl(proposal))
+                for table in sorted({proposal["table"] for proposal in proposals}):
+                    cursor.execute(f"ANALYZE {table}")
+
+                after = measure(cursor, {name: workload[name] for name in before})
+                print("\nBefore/after execution time:")
+                for name, (before_ms, _) in before.items():
+                    after_ms = after.get(name, (before_ms, None))[0]
+                    change = (after_ms / before_ms - 1) * 100 if before_ms else 0
+                    print(f"  {name:<24} {before_ms:>10.2f} ms → {after_ms:>10.2f} ms ({change:+.0f}%)")
+            return proposals
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes for the report workload")
+    parser.add_argument("--db", default=db.DB_NAME)
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes CONCURRENTLY and re-time")
+    parser.add_argument("--min-rows", type=int, default=MIN_ROWS, help="ignore tables smaller than this")
+    args = parser.parse_args()
+    advise(args.db, args.apply, args.min_rows)
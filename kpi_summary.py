@@ -0,0 +1,237 @@
+import time
+import argparse
+import db
+from data_import import resolve_columns
+
+# Running totals kept current by statement-level triggers on events and eventhistory, so the KPIs
+# the exporter and analytics.py show are a single-row read whatever the size of the history.
+SUMMARY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS kpi_summary (
+      Id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (Id),
+      EventsTotal BIGINT NOT NULL DEFAULT 0,
+      HistoryRows BIGINT NOT NULL DEFAULT 0,
+      AttendedRows BIGINT NOT NULL DEFAULT 0,
+      InterestedRows BIGINT NOT NULL DEFAULT 0,
+      RatingSum BIGINT NOT NULL DEFAULT 0,
+      RatingCount BIGINT NOT NULL DEFAULT 0,
+      ActiveUsers BIGINT NOT NULL DEFAULT 0,
+      UpdatedAt TIMESTAMP NOT NULL DEFAULT now()
+    );
+
+    -- Attended rows per user: an exact reference count, so distinct active users can go up and down
+    CREATE TABLE IF NOT EXISTS kpi_user_attendance (
+      UserId INTEGER PRIMARY KEY,
+      Attended BIGINT NOT NULL
+    );
+"""
+
+# Applies one statement's changes to the summary. {delta} yields the changed eventhistory rows with
+# sign = +1 (inserted/new version) or -1 (deleted/old version). The user upsert returns each user's
+# count after the change, so a user crossing zero moves ActiveUsers exactly.
+HISTORY_DELTA = """
+    WITH delta AS ({delta}),
+    per_user AS (
+        SELECT "{user}" AS user_id, SUM(sign) AS change
+        FROM delta WHERE "{attended}" AND "{user}" IS NOT NULL
+        GROUP BY "{user}" HAVING SUM(sign) <> 0
+    ),
+    upserted AS (
+        INSERT INTO kpi_user_attendance AS u (UserId, Attended)
+        SELECT user_id, change FROM per_user
+        ON CONFLICT (UserId) DO UPDATE SET Attended = u.Attended + EXCLUDED.Attended
+        RETURNING u.UserId, u.Attended
+    ),
+    active AS (
+        SELECT COALESCE(SUM(CASE WHEN a.Attended > 0 AND a.Attended - p.change <= 0 THEN 1
+                                 WHEN a.Attended <= 0 AND a.Attended - p.change > 0 THEN -1
+                                 ELSE 0 END), 0) AS change
+        FROM upserted a JOIN per_user p ON p.user_id = a.UserId
+    ),
+    totals AS (
+        SELECT COALESCE(SUM(sign), 0) AS history_rows,
+               COALESCE(SUM(sign) FILTER (WHERE "{attended}"), 0) AS attended_rows,
+               COALESCE(SUM(sign) FILTER (WHERE "{interested}"), 0) AS interested_rows,
+               COALESCE(SUM(sign * "{rate}"), 0) AS rating_sum,
+               COALESCE(SUM(sign) FILTER (WHERE "{rate}" IS NOT NULL), 0) AS rating_count
+        FROM delta
+    )
+    UPDATE kpi_summary SET
+        HistoryRows = HistoryRows + t.history_rows,
+        AttendedRows = AttendedRows + t.attended_rows,
+        InterestedRows = InterestedRows + t.interested_rows,
+        RatingSum = RatingSum + t.rating_sum,
+        RatingCount = RatingCount + t.rating_count,
+        ActiveUsers = ActiveUsers + a.change,
+        UpdatedAt = now()
+    FROM totals t, active a
+"""
+
+# Every trigger function takes the summary row lock before any kpi_user_attendance row, so two
+# writers always queue on the same lock first and can't deadlock on each other's user rows
+LOCK_SUMMARY = "PERFORM 1 FROM kpi_summary FOR UPDATE;"
+
+HISTORY_SOURCES = {
+    "insert": ("INSERT", "REFERENCING NEW TABLE AS new_rows", "SELECT *, 1 AS sign FROM new_rows"),
+    "update": ("UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+               "SELECT *, 1 AS sign FROM new_rows UNION ALL SELECT *, -1 AS sign FROM old_rows"),
+    "delete": ("DELETE", "REFERENCING OLD TABLE AS old_rows", "SELECT *, -1 AS sign FROM old_rows"),
+}
+
+# The summary only stays current while all seven triggers exist; recreating events or eventhistory
+# (data_import.py --migrate-partitions) drops them and the numbers freeze until install() runs again
+SUMMARY_STATE_QUERY = """
+    SELECT to_regclass('kpi_summary') IS NOT NULL AS installed,
+           (SELECT COUNT(*) FROM pg_trigger
+            WHERE tgrelid IN (to_regclass('events'), to_regclass('eventhistory'))
+              AND tgname IN ('kpi_events_insert', 'kpi_events_delete', 'kpi_events_truncate',
+                             'kpi_eventhistory_insert', 'kpi_eventhistory_update', 'kpi_eventhistory_delete',
+                             'kpi_eventhistory_truncate')) = 7 AS triggers
+"""
+
+READ_KPIS_QUERY = """
+    SELECT EventsTotal AS events_total,
+           HistoryRows AS history_rows,
+           ActiveUsers AS active_users,
+           ROUND(RatingSum::numeric / NULLIF(RatingCount, 0), 2) AS avg_rating,
+           ROUND(AttendedRows * 100.0 / NULLIF(HistoryRows, 0), 2) AS attendance_rate,
+           ROUND(InterestedRows * 100.0 / NULLIF(HistoryRows, 0), 2) AS interest_rate,
+           UpdatedAt AS updated_at
+    FROM kpi_summary
+"""
+
+
+def trigger_statements(cursor):
+    """Trigger functions and triggers, written for the column names this database uses"""
+    columns = resolve_columns(cursor, "eventhistory", ["UserId", "HasAttended", "IsInterested", "Rate"])
+    names = {"user": columns["UserId"], "attended": columns["HasAttended"],
+             "interested": columns["IsInterested"], "rate": columns["Rate"]}
+
+    statements = []
+    for operation, (event, referencing, source) in HISTORY_SOURCES.items():
+        body = HISTORY_DELTA.format(delta=source, **names)
+        statements += [
+            f"""CREATE OR REPLACE FUNCTION kpi_eventhistory_{operation}() RETURNS trigger AS $$
+                BEGIN {LOCK_SUMMARY} {body}; RETURN NULL; END $$ LANGUAGE plpgsql""",
+            f"DROP TRIGGER IF EXISTS kpi_eventhistory_{operation} ON eventhistory",
+            f"""CREATE TRIGGER kpi_eventhistory_{operation} AFTER {event} ON eventhistory
+                {referencing} FOR EACH STATEMENT EXECUTE FUNCTION kpi_eventhistory_{operation}()""",
+        ]
+    for operation, event, referencing, change in (
+        ("insert", "INSERT", "REFERENCING NEW TABLE AS new_rows", "(SELECT COUNT(*) FROM new_rows)"),
+        ("delete", "DELETE", "REFERENCING OLD TABLE AS old_rows", "-(SELECT COUNT(*) FROM old_rows)"),
+    ):
+        statements += [
+            f"""CREATE OR REPLACE FUNCTION kpi_events_{operation}() RETURNS trigger AS $$
+                BEGIN {LOCK_SUMMARY}
+                UPDATE kpi_summary SET EventsTotal = EventsTotal + {change}, UpdatedAt = now();
+                RETURN NULL; END $$ LANGUAGE plpgsql""",
+            f"DROP TRIGGER IF EXISTS kpi_events_{operation} ON events",
+            f"""CREATE TRIGGER kpi_events_{operation} AFTER {event} ON events
+                {referencing} FOR EACH STATEMENT EXECUTE FUNCTION kpi_events_{operation}()""",
+        ]
+    # TRUNCATE has no transition tables; it simply empties the matching counters
+    statements += [
+        f"""CREATE OR REPLACE FUNCTION kpi_truncate() RETURNS trigger AS $$
+           BEGIN
+             {LOCK_SUMMARY}
+             IF TG_TABLE_NAME = 'events' THEN
+               UPDATE kpi_summary SET EventsTotal = 0, UpdatedAt = now();
+             ELSE
+               UPDATE kpi_summary SET HistoryRows = 0, AttendedRows = 0, InterestedRows = 0, RatingSum = 0,
+                                      RatingCount = 0, ActiveUsers = 0, UpdatedAt = now();
+               TRUNCATE kpi_user_attendance;
+             END IF;
+             RETURN NULL;
+           END $$ LANGUAGE plpgsql""",
+    ]
+    for table in ("events", "eventhistory"):
+        statements += [
+            f"DROP TRIGGER IF EXISTS kpi_{table}_truncate ON {table}",
+            f"CREATE TRIGGER kpi_{table}_truncate AFTER TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION kpi_truncate()",
+        ]
+    return statements, names
+
+
+def install():
+    """Creates the summary tables and triggers and backfills them from the current data.
+
+    Runs in one transaction holding SHARE locks on events and eventhistory, so no write slips in
+    between the backfill and the triggers taking over. Run it again after recreating either table
+    (e.g. data_import.py --migrate-partitions).
+    """
+    start = time.perf_counter()
+    with db.get_connection() as connection:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(SUMMARY_SCHEMA)
+                cursor.execute("LOCK TABLE events, eventhistory IN SHARE MODE")
+                statements, names = trigger_statements(cursor)
+                for statement in statements:
+                    cursor.execute(statement)
+
+                cursor.execute("TRUNCATE kpi_summary, kpi_user_attendance")
+                cursor.execute(f"""
+                    INSERT INTO kpi_user_attendance (UserId, Attended)
+                    SELECT "{names['user']}", COUNT(*) FROM eventhistory
+                    WHERE "{names['attended']}" AND "{names['user']}" IS NOT NULL
+                    GROUP BY "{names['user']}"
+                """)
+                cursor.execute(f"""
+                    INSERT INTO kpi_summary (EventsTotal, HistoryRows, AttendedRows, InterestedRows,
+                                             RatingSum, RatingCount, ActiveUsers)
+                    SELECT (SELECT COUNT(*) FROM events),
+                           COUNT(*),
+                           COUNT(*) FILTER (WHERE "{names['attended']}"),
+                           COUNT(*) FILTER (WHERE "{names['interested']}"),
+                           COALESCE(SUM("{names['rate']}"), 0),
+                           COUNT("{names['rate']}"),
+                           (SELECT COUNT(*) FROM kpi_user_attendance)
+                    FROM eventhistory
+                """)
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            print(f"❌ Error installing KPI summary: {e}")
+            return False
+    print(f"✅ KPI summary installed and backfilled in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+def read_kpis():
+    """Current KPIs as a dict - a one-row read - or None, with a warning, while the summary is
+    not installed, has lost its triggers (its numbers would be stale) or has no row yet"""
+    state = db.run_query(SUMMARY_STATE_QUERY).iloc[0]
+    if not state["installed"]:
+        print("⚠ KPI summary is not installed, install it with `python kpi_summary.py`")
+        return None
+    if not state["triggers"]:
+        print("⚠ KPI summary triggers are missing (events or eventhistory were recreated), its numbers are "
+              "stale. Install it again with `python kpi_summary.py`")
+        return None
+    df = db.run_query(READ_KPIS_QUERY)
+    if not len(df):
+        print("⚠ KPI summary is empty, run `python kpi_summary.py` to backfill it")
+        return None
+    return df.iloc[0].to_dict()
+
+
+def print_kpis():
+    try:
+        kpis = read_kpis()
+    except Exception as e:
+        print(f"⚠ KPI summary not available, install it with `python kpi_summary.py` ({e})")
+        return
+    if kpis is None:
+        return
+    print(f"Events: {kpis['events_total']} | Active users: {kpis['active_users']} | "
+          f"Avg rating: {kpis['avg_rating']} | Attendance rate: {kpis['attendance_rate']}% | "
+          f"Interest rate: {kpis['interest_rate']}% (as of {kpis['updated_at']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trigger-maintained KPI summary tables")
+    parser.add_argument("--show", action="store_true", help="only print the current KPIs")
+    args = parser.parse_args()
+    if args.show or install():
+        print_kpis()
@@ -0,0 +1,116 @@
+import time
+import numpy as np
+import open3d as o3d
+
+# Rotations of a triangle's corners that keep its winding: row r puts corner r first
+_ROTATIONS = np.array([[0, 1, 2], [1, 2, 0], [2, 0, 1]])
+
+
+def plane_from_point_normal(point, normal):
+    """[a, b, c, d] of the plane through point with the given normal (ax + by + cz + d = 0)"""
+    normal = np.asarray(normal, dtype=np.float64)
+    return [*normal, -float(np.dot(normal, point))]
+
+
+def plane_distances(vertices, plane):
+    """Signed ax + by + cz + d for every vertex; negative is the side that is kept"""
+    a, b, c, d = plane
+    return vertices @ np.array([a, b, c], dtype=np.float64) + d
+
+
+def _as_planes(planes):
+    planes = np.asarray(planes, dtype=np.float64)
+    return planes.reshape(1, 4) if planes.ndim == 1 else planes
+
+
+def _split_plane(vertices, triangles, attributes, distances):
+    """One plane of boundary splitting: triangles crossing the plane are cut at the plane.
+
+    A crossing triangle with one vertex inside becomes one triangle, with two inside a quad (two
+    triangles). Cut points are shared by the triangles on both sides of an edge, so the cut edge
+    stays connected. Winding is preserved.
+    """
+    inside = distances < 0
+    corner_inside = inside[triangles]
+    count = corner_inside.sum(axis=1)
+    kept = triangles[count == 3]
+    one, two = triangles[count == 1], triangles[count == 2]
+    if len(one) == 0 and len(two) == 0:
+        return vertices, kept, attributes
+
+    # Rotate so the odd corner (the inside one of "one", the outside one of "two") comes first
+    one = np.take_along_axis(one, _ROTATIONS[corner_inside[count == 1].argmax(axis=1)], axis=1)
+    two = np.take_along_axis(two, _ROTATIONS[corner_inside[count == 2].argmin(axis=1)], axis=1)
+
+    # Each crossing edge gets one new vertex, found by the edge's (low, high) vertex ids
+    edges = np.concatenate([one[:, [0, 1]], one[:, [0, 2]], two[:, [0, 1]], two[:, [0, 2]]])
+    low, high = edges.min(axis=1), edges.max(axis=1)
+    _, first, inverse = np.unique(low * len(vertices) + high, return_index=True, return_inverse=True)
+    low, high = low[first], high[first]
+    t = (distances[low] / (distances[low] - distances[high]))[:, None]
+    new_ids = len(vertices) + inverse
+
+    vertices = np.concatenate([vertices, vertices[low] + t * (vertices[high] - vertices[low])])
+    attributes = [np.concatenate([values, values[low] + t * (values[high] - values[low])]) for values in attributes]
+
+    one_ab, one_ac, two_ob, two_oc = np.split(new_ids, np.cumsum([len(one), len(one), len(two)]))
+    # one: (a, b, c) with only a inside -> (a, ab, ac)
+    # two: (o, b, c) with o outside -> polygon (ob, b, c, oc) -> (ob, b, c) + (ob, c, oc)
+    triangles = np.concatenate([
+        kept,
+        np.stack([one[:, 0], one_ab, one_ac], axis=1),
+        np.stack([two_ob, two[:, 1], two[:, 2]], axis=1),
+        np.stack([two_ob, two[:, 2], two_oc], axis=1),
+    ])
+    return vertices, triangles, attributes
+
+
+def clip_arrays(vertices, triangles, planes, split_boundary=False, attributes=()):
+    """Keeps the part of a mesh where ax + by + cz + d < 0 for every plane.
+
+    planes is one [a, b, c, d] or a sequence of them. Without split_boundary, a triangle survives
+    only if all three vertices are kept (the cut is jagged along the boundary); with it, crossing
+    triangles are cut exactly at each plane. attributes are per-vertex arrays (colors, normals, ...)
+    carried along and interpolated at the cut.
+
+    Returns (vertices, triangles, attributes) with vertex indices remapped to the kept vertices.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    attributes = [np.asarray(values, dtype=np.float64) for values in attributes]
+    planes = _as_planes(planes)
+
+    if split_boundary:
+        for plane in planes:
+            vertices, triangles, attributes = _split_plane(vertices, triangles, attributes,
+                                                           plane_distances(vertices, plane))
+        # Vertices outside any plane are only still needed if a triangle uses them (cut points are)
+        keep = np.ones(len(vertices), dtype=bool)
+        for plane in planes:
+            keep &= plane_distances(vertices, plane) < 0
+        keep[triangles.ravel()] = True
+    else:
+        keep = np.ones(len(vertices), dtype=bool)
+        for plane in planes:
+            keep &= plane_distances(vertices, plane) < 0
+        triangles = triangles[keep[triangles].all(axis=1)]
+
+    # Old index -> new index of every kept vertex, applied to all triangles at once
+    index_map = np.cumsum(keep) - 1
+    return vertices[keep], index_map[triangles], [values[keep] for values in attributes]
+
+
+def clip_mesh(mesh, planes, split_boundary=False):
+    """Open3D TriangleMesh clipped by clip_arrays; vertex colors are kept, normals recomputed"""
+    start = time.perf_counter()
+    attributes = [np.asarray(mesh.vertex_colors)] if mesh.has_vertex_colors() else []
+    vertices, triangles, attributes = clip_arrays(np.asarray(mesh.vertices), np.asarray(mesh.triangles),
+                                                  planes, split_boundary, attributes)
+    clipped = o3d.geometry.TriangleMesh()
+    clipped.vertices = o3d.utility.Vector3dVector(vertices)
+    clipped.triangles = o3d.utility.Vector3iVector(triangles.astype(np.int32))
+    if attributes:
+        clipped.vertex_colors = o3d.utility.Vector3dVector(np.clip(attributes[0], 0, 1))
+    clipped.compute_vertex_normals()
+    print(f"✓ Clipped to {len(vertices)} vertices, {len(triangles)} triangles in {time.perf_counter() - start:.3f}s")
+    return clipped
@@ -1,9 +1,13 @@
-from prometheus_client import start_http_server, Gauge, Counter, Histogram
+from prometheus_client import start_http_server, Gauge, Counter, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
 import time
-import requests
+import threading
+import asyncio
+import aiohttp
 import random
-from datetime import datetime
-import psycopg2
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
 import os
 
 CITIES = {
@@ -14,27 +18,81 @@ CITIES = {
 }
 SELECTED_CITY = os.getenv("CITY", "Berlin")  # default is Berlin
 
-# Database connection
+# Database connection pool (same settings/env vars as the db module of the main project)
+DB_SETTINGS = {
+    "dbname": os.getenv("DB_NAME", "techno_events_db"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "0000"),
+    "host": os.getenv("DB_HOST", "host.docker.internal"),
+    "port": os.getenv("DB_PORT", "5432"),
+}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "2"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "10000"))
+
+# Database metrics are computed when Prometheus scrapes, at most once per this many seconds
+DB_METRICS_MIN_INTERVAL = float(os.getenv("DB_METRICS_MIN_INTERVAL", "15"))
+# Per-genre/country/city/venue series: the top N values by attendance, the rest summed into "other"
+DIMENSION_TOP_N = int(os.getenv("DIMENSION_TOP_N", "20"))
+# Incremental aggregates only see new eventhistory rows; a periodic full rebuild picks up edits and deletes
+DIMENSION_RESYNC_SECONDS = int(os.getenv("DIMENSION_RESYNC_SECONDS", "3600"))
+# SERIAL ids commit out of order: each refresh re-reads this many ids below the watermark, so a
+# transaction that took a lower id but committed later is still counted (once)
+DIMENSION_ID_WINDOW = int(os.getenv("DIMENSION_ID_WINDOW", "1000"))
+
+# The other collectors run on their own schedule: (interval seconds, timeout seconds)
+COLLECTOR_SCHEDULES = {
+    "weather": (int(os.getenv("WEATHER_INTERVAL", "300")), int(os.getenv("WEATHER_TIMEOUT", "10"))),
+    "api": (int(os.getenv("API_INTERVAL", "20")), int(os.getenv("API_TIMEOUT", "5"))),
+}
+
+_db_pool = None
+_connection_born = {}
+
+db_connection_acquire = Histogram('techno_db_connection_acquire_seconds', 'Time to get a connection from the pool')
+db_connections_opened = Counter('techno_db_connections_opened_total', 'Physical database connections opened')
+
+
+def get_db_pool():
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = ThreadedConnectionPool(
+            1, DB_POOL_SIZE,
+            options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+            **DB_SETTINGS
+        )
+    return _db_pool
+
+
+@contextmanager
 def get_db_connection():
-    return psycopg2.connect(
-        dbname="techno_events_db",
-        user="postgres",
-        password="0000",
-        host="host.docker.internal",
-        port="5432"
-    )
-
-
-# Create metrics - Database metrics
-events_total = Gauge('techno_events_total', 'Total number of events in database')
-active_users = Gauge('techno_active_users', 'Number of active users')
-avg_rating = Gauge('techno_avg_rating', 'Average event rating')
+    """Borrows a pooled connection; broken or older-than-recycle connections are replaced"""
+    pool = get_db_pool()
+    with db_connection_acquire.time():
+        conn = pool.getconn()
+        if id(conn) not in _connection_born:
+            _connection_born[id(conn)] = time.time()
+            db_connections_opened.inc()
+    broken = False
+    try:
+        yield conn
+        conn.rollback()  # read-only metrics: end the transaction so the connection is clean for reuse
+    except Exception:
+        broken = True
+        raise
+    finally:
+        expired = time.time() - _connection_born.get(id(conn), 0) > DB_POOL_RECYCLE
+        close = broken or expired or conn.closed
+        if close:
+            _connection_born.pop(id(conn), None)
+        pool.putconn(conn, close=close)
+
+
+# Create metrics (database metrics come from DatabaseCollector at scrape time)
 top_genre_popularity = Gauge('techno_top_genre_popularity', 'Popularity of top genre')
 api_requests_total = Counter('techno_api_requests_total', 'Total API requests')
 request_duration = Histogram('techno_request_duration_seconds', 'Request duration')
-event_attendance_rate = Gauge('techno_event_attendance_rate', 'Event attendance rate')
 user_engagement_score = Gauge('techno_user_engagement_score', 'User engagement score')
-database_size = Gauge('techno_database_size_mb', 'Database size in MB')
 uptime_seconds = Gauge('techno_uptime_seconds', 'Service uptime in seconds')
 
 # Weather API metrics
@@ -44,87 +102,326 @@ weather_windspeed = Gauge('techno_weather_windspeed', 'Current wind speed in km/
 weather_rain = Gauge('techno_weather_rain', 'Current rain volume', ['city'])
 weather_api_status = Gauge('techno_weather_api_status', 'Weather API status (1=up, 0=down)', ['city'])
 
-def get_weather_data():
-    """Collect weather data for all configured cities"""
-    for city, info in CITIES.items():
-        try:
-            lat, lon, tz = info["lat"], info["lon"], info["timezone"]
-            response = requests.get(
-                f"https://api.open-meteo.com/v1/forecast?"
-                f"latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,wind_speed_10m,rain&timezone={tz}",
-                timeout=10
-            )
+# Collector health
+collector_duration = Histogram('techno_collector_duration_seconds', 'Collector run time', ['collector'])
+collector_errors = Counter('techno_collector_errors_total', 'Failed or timed out collector runs', ['collector'])
+collector_last_success = Gauge('techno_collector_last_success_timestamp_seconds',
+                               'Unix time of the last successful collector run', ['collector'])
+collector_staleness = Gauge('techno_collector_staleness_seconds',
+                            'Seconds since the collector last succeeded', ['collector'])
+
+_last_success = {}
+
+
+async def fetch_city_weather(session, city, info):
+    try:
+        lat, lon, tz = info["lat"], info["lon"], info["timezone"]
+        async with session.get(
+            f"https://api.open-meteo.com/v1/forecast?"
+            f"latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,wind_speed_10m,rain&timezone={tz}"
+        ) as response:
             response.raise_for_status()
-            data = response.json()
-            current = data['current']
+            data = await response.json()
+        current = data['current']
 
-            weather_temperature.labels(city=city).set(current['temperature_2m'])
-            weather_humidity.labels(city=city).set(current['relative_humidity_2m'])
-            weather_windspeed.labels(city=city).set(current['wind_speed_10m'])
-            weather_rain.labels(city=city).set(current.get('rain', 0))
-            weather_api_status.labels(city=city).set(1)
+        weather_temperature.labels(city=city).set(current['temperature_2m'])
+        weather_humidity.labels(city=city).set(current['relative_humidity_2m'])
+        weather_windspeed.labels(city=city).set(current['wind_speed_10m'])
+        weather_rain.labels(city=city).set(current.get('rain', 0))
+        weather_api_status.labels(city=city).set(1)
 
-            print(f"{city}: {current['temperature_2m']}°C, {current['relative_humidity_2m']}% humidity")
+        print(f"{city}: {current['temperature_2m']}°C, {current['relative_humidity_2m']}% humidity")
+        return True
 
-        except Exception as e:
-            print(f"Weather API error ({city}): {e}")
-            weather_temperature.labels(city=city).set(20.0)
-            weather_humidity.labels(city=city).set(65.0)
-            weather_windspeed.labels(city=city).set(15.0)
-            weather_rain.labels(city=city).set(0.0)
-            weather_api_status.labels(city=city).set(0)
+    except Exception as e:
+        print(f"Weather API error ({city}): {e}")
+        weather_temperature.labels(city=city).set(20.0)
+        weather_humidity.labels(city=city).set(65.0)
+        weather_windspeed.labels(city=city).set(15.0)
+        weather_rain.labels(city=city).set(0.0)
+        weather_api_status.labels(city=city).set(0)
+        return False
+
+
+async def get_weather_data(session):
+    """Collect weather data for all configured cities concurrently on the shared session"""
+    results = await asyncio.gather(*(fetch_city_weather(session, city, info) for city, info in CITIES.items()))
+    if not any(results):
+        raise RuntimeError("no city returned weather data")
+
+
+# Every database metric from one statement and a single pass over eventhistory
+DATABASE_METRICS_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM events) AS events_total,
+        COUNT(DISTINCT user_id) FILTER (WHERE has_attended) AS active_users,
+        AVG(rate) AS avg_rating,
+        COUNT(*) FILTER (WHERE has_attended) * 100.0 / NULLIF(COUNT(*), 0) AS attendance_rate,
+        pg_database_size(current_database()) / 1024.0 / 1024.0 AS database_size_mb
+    FROM eventhistory
+"""
+
+DATABASE_METRICS = [
+    # (metric name, help, query column, decimals)
+    ('techno_events_total', 'Total number of events in database', 'events_total', None),
+    ('techno_active_users', 'Number of active users', 'active_users', None),
+    ('techno_avg_rating', 'Average event rating', 'avg_rating', 2),
+    ('techno_event_attendance_rate', 'Event attendance rate', 'attendance_rate', 2),
+    ('techno_database_size_mb', 'Database size in MB', 'database_size_mb', 1),
+]
+
+
+# Same metrics from the trigger-maintained summary (kpi_summary.py in the main project): one-row read
+KPI_SUMMARY_QUERY = """
+    SELECT EventsTotal AS events_total,
+           ActiveUsers AS active_users,
+           RatingSum::numeric / NULLIF(RatingCount, 0) AS avg_rating,
+           AttendedRows * 100.0 / NULLIF(HistoryRows, 0) AS attendance_rate,
+           pg_database_size(current_database()) / 1024.0 / 1024.0 AS database_size_mb
+    FROM kpi_summary
+"""
+
+# Same check as kpi_summary.read_kpis() (SUMMARY_STATE_QUERY), which this image can't import since it
+# only ships this folder: the summary is only current while all seven of its triggers exist, and
+# recreating events or eventhistory (data_import.py --migrate-partitions) drops them
+KPI_SUMMARY_ACTIVE_QUERY = """
+    SELECT to_regclass('kpi_summary') IS NOT NULL AND (
+        SELECT COUNT(*) FROM pg_trigger
+        WHERE tgrelid IN (to_regclass('events'), to_regclass('eventhistory'))
+          AND tgname IN ('kpi_events_insert', 'kpi_events_delete', 'kpi_events_truncate',
+                         'kpi_eventhistory_insert', 'kpi_eventhistory_update', 'kpi_eventhistory_delete',
+                         'kpi_eventhistory_truncate')
+    ) = 7
+"""
 
 
 def get_real_database_metrics():
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Get total events
-        cur.execute("SELECT COUNT(*) FROM events")
-        events_total.set(cur.fetchone()[0])
-
-        # Get active users
-        cur.execute("SELECT COUNT(DISTINCT user_id) FROM eventhistory WHERE has_attended = true")
-        active_users.set(cur.fetchone()[0])
-
-        # Get average rating
-        cur.execute("SELECT AVG(rate) FROM eventhistory WHERE rate IS NOT NULL")
-        avg_rating.set(round(cur.fetchone()[0] or 0, 2))
-
-        # Get attendance rate
-        cur.execute("""
-            SELECT 
-                COUNT(*) FILTER (WHERE has_attended = true) * 100.0 / COUNT(*)
-            FROM eventhistory
-        """)
-        event_attendance_rate.set(round(cur.fetchone()[0] or 0, 2))
-
-        # Get database size (approximate)
-        cur.execute("""
-            SELECT pg_database_size('techno_events_db') / 1024 / 1024
-        """)
-        database_size.set(round(cur.fetchone()[0] or 0, 1))
-
-        cur.close()
-        conn.close()
+    """Reads the KPI summary if its triggers keep it current and it has its row, else runs DATABASE_METRICS_QUERY.
 
-    except Exception as e:
-        print(f"Database error: {e}")
-        # Fallback to simulated metrics
-        events_total.set(random.randint(50, 100))
-        active_users.set(random.randint(10, 25))
-        avg_rating.set(round(random.uniform(3.5, 4.8), 2))
-        event_attendance_rate.set(round(random.uniform(60, 90), 2))
-        database_size.set(round(random.uniform(50, 150), 1))
+    Returns {column: value}.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(KPI_SUMMARY_ACTIVE_QUERY)
+            row = None
+            if cur.fetchone()[0]:
+                cur.execute(KPI_SUMMARY_QUERY)
+                # Empty between installing the triggers and the backfill
+                row = cur.fetchone()
+            if row is None:
+                cur.execute(DATABASE_METRICS_QUERY)
+                row = cur.fetchone()
+            return dict(zip([desc[0] for desc in cur.description], row))
+
+
+class CachedCollector(ABC):
+    """Base for collectors that compute their metrics when Prometheus scrapes, behind a min-interval cache.
+
+    Concurrent scrapes (several Prometheus replicas) share one fetch: the first one refreshes the
+    cache while the others wait on the lock and then read the fresh values. If a fetch fails, the
+    last good values (if any) are served and no fetch is tried for min_interval. Subclasses set
+    `name` and implement fetch() and families(values), where families(None) yields the empty
+    metric families for describe().
+    """
+    name = None
+
+    def __init__(self, min_interval=DB_METRICS_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._values = None
+        self._fetched_at = 0.0
+        self._failed_at = 0.0
+
+    @abstractmethod
+    def fetch(self):
+        """Queries the database; returns the values families() turns into metrics"""
+
+    @abstractmethod
+    def families(self, values):
+        """Metric families for values, or the empty families when values is None"""
+
+    def _skip_fetch(self):
+        now = time.time()
+        # A recent failure backs off too, also while nothing has been cached yet
+        if now - self._failed_at < self.min_interval:
+            return True
+        return self._values is not None and now - self._fetched_at < self.min_interval
+
+    def refresh(self):
+        if self._skip_fetch():
+            return self._values
+        with self._lock:
+            # Another scrape may have refreshed the cache while this one waited
+            if self._skip_fetch():
+                return self._values
+            try:
+                with collector_duration.labels(collector=self.name).time():
+                    values = self.fetch()
+                self._values, self._fetched_at, self._failed_at = values, time.time(), 0.0
+                _last_success[self.name] = self._fetched_at
+                collector_last_success.labels(collector=self.name).set(self._fetched_at)
+            except Exception as e:
+                collector_errors.labels(collector=self.name).inc()
+                print(f"Collector {self.name} failed: {e}")
+                # Back off for a full interval instead of hammering a failing database on every scrape
+                self._failed_at = time.time()
+            return self._values
 
+    def describe(self):
+        # Lets REGISTRY.register() learn the metric names without running any query
+        return self.families(None)
 
-def simulate_api_calls():
+    def collect(self):
+        values = self.refresh()
+        if values is not None:
+            yield from self.families(values)
+
+
+class DatabaseCollector(CachedCollector):
+    """Global database metrics from DATABASE_METRICS_QUERY"""
+    name = "database"
+
+    def fetch(self):
+        return get_real_database_metrics()
+
+    def families(self, values):
+        for name, documentation, column, decimals in DATABASE_METRICS:
+            if values is None:
+                yield GaugeMetricFamily(name, documentation)
+                continue
+            value = float(values[column] or 0)
+            yield GaugeMetricFamily(name, documentation, value=round(value, decimals) if decimals else value)
+        age = None if values is None else time.time() - _last_success[self.name]
+        yield GaugeMetricFamily('techno_db_metrics_age_seconds', 'Age of the cached database metrics', value=age)
+
+
+DIMENSIONS = ["genre", "country", "city", "venue"]
+
+# Events carry every dimension; only events newer than the last one seen are read
+EVENT_DIMENSIONS_QUERY = """
+    SELECT e.id, g.name, c.name, l.name, e.venue
+    FROM events e
+    LEFT JOIN genres g ON e.genre_id = g.id
+    LEFT JOIN locations l ON e.location_id = l.id
+    LEFT JOIN countries c ON l.country_id = c.id
+    WHERE e.id > %s
+"""
+
+# Per-event totals and ids of the eventhistory rows not counted yet (an id range on the primary key
+# minus the ids already seen in it)
+HISTORY_DELTA_QUERY = """
+    SELECT event_id,
+           COUNT(*) FILTER (WHERE has_attended),
+           COUNT(*) FILTER (WHERE is_interested),
+           COALESCE(SUM(rate), 0),
+           COUNT(rate),
+           array_agg(id)
+    FROM eventhistory
+    WHERE id > %s AND id <> ALL(%s)
+    GROUP BY event_id
+"""
+
+DIMENSION_METRICS = [
+    # (metric name, help, index in the totals list)
+    ('techno_dimension_events', 'Events per dimension value', 0),
+    ('techno_dimension_attendance', 'Attendances per dimension value', 1),
+    ('techno_dimension_interest', 'Users interested per dimension value', 2),
+]
+
+
+def top_n_with_other(totals, n=DIMENSION_TOP_N):
+    """Keeps the n values with the most attendance (then events) and sums the rest into "other" """
+    ranked = sorted(totals.items(), key=lambda item: (item[1][1], item[1][0]), reverse=True)
+    kept = dict(ranked[:n])
+    if len(ranked) > n:
+        other = [0] * 5
+        for _, stats in ranked[n:]:
+            other = [a + b for a, b in zip(other, stats)]
+        kept["other"] = other
+    return kept
+
+
+class DimensionCollector(CachedCollector):
+    """Events, attendance, interest and average rating per genre, country, city and venue.
+
+    Keeps running per-event totals in memory and on each refresh only aggregates eventhistory rows
+    with an id above the last one processed, so the cost follows the new rows rather than the size
+    of the history. The last DIMENSION_ID_WINDOW ids are read again, skipping the ids already seen,
+    to catch rows that committed after a higher id. Rolling per-event totals up to the dimensions
+    is O(events).
+    """
+    name = "dimensions"
+
+    def __init__(self, min_interval=DB_METRICS_MIN_INTERVAL):
+        super().__init__(min_interval)
+        self._reset()
+
+    def _reset(self):
+        self.event_dimensions = {}  # event id -> (genre, country, city, venue)
+        self.event_totals = {}  # event id -> [attended, interested, rating sum, rating count]
+        self.last_event_id = 0
+        self.last_history_id = 0
+        self.seen_history_ids = set()  # ids counted within the window below last_history_id
+        self.synced_at = time.time()
+
+    def fetch(self):
+        if time.time() - self.synced_at > DIMENSION_RESYNC_SECONDS:
+            self._reset()
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                # Re-reading an event only overwrites its entry, no need to track which ones were seen
+                cur.execute(EVENT_DIMENSIONS_QUERY, (self.last_event_id - DIMENSION_ID_WINDOW,))
+                for event_id, *dimensions in cur.fetchall():
+                    self.event_dimensions[event_id] = tuple(value or "unknown" for value in dimensions)
+                    self.last_event_id = max(self.last_event_id, event_id)
+
+                cur.execute(HISTORY_DELTA_QUERY, (self.last_history_id - DIMENSION_ID_WINDOW,
+                                                  sorted(self.seen_history_ids)))
+                for event_id, *delta, ids in cur.fetchall():
+                    totals = self.event_totals.setdefault(event_id, [0, 0, 0, 0])
+                    for i, value in enumerate(delta):
+                        totals[i] += int(value)
+                    self.seen_history_ids.update(ids)
+                    self.last_history_id = max(self.last_history_id, max(ids))
+                low = self.last_history_id - DIMENSION_ID_WINDOW
+                self.seen_history_ids = {i for i in self.seen_history_ids if i > low}
+        return self.rollup()
+
+    def rollup(self):
+        """{dimension: {value: [events, attended, interested, rating sum, rating count]}}, top-N limited"""
+        result = {}
+        for i, dimension in enumerate(DIMENSIONS):
+            totals = {}
+            for event_id, dimensions in self.event_dimensions.items():
+                stats = totals.setdefault(dimensions[i], [0, 0, 0, 0, 0])
+                stats[0] += 1
+                for j, value in enumerate(self.event_totals.get(event_id, ())):
+                    stats[j + 1] += value
+            result[dimension] = top_n_with_other(totals, DIMENSION_TOP_N)
+        return result
+
+    def families(self, values):
+        for name, documentation, index in DIMENSION_METRICS:
+            family = GaugeMetricFamily(name, documentation, labels=["dimension", "value"])
+            for dimension, totals in (values or {}).items():
+                for value, stats in totals.items():
+                    family.add_metric([dimension, value], stats[index])
+            yield family
+        family = GaugeMetricFamily('techno_dimension_avg_rating', 'Average rating per dimension value',
+                                   labels=["dimension", "value"])
+        for dimension, totals in (values or {}).items():
+            for value, stats in totals.items():
+                if stats[4]:
+                    family.add_metric([dimension, value], round(stats[3] / stats[4], 2))
+        yield family
+
+
+async def simulate_api_calls():
     api_requests_total.inc()
 
     # Simulate request duration
     with request_duration.time():
-        time.sleep(random.uniform(0.1, 0.5))
+        await asyncio.sleep(random.uniform(0.1, 0.5))
 
     # Update uptime
     uptime_seconds.set(time.time() - start_time)
@@ -134,16 +431,57 @@ def simulate_api_calls():
     user_engagement_score.set(round(random.uniform(70, 95), 1))
 
 
+async def get_api_metrics(session):
+    await simulate_api_calls()
+
+
+COLLECTORS = {
+    "weather": get_weather_data,
+    "api": get_api_metrics,
+}
+
+
+def _staleness(name):
+    return lambda: time.time() - _last_success[name] if name in _last_success else float("inf")
+
+
+async def run_collector(name, collect, session):
+    """Runs one collector forever on its own interval; a slow or failing collector delays nobody else"""
+    interval, timeout = COLLECTOR_SCHEDULES[name]
+    collector_staleness.labels(collector=name).set_function(_staleness(name))
+    while True:
+        started = time.time()
+        try:
+            with collector_duration.labels(collector=name).time():
+                await asyncio.wait_for(collect(session), timeout)
+            _last_success[name] = time.time()
+            collector_last_success.labels(collector=name).set(_last_success[name])
+        except asyncio.TimeoutError:
+            collector_errors.labels(collector=name).inc()
+            print(f"Collector {name} timed out after {timeout}s")
+        except Exception as e:
+            collector_errors.labels(collector=name).inc()
+            print(f"Collector {name} failed: {e}")
+        await asyncio.sleep(max(0.0, interval - (time.time() - started)))
+
+
+async def main():
+    # One HTTP session (connection pool, keep-alive) shared by every request of every collector
+    timeout = aiohttp.ClientTimeout(total=COLLECTOR_SCHEDULES["weather"][1])
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        await asyncio.gather(*(run_collector(name, collect, session) for name, collect in COLLECTORS.items()))
+
+
 if __name__ == '__main__':
     start_time = time.time()
 
+    for collector in (DatabaseCollector(), DimensionCollector()):
+        REGISTRY.register(collector)
+        collector_staleness.labels(collector=collector.name).set_function(_staleness(collector.name))
+
     # Start Prometheus metrics server
     start_http_server(8000)
     print("Custom exporter started on port 8000")
-    print("Collecting weather data for Berlin, Germany...")
+    print(f"Collecting weather data for {', '.join(CITIES)}...")
 
-    while True:
-        get_real_database_metrics()
-        get_weather_data()  # New: Get weather data every cycle
-        simulate_api_calls()
-        time.sleep(20)  # Update every 20 seconds as required
\ No newline at end of file
+    asyncio.run(main())
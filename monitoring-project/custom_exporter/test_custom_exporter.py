@@ -0,0 +1,137 @@
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+import custom_exporter
+
+
+class FakeCursor:
+    """Answers the exporter's queries from {query: (columns, rows)}"""
+
+    def __init__(self, results):
+        self.results = results
+        self.executed = []
+        self.rows = []
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        self.executed.append(query)
+        columns, self.rows = self.results[query]
+        self.description = [(column,) for column in columns]
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def fake_db(cursor):
+    @contextmanager
+    def connection():
+        yield FakeConnection(cursor)
+    return mock.patch.object(custom_exporter, "get_db_connection", connection)
+
+
+FULL_QUERY_ROW = (10, 4, 4.2, 55.0, 12.5)
+FULL_QUERY_COLUMNS = ["events_total", "active_users", "avg_rating", "attendance_rate", "database_size_mb"]
+
+
+class DatabaseMetricsTest(unittest.TestCase):
+    def results(self, summary_active, summary_rows):
+        return {
+            custom_exporter.KPI_SUMMARY_ACTIVE_QUERY: (["active"], [(summary_active,)]),
+            custom_exporter.KPI_SUMMARY_QUERY: (FULL_QUERY_COLUMNS, summary_rows),
+            custom_exporter.DATABASE_METRICS_QUERY: (FULL_QUERY_COLUMNS, [FULL_QUERY_ROW]),
+        }
+
+    def test_reads_kpi_summary_when_filled(self):
+        cursor = FakeCursor(self.results(True, [(11, 5, 4.0, 60.0, 12.5)]))
+        with fake_db(cursor):
+            metrics = custom_exporter.get_real_database_metrics()
+        self.assertEqual(metrics["events_total"], 11)
+        self.assertNotIn(custom_exporter.DATABASE_METRICS_QUERY, cursor.executed)
+
+    def test_empty_kpi_summary_falls_back_to_full_query(self):
+        cursor = FakeCursor(self.results(True, []))
+        with fake_db(cursor):
+            metrics = custom_exporter.get_real_database_metrics()
+        self.assertEqual(metrics, dict(zip(FULL_QUERY_COLUMNS, FULL_QUERY_ROW)))
+        self.assertEqual(cursor.executed[-1], custom_exporter.DATABASE_METRICS_QUERY)
+
+    def test_missing_kpi_summary_or_triggers_run_full_query(self):
+        cursor = FakeCursor(self.results(False, []))
+        with fake_db(cursor):
+            metrics = custom_exporter.get_real_database_metrics()
+        self.assertEqual(metrics["active_users"], 4)
+        self.assertNotIn(custom_exporter.KPI_SUMMARY_QUERY, cursor.executed)
+
+
+class FakeHistoryCursor(FakeCursor):
+    """Serves DimensionCollector from committed eventhistory rows (id, event_id, attended, interested, rate)"""
+
+    def __init__(self, history):
+        super().__init__({})
+        self.history = history
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        if query == custom_exporter.EVENT_DIMENSIONS_QUERY:
+            self.rows = [(1, "techno", "Germany", "Berlin", "Berghain")]
+            return
+        low, seen = params
+        per_event = {}
+        for row_id, event_id, attended, interested, rate in self.history:
+            if row_id > low and row_id not in seen:
+                stats = per_event.setdefault(event_id, [0, 0, 0, 0, []])
+                stats[0] += attended
+                stats[1] += interested
+                stats[2] += rate or 0
+                stats[3] += rate is not None
+                stats[4].append(row_id)
+        self.rows = [(event_id, *stats) for event_id, stats in per_event.items()]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class DimensionCollectorTest(unittest.TestCase):
+    def test_late_commit_below_watermark_is_counted_once(self):
+        # Ids 1 and 3 commit first; 2 was taken earlier by a transaction that commits afterwards
+        history = [(1, 1, True, False, 5), (3, 1, True, False, 3)]
+        cursor = FakeHistoryCursor(history)
+        collector = custom_exporter.DimensionCollector()
+        with fake_db(cursor):
+            collector.fetch()
+            history.append((2, 1, False, True, 4))
+            collector.fetch()
+            values = collector.fetch()
+        self.assertEqual(collector.event_totals[1], [2, 1, 12, 3])
+        self.assertEqual(values["genre"]["techno"], [1, 2, 1, 12, 3])
+
+
+class CachedCollectorTest(unittest.TestCase):
+    def test_subclass_missing_a_method_fails_on_creation(self):
+        class NoFamilies(custom_exporter.CachedCollector):
+            name = "incomplete"
+
+            def fetch(self):
+                return {}
+
+        with self.assertRaises(TypeError):
+            NoFamilies()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import mmap
+import time
+import numpy as np
+import open3d as o3d
+
+# The file is parsed in slices of about this size, cut at line boundaries
+CHUNK_BYTES = 64 * 1024 * 1024
+
+_NEWLINE = ord("\n")
+_SLASH = ord("/")
+# Byte -> is-whitespace lookup tables, cheaper than np.isin on every byte
+_IS_SEPARATOR = np.zeros(256, dtype=bool)
+_IS_SEPARATOR[[ord(" "), ord("\t")]] = True
+_IS_SPACE = _IS_SEPARATOR.copy()
+_IS_SPACE[[ord("\r"), _NEWLINE]] = True
+
+
+def _select_lines(buf, starts, ends, mask):
+    """Bytes of the lines selected by mask (newlines included), gathered with one boolean index"""
+    return buf[starts[0]:ends[-1]][np.repeat(mask, ends - starts)]
+
+
+def _parse_vertices(lines, count):
+    """(count, 3) float64 positions from "v x y z [w | r g b]" lines"""
+    data = lines.tobytes()
+    # Fast path: every line is exactly "v x y z", parsed in one C call once the markers are blanked
+    values = np.fromstring(data.replace(b"v", b" "), sep=" ")
+    if values.size == count * 3:
+        return values.reshape(count, 3)
+    tokens = np.array(data.split())
+    markers = np.flatnonzero(tokens == b"v")
+    return np.stack([tokens[markers + 1], tokens[markers + 2], tokens[markers + 3]], axis=1).astype(np.float64)
+
+
+def _parse_faces(lines, vertex_base):
+    """Triangles (0-based) from "f a b c ..." lines; polygons are fan-triangulated.
+
+    vertex_base[i] is the number of vertices defined before face line i, which negative (relative)
+    indices count back from.
+    """
+    lines = lines.copy()
+    space = _IS_SPACE[lines]
+    # "12/5/7" -> "12": blank every byte after the first slash of a token (texture/normal references)
+    slashes = np.cumsum(lines == _SLASH, dtype=np.int32)
+    slashes_at_token_start = np.maximum.accumulate(np.where(space, slashes, 0))
+    lines[(slashes > slashes_at_token_start) | (lines == _SLASH) | (lines == ord("f"))] = ord(" ")
+    space = _IS_SPACE[lines]
+
+    # Vertices per polygon = token starts per line
+    token_start = ~space & np.concatenate(([True], space[:-1]))
+    line_starts = np.concatenate(([0], np.flatnonzero(lines[:-1] == _NEWLINE) + 1))
+    sizes = np.add.reduceat(token_start.astype(np.int64), line_starts)
+    refs = np.fromstring(lines.tobytes(), dtype=np.int64, sep=" ")
+
+    base = np.repeat(vertex_base, sizes)
+    refs = np.where(refs > 0, refs - 1, base + refs)
+
+    # Fan triangulation: polygon (p0, p1, ..., pn-1) -> (p0, pk, pk+1) for k = 1 .. n-2
+    triangle_counts = np.maximum(sizes - 2, 0)
+    first = np.cumsum(sizes) - sizes
+    polygon = np.repeat(np.arange(len(sizes)), triangle_counts)
+    k = np.arange(triangle_counts.sum()) - np.repeat(np.cumsum(triangle_counts) - triangle_counts, triangle_counts) + 1
+    anchor = first[polygon]
+    return np.stack([refs[anchor], refs[anchor + k], refs[anchor + k + 1]], axis=1)
+
+
+def _chunk_end(data, start, chunk_bytes):
+    """End of the slice starting at start: just after the last newline within chunk_bytes"""
+    stop = min(start + chunk_bytes, len(data))
+    if stop == len(data):
+        return stop
+    newlines = np.flatnonzero(data[start:stop] == _NEWLINE)
+    if len(newlines):
+        return start + newlines[-1] + 1
+    # A single line longer than chunk_bytes: extend to its end
+    following = np.flatnonzero(data[stop:] == _NEWLINE)
+    return stop + following[0] + 1 if len(following) else len(data)
+
+
+def _parse_chunk(buf, vertex_count):
+    """Vertices and triangles of one slice; vertex_count is the number of vertices in earlier slices"""
+    newlines = np.flatnonzero(buf == _NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.append(newlines + 1, len(buf))
+    keep = starts < len(buf)
+    starts, ends = starts[keep], ends[keep]
+    # Record type from the first two bytes of each line: "v " / "f " (not "vt", "vn", "fo" ...)
+    first = buf[starts]
+    second = buf[np.minimum(starts + 1, len(buf) - 1)]
+    separated = _IS_SEPARATOR[second] & (ends - starts > 1)
+    is_vertex = (first == ord("v")) & separated
+    is_face = (first == ord("f")) & separated
+
+    vertices = np.empty((0, 3))
+    if is_vertex.any():
+        vertices = _parse_vertices(_select_lines(buf, starts, ends, is_vertex), int(is_vertex.sum()))
+    triangles = np.empty((0, 3), dtype=np.int64)
+    if is_face.any():
+        vertex_base = vertex_count + np.cumsum(is_vertex)[is_face]
+        triangles = _parse_faces(_select_lines(buf, starts, ends, is_face), vertex_base)
+    return vertices, triangles
+
+
+def iter_obj_chunks(file_path, chunk_bytes=CHUNK_BYTES):
+    """Streams an OBJ file as (vertices, triangles) array pairs, one per slice of the file.
+
+    The file is memory-mapped and each slice is classified line by line with NumPy; only `v` and
+    `f` lines are copied out for parsing. Triangle indices are global (0-based over the whole file),
+    so chunks can be concatenated or consumed one at a time.
+    """
+    with open(file_path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            try:
+                vertex_count = 0
+                start = 0
+                while start < len(data):
+                    stop = _chunk_end(data, start, chunk_bytes)
+                    vertices, triangles = _parse_chunk(data[start:stop], vertex_count)
+                    vertex_count += len(vertices)
+                    yield vertices, triangles
+                    start = stop
+            finally:
+                # Views into the map must be gone before it closes, also when the consumer stops early
+                del data
+
+
+def load_obj_arrays(file_path, chunk_bytes=CHUNK_BYTES):
+    """Whole OBJ as (vertices float64 (N, 3), triangles int32 (M, 3)); invalid faces are dropped"""
+    vertex_chunks, triangle_chunks = [], []
+    for vertices, triangles in iter_obj_chunks(file_path, chunk_bytes):
+        vertex_chunks.append(vertices)
+        triangle_chunks.append(triangles)
+    vertices = np.concatenate(vertex_chunks) if vertex_chunks else np.empty((0, 3))
+    triangles = np.concatenate(triangle_chunks) if triangle_chunks else np.empty((0, 3), dtype=np.int64)
+
+    valid = ((triangles >= 0) & (triangles < len(vertices))).all(axis=1)
+    if not valid.all():
+        print(f"⚠ Dropped {int((~valid).sum())} faces referencing missing vertices")
+        triangles = triangles[valid]
+    return vertices, triangles.astype(np.int32)
+
+
+def load_obj_mesh(file_path, chunk_bytes=CHUNK_BYTES):
+    """Loads an OBJ into an Open3D TriangleMesh with vertex normals, or None if it has no faces"""
+    start = time.perf_counter()
+    vertices, triangles = load_obj_arrays(file_path, chunk_bytes)
+    if len(vertices) == 0 or len(triangles) == 0:
+        return None
+    mesh = o3d.geometry.TriangleMesh()
+    mesh.vertices = o3d.utility.Vector3dVector(vertices)
+    mesh.triangles = o3d.utility.Vector3iVector(triangles)
+    mesh.compute_vertex_normals()
+    print(f"✓ Loaded {len(vertices)} vertices, {len(triangles)} triangles in {time.perf_counter() - start:.2f}s")
+    return mesh
@@ -0,0 +1,319 @@
+import time
+import argparse
+import numpy as np
+import open3d as o3d
+
+# Finest level: the bounding cube is split into 2^MAX_DEPTH cells per axis (at most 21 for 64-bit codes)
+MAX_DEPTH = 16
+# Node summaries are kept for the levels with at most this many nodes; finer levels are computed
+# from the sorted codes when queried and not retained, so memory stays bounded for huge clouds.
+MAX_SUMMARY_NODES = 1 << 20
+# Points are encoded in slices of this size to bound the temporaries of the Morton encoding
+CHUNK_POINTS = 4_000_000
+# Points are kept as float32 offsets from the octree origin, in Morton order: 12 bytes plus an
+# 8-byte code per point. Offsets keep float32 precise for georeferenced clouds (x ~ 5e5, y ~ 4e6).
+POINT_DTYPE = np.float32
+
+
+def _spread_bits(v):
+    """Inserts two zero bits between each of the low 21 bits of v (uint64)"""
+    v = v & np.uint64(0x1FFFFF)
+    v = (v | v << np.uint64(32)) & np.uint64(0x1F00000000FFFF)
+    v = (v | v << np.uint64(16)) & np.uint64(0x1F0000FF0000FF)
+    v = (v | v << np.uint64(8)) & np.uint64(0x100F00F00F00F00F)
+    v = (v | v << np.uint64(4)) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | v << np.uint64(2)) & np.uint64(0x1249249249249249)
+    return v
+
+
+def _compact_bits(v):
+    """Inverse of _spread_bits: every third bit of v packed into the low 21 bits"""
+    v = v & np.uint64(0x1249249249249249)
+    v = (v | v >> np.uint64(2)) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | v >> np.uint64(4)) & np.uint64(0x100F00F00F00F00F)
+    v = (v | v >> np.uint64(8)) & np.uint64(0x1F0000FF0000FF)
+    v = (v | v >> np.uint64(16)) & np.uint64(0x1F00000000FFFF)
+    v = (v | v >> np.uint64(32)) & np.uint64(0x1FFFFF)
+    return v
+
+
+def morton_codes(cells):
+    """(N, 3) non-negative integer cell coordinates -> (N,) uint64 Z-order codes"""
+    cells = cells.astype(np.uint64)
+    return (_spread_bits(cells[:, 0]) << np.uint64(2)) | (_spread_bits(cells[:, 1]) << np.uint64(1)) | \
+        _spread_bits(cells[:, 2])
+
+
+def morton_cells(codes):
+    """(M,) codes -> (M, 3) int64 cell coordinates at the codes' level"""
+    codes = codes.astype(np.uint64)
+    return np.stack([_compact_bits(codes >> np.uint64(2)), _compact_bits(codes >> np.uint64(1)),
+                     _compact_bits(codes)], axis=1).astype(np.int64)
+
+
+def _ranges(starts, counts):
+    """Concatenation of arange(start, start + count) for every pair, without a Python loop"""
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(np.asarray(starts, dtype=np.int64) - (np.cumsum(counts) - counts), counts)
+    return offsets + np.arange(total)
+
+
+def _segment_starts(keys):
+    """Start positions of the runs of equal values in a sorted array"""
+    flags = np.empty(len(keys), dtype=bool)
+    flags[:1] = True
+    np.not_equal(keys[1:], keys[:-1], out=flags[1:])
+    return np.flatnonzero(flags)
+
+
+class PointOctree:
+    """Linear (Morton-ordered) octree over a point cloud.
+
+    Points are sorted by their Z-order code at MAX_DEPTH, so every node at every level is a
+    contiguous slice of the point array. A level's summary holds, per non-empty node, its code,
+    slice (start, count), tight point bounds, centroid and mean color; these answer bounding-box,
+    extreme-point and level-of-detail queries without touching most points. `points` and the
+    summaries are relative to `origin`; every query takes and returns absolute float64 coordinates.
+    """
+
+    def __init__(self, points, colors=None, max_depth=MAX_DEPTH, max_summary_nodes=MAX_SUMMARY_NODES):
+        if not 0 < max_depth <= 21:
+            raise ValueError("max_depth must be between 1 and 21")
+        points = np.asarray(points)
+        if len(points) == 0:
+            raise ValueError("Cannot build an octree over an empty point cloud")
+        self.max_depth = max_depth
+        low, high = points.min(axis=0).astype(np.float64), points.max(axis=0).astype(np.float64)
+        # A cube, slightly enlarged so the maximum lands inside the last cell
+        self.size = max(float((high - low).max()), 1e-12) * (1 + 1e-9)
+        self.origin = (low + high) / 2 - self.size / 2
+
+        resolution = 1 << max_depth
+        codes = np.empty(len(points), dtype=np.uint64)
+        for start in range(0, len(points), CHUNK_POINTS):
+            chunk = points[start:start + CHUNK_POINTS]
+            cells = np.floor((chunk - self.origin) / self.size * resolution).astype(np.int64)
+            codes[start:start + CHUNK_POINTS] = morton_codes(np.clip(cells, 0, resolution - 1))
+
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        del codes
+        self.points = np.empty(points.shape, dtype=POINT_DTYPE)
+        for start in range(0, len(points), CHUNK_POINTS):
+            self.points[start:start + CHUNK_POINTS] = points[order[start:start + CHUNK_POINTS]] - self.origin
+        self.colors = np.asarray(colors)[order].astype(POINT_DTYPE, copy=False) \
+            if colors is not None and len(colors) else None
+        del order
+
+        # Deepest summarized level: the last one within max_summary_nodes
+        self.summary_depth = 0
+        for level in range(1, max_depth + 1):
+            if len(_segment_starts(self.codes >> np.uint64(3 * (max_depth - level)))) > max_summary_nodes:
+                break
+            self.summary_depth = level
+        self.levels = {self.summary_depth: self._summarize(self.summary_depth)}
+        # Coarser levels are aggregated from their children instead of from the points
+        for level in range(self.summary_depth - 1, -1, -1):
+            self.levels[level] = self._aggregate(self.levels[level + 1])
+
+    @classmethod
+    def from_point_cloud(cls, point_cloud, **kwargs):
+        colors = np.asarray(point_cloud.colors) if point_cloud.has_colors() else None
+        return cls(np.asarray(point_cloud.points), colors, **kwargs)
+
+    def _summarize(self, level):
+        """Node summary of a level computed from the points (one pass over the sorted arrays)"""
+        node_codes = self.codes >> np.uint64(3 * (self.max_depth - level))
+        starts = _segment_starts(node_codes)
+        counts = np.diff(np.append(starts, len(self.points)))
+        summary = {
+            "codes": node_codes[starts],
+            "starts": starts,
+            "counts": counts,
+            "mins": np.minimum.reduceat(self.points, starts, axis=0),
+            "maxs": np.maximum.reduceat(self.points, starts, axis=0),
+            "centroids": np.add.reduceat(self.points, starts, axis=0, dtype=np.float64) / counts[:, None],
+        }
+        if self.colors is not None:
+            summary["colors"] = np.add.reduceat(self.colors, starts, axis=0, dtype=np.float64) / counts[:, None]
+        return summary
+
+    @staticmethod
+    def _aggregate(children):
+        """Parent level summary from a child level summary"""
+        parent_codes = children["codes"] >> np.uint64(3)
+        first = _segment_starts(parent_codes)
+        counts = np.add.reduceat(children["counts"], first)
+        weights = children["counts"][:, None]
+        summary = {
+            "codes": parent_codes[first],
+            "starts": children["starts"][first],
+            "counts": counts,
+            "mins": np.minimum.reduceat(children["mins"], first, axis=0),
+            "maxs": np.maximum.reduceat(children["maxs"], first, axis=0),
+            "centroids": np.add.reduceat(children["centroids"] * weights, first, axis=0) / counts[:, None],
+        }
+        if "colors" in children:
+            summary["colors"] = np.add.reduceat(children["colors"] * weights, first, axis=0) / counts[:, None]
+        return summary
+
+    def level(self, level):
+        """Node summary of a level; levels below summary_depth are computed on demand, not kept"""
+        if not 0 <= level <= self.max_depth:
+            raise ValueError(f"level must be between 0 and {self.max_depth}")
+        return self.levels.get(level) or self._summarize(level)
+
+    def cell_size(self, level):
+        return self.size / (1 << level)
+
+    def level_for_voxel_size(self, voxel_size):
+        """Coarsest level whose cells are no larger than voxel_size"""
+        level = int(np.ceil(np.log2(self.size / voxel_size))) if voxel_size < self.size else 0
+        return min(max(level, 0), self.max_depth)
+
+    def level_for_budget(self, max_points):
+        """Finest summarized level with at most max_points nodes (points in a LOD cloud)"""
+        fitting = [level for level, summary in self.levels.items() if len(summary["codes"]) <= max_points]
+        return max(fitting) if fitting else 0
+
+    # Level of detail
+
+    def lod_points(self, level):
+        """One real point per node (the middle of its Morton-ordered slice) and its node's mean color"""
+        summary = self.level(level)
+        points = self.points[summary["starts"] + summary["counts"] // 2] + self.origin
+        return points, summary.get("colors")
+
+    def lod_point_cloud(self, level=None, max_points=None):
+        if level is None:
+            level = self.level_for_budget(max_points) if max_points else self.summary_depth
+        points, colors = self.lod_points(level)
+        cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+        if colors is not None:
+            cloud.colors = o3d.utility.Vector3dVector(colors)
+        return cloud
+
+    def voxels(self, level):
+        """Occupied cells of a level: (cell indices (M, 3), centers (M, 3), point counts (M,))"""
+        summary = self.level(level)
+        cells = morton_cells(summary["codes"])
+        centers = self.origin + (cells + 0.5) * self.cell_size(level)
+        return cells, centers, summary["counts"]
+
+    def voxel_grid(self, level):
+        """Open3D VoxelGrid of a level, aligned with the octree cells"""
+        _, centers, _ = self.voxels(level)
+        cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(centers))
+        colors = self.level(level).get("colors")
+        if colors is not None:
+            cloud.colors = o3d.utility.Vector3dVector(colors)
+        return o3d.geometry.VoxelGrid.create_from_point_cloud_within_bounds(
+            cloud, self.cell_size(level), self.origin, self.origin + self.size)
+
+    # Spatial queries
+
+    def bounding_box(self):
+        """(min, max) of all points, straight from the root summary"""
+        root = self.levels[0]
+        return root["mins"][0] + self.origin, root["maxs"][0] + self.origin
+
+    def _relative_box(self, low, high):
+        """Absolute box corners -> corners relative to the origin, like the stored points"""
+        return np.asarray(low, dtype=np.float64) - self.origin, np.asarray(high, dtype=np.float64) - self.origin
+
+    def _classify(self, low, high):
+        """Nodes of the deepest summary level fully inside / partly overlapping the relative box [low, high]"""
+        summary = self.levels[self.summary_depth]
+        overlaps = ((summary["maxs"] >= low) & (summary["mins"] <= high)).all(axis=1)
+        inside = ((summary["mins"] >= low) & (summary["maxs"] <= high)).all(axis=1)
+        return summary, inside, overlaps & ~inside
+
+    def query_box(self, low, high):
+        """Points (and colors, or None) inside the axis-aligned box [low, high].
+
+        Nodes entirely inside contribute their whole slice; only points of nodes crossing the box
+        boundary are tested one by one.
+        """
+        low, high = self._relative_box(low, high)
+        summary, inside, partial = self._classify(low, high)
+        candidates = _ranges(summary["starts"][partial], summary["counts"][partial])
+        points = self.points[candidates]
+        candidates = candidates[((points >= low) & (points <= high)).all(axis=1)]
+        indices = np.sort(np.concatenate([_ranges(summary["starts"][inside], summary["counts"][inside]),
+                                          candidates]))
+        points = self.points[indices] + self.origin
+        return points, self.colors[indices] if self.colors is not None else None
+
+    def count_box(self, low, high):
+        low, high = self._relative_box(low, high)
+        summary, inside, partial = self._classify(low, high)
+        candidates = self.points[_ranges(summary["starts"][partial], summary["counts"][partial])]
+        return int(summary["counts"][inside].sum()) + int(((candidates >= low) & (candidates <= high)).all(axis=1).sum())
+
+    def extreme_point(self, axis, largest=False, low=None, high=None):
+        """Point with the smallest (or largest) coordinate along axis, optionally within a box.
+
+        Node bounds pick the single best fully-inside node and discard every node that cannot
+        beat it; only the points of the remaining nodes are compared. Returns None if the box is empty.
+        """
+        sign = -1.0 if largest else 1.0
+        if low is None and high is None:
+            summary = self.levels[self.summary_depth]
+            inside = np.ones(len(summary["codes"]), dtype=bool)
+            partial = ~inside
+        else:
+            low, high = self._relative_box(np.full(3, -np.inf) if low is None else low,
+                                           np.full(3, np.inf) if high is None else high)
+            summary, inside, partial = self._classify(low, high)
+
+        # The bound of a node: its best possible value along the axis
+        bound = sign * (summary["maxs"] if largest else summary["mins"])[:, axis].astype(np.float64)
+        best = bound[inside].min() if inside.any() else np.inf
+        # Fully inside nodes reaching best, and crossing nodes that could still beat it
+        scan = (inside & (bound <= best)) | (partial & (bound < best))
+        indices = _ranges(summary["starts"][scan], summary["counts"][scan])
+        points = self.points[indices]
+        if low is not None:
+            points = points[((points >= low) & (points <= high)).all(axis=1)]
+        if len(points) == 0:
+            return None
+        return points[np.argmin(sign * points[:, axis])] + self.origin
+
+    def memory_bytes(self):
+        arrays = [self.codes, self.points] + ([self.colors] if self.colors is not None else [])
+        arrays += [values for summary in self.levels.values() for values in summary.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def describe(self):
+        return [(level, self.cell_size(level), len(self.levels[level]["codes"])) for level in sorted(self.levels)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a multi-resolution octree over a point cloud or mesh")
+    parser.add_argument("input", help="point cloud (.ply/.pcd/.xyz) or mesh (sampled uniformly)")
+    parser.add_argument("--sample", type=int, default=1_000_000, help="points sampled from a mesh")
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH)
+    parser.add_argument("--export-level", type=int, help="write the voxel grid and LOD cloud of this level")
+    parser.add_argument("--output", default="octree")
+    args = parser.parse_args()
+
+    cloud = o3d.io.read_point_cloud(args.input)
+    if len(cloud.points) == 0:
+        mesh = o3d.io.read_triangle_mesh(args.input)
+        cloud = mesh.sample_points_uniformly(number_of_points=args.sample)
+    start = time.perf_counter()
+    tree = PointOctree.from_point_cloud(cloud, max_depth=args.max_depth)
+    print(f"✅ Octree over {len(tree.points)} points built in {time.perf_counter() - start:.2f}s "
+          f"({tree.memory_bytes() / 1024 / 1024:.1f} MB)")
+    for level, cell, nodes in tree.describe():
+        print(f"  level {level:>2}: cell {cell:.5f}, {nodes} nodes")
+    low, high = tree.bounding_box()
+    print(f"Bounding box: {np.round(low, 3)} .. {np.round(high, 3)}")
+    print(f"Lowest Z point: {np.round(tree.extreme_point(2), 3)}, highest: {np.round(tree.extreme_point(2, True), 3)}")
+    if args.export_level is not None:
+        o3d.io.write_voxel_grid(f"{args.output}_voxels_l{args.export_level}.ply", tree.voxel_grid(args.export_level))
+        o3d.io.write_point_cloud(f"{args.output}_points_l{args.export_level}.ply", tree.lod_point_cloud(args.export_level))
+        print(f"✅ Level {args.export_level} written to {args.output}_*_l{args.export_level}.ply")
@@ -1,270 +1,465 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import open3d as o3d
 import numpy as np
-
-def fix_obj_loading(file_path):
-    print("⚠ Trying manual OBJ parsing...")
-    return manual_obj_parsing(file_path)
-
-def manual_obj_parsing(file_path):
-    vertices = []
-    faces = []
-
-    with open(file_path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith('v ') and not line.startswith('vt ') and not line.startswith('vn '):
-                parts = line.split()
-                if len(parts) >= 4:
-                    vertices.append([float(parts[1]), float(parts[2]), float(parts[3])])
-            elif line.startswith('f '):
-                # Face definition
-                parts = line.split()
-                if len(parts) >= 4:
-                    face_vertices = []
-                    for part in parts[1:4]:
-                        vertex_index = part.split('/')[0]
-                        if vertex_index.isdigit():
-                            face_vertices.append(int(vertex_index) - 1)  # OBJ is 1-indexed
-
-                    if len(face_vertices) == 3:
-                        faces.append(face_vertices)
-
-    if vertices and faces:
-        print(f"✓ Manual parsing found: {len(vertices)} vertices, {len(faces)} faces")
-        mesh = o3d.geometry.TriangleMesh()
-        mesh.vertices = o3d.utility.Vector3dVector(np.array(vertices))
-        mesh.triangles = o3d.utility.Vector3iVector(np.array(faces))
-        mesh.compute_vertex_normals()
-        return mesh
+import obj_loader
+import mesh_clipping
+import stage_cache
+from octree import PointOctree
+
+DEFAULT_FILE = "cat_3d.obj"
+OUTPUT_FOLDER = "renders"
+MODEL_EXTENSIONS = (".obj", ".ply", ".stl", ".off", ".gltf", ".glb")
+WINDOW_SIZE = (800, 600)
+
+# Step parameters; every one can be overridden from the command line
+DEFAULT_PARAMS = {
+    "points": 5000,          # step 2: sampled points
+    "depth": 8,              # step 3: Poisson octree depth
+    "voxel_size": 0.05,      # step 4
+    "clip_offset": 0.3,      # step 6: plane x = center_x - offset
+    "split_boundary": True,  # step 6: cut crossing triangles along the plane
+    "sphere_radius": 0.05,   # step 7: extreme point markers
+}
+# Timed steps, in order ("hash" is the stage cache key; step 5 only builds the plane shown for the cut)
+STEPS = ("hash", "load", "sample", "reconstruct", "voxelize", "clip", "octree", "colorize")
+
+_renderer = None
 
 
-# Main execution
-print("=== 3D Processing Pipeline with Open3D ===\n")
-
-print("1. LOADING AND VISUALIZATION")
-print("-" * 40)
-
-file_path = "cat_3d.obj"
-mesh = fix_obj_loading(file_path)
+def fix_obj_loading(file_path):
+    print("Parsing OBJ with the vectorized loader...")
+    # Memory-mapped and parsed in NumPy chunks; n-gons are fan-triangulated, negative indices resolved
+    return obj_loader.load_obj_mesh(file_path)
 
-print(f"Final mesh loaded:")
-print(f"Number of vertices: {len(mesh.vertices)}")
-print(f"Number of triangles: {len(mesh.triangles)}")
-print(f"Has vertex colors: {mesh.has_vertex_colors()}")
-print(f"Has vertex normals: {mesh.has_vertex_normals()}")
-print("Displaying original model...")
-o3d.visualization.draw_geometries([mesh], window_name="Step 1: Loaded Model", width=800, height=600)
-
-input("\nPress Enter to continue to Step 2...")
-
-# Step 2: Conversion to Point Cloud
-print("\n2. CONVERSION TO POINT CLOUD")
-print("-" * 40)
-
-# Convert mesh to point cloud
-try:
-    point_cloud = mesh.sample_points_poisson_disk(number_of_points=5000)
-    print("✓ Point cloud created using Poisson disk sampling")
-except:
-    print("⚠ Poisson disk sampling failed, using uniform sampling")
-    point_cloud = mesh.sample_points_uniformly(number_of_points=5000)
-    print("✓ Point cloud created using uniform sampling")
-
-print("Displaying point cloud...")
-o3d.visualization.draw_geometries([point_cloud], window_name="Step 2: Point Cloud", width=800, height=600)
-
-print(f"Number of points: {len(point_cloud.points)}")
-print(f"Has colors: {point_cloud.has_colors()}")
-
-input("\nPress Enter to continue to Step 3...")
-
-# Step 3: Surface Reconstruction from Point Cloud
-print("\n3. SURFACE RECONSTRUCTION FROM POINT CLOUD")
-print("-" * 40)
-
-# Poisson surface reconstruction
-print("Performing Poisson surface reconstruction...")
-try:
-    mesh_reconstructed, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
-        point_cloud, depth=8
-    )
-    print("✓ Surface reconstruction completed")
-
-    # Remove artifacts
-    bbox = point_cloud.get_axis_aligned_bounding_box()
-    mesh_reconstructed = mesh_reconstructed.crop(bbox)
-    print("✓ Artifacts removed using bounding box crop")
-
-except Exception as e:
-    print(f"⚠ Poisson reconstruction failed: {e}")
-    print("Using ball pivoting as fallback...")
-    distances = point_cloud.compute_nearest_neighbor_distance()
-    avg_dist = np.mean(distances)
-    radius = 3 * avg_dist
-    mesh_reconstructed = o3d.geometry.TriangleMesh.create_from_point_cloud_ball_pivoting(
-        point_cloud, o3d.utility.DoubleVector([radius, radius * 2]))
-    print("✓ Surface reconstruction completed using ball pivoting")
-
-print("Displaying reconstructed mesh...")
-o3d.visualization.draw_geometries([mesh_reconstructed], window_name="Step 3: Reconstructed Mesh", width=800, height=600)
-
-print(f"Number of vertices: {len(mesh_reconstructed.vertices)}")
-print(f"Number of triangles: {len(mesh_reconstructed.triangles)}")
-print(f"Has vertex colors: {mesh_reconstructed.has_vertex_colors()}")
-
-input("\nPress Enter to continue to Step 4...")
-
-# Step 4: Voxelization
-print("\n4. VOXELIZATION")
-print("-" * 40)
-
-# Convert point cloud to voxel grid
-voxel_size = 0.05
-voxel_grid = o3d.geometry.VoxelGrid.create_from_point_cloud(point_cloud, voxel_size)
-print(f"✓ Voxel grid created with voxel size: {voxel_size}")
-
-print("Displaying voxel grid...")
-o3d.visualization.draw_geometries([voxel_grid], window_name="Step 4: Voxel Grid", width=800, height=600)
-
-voxels = voxel_grid.get_voxels()
-print(f"Number of voxels: {len(voxels)}")
-print(f"Has colors: {voxel_grid.has_colors()}")
-
-input("\nPress Enter to continue to Step 5...")
-
-# Step 5: Plane
-print("\n5. ADDING A PLANE")
-print("-" * 40)
-
-# Get cat bounds
-bbox = mesh_reconstructed.get_axis_aligned_bounding_box()
-bbox_center = bbox.get_center()
-bbox_extent = bbox.get_extent()
-
-plane_width = bbox_extent[1] * 2.0  # Height of plane
-plane_depth = 0.05  # Thin plane
-plane_height = bbox_extent[2] * 2.0  # Width of plane
-
-# Create vertical plane (rotated)
-plane = o3d.geometry.TriangleMesh.create_box(width=plane_depth, height=plane_width, depth=plane_height)
-plane.paint_uniform_color([0.8, 0.3, 0.3])
-plane.rotate(plane.get_rotation_matrix_from_xyz([0, 0, np.pi/2]))
-
-# Position to cut through the center of the cat
-plane_center = plane.get_center()
-translation = [
-    bbox_center[0] - plane_center[0],
-    bbox_center[1] - plane_center[1],
-    bbox_center[2] - plane_center[2]
-]
-plane.translate(translation)
-
-print("✓ Vertical plane created - cutting through cat")
-print("Displaying object with the plane...")
-o3d.visualization.draw_geometries([mesh_reconstructed, plane],
-                                 window_name="Step 5: Plane Cutting Through Cat",
-                                 width=800, height=600)
-
-mesh_center = bbox_center
-
-input("\nPress Enter to continue to Step 6...")
-
-# Step 6: Surface Clipping
-print("\n6. SURFACE CLIPPING")
-print("-" * 40)
-
-# Create a clipping plane
-clipping_plane = [1, 0, 0, -mesh_center[0] + 0.3]  # Plane equation: x - (center_x - 0.3) = 0
-
-# Convert mesh to point cloud
-points = np.asarray(mesh_reconstructed.vertices)
-triangles = np.asarray(mesh_reconstructed.triangles)
-
-if len(points) > 0 and len(triangles) > 0:
-    # Find points on the left side of the plane (keep points where ax + by + cz + d < 0)
-    a, b, c, d = clipping_plane
-    distances = a * points[:, 0] + b * points[:, 1] + c * points[:, 2] + d
-    keep_indices = np.where(distances < 0)[0]
-
-    vertex_mask = np.zeros(len(points), dtype=bool)
-    vertex_mask[keep_indices] = True
-
-    new_vertices = points[keep_indices]
-    index_map = {old_idx: new_idx for new_idx, old_idx in enumerate(keep_indices)}
-
-    new_triangles = []
-    for triangle in triangles:
-        if (triangle[0] in keep_indices and
-                triangle[1] in keep_indices and
-                triangle[2] in keep_indices):
-            new_triangles.append([index_map[triangle[0]], index_map[triangle[1]], index_map[triangle[2]]])
-
-    clipped_mesh = o3d.geometry.TriangleMesh()
-    clipped_mesh.vertices = o3d.utility.Vector3dVector(new_vertices)
-    clipped_mesh.triangles = o3d.utility.Vector3iVector(new_triangles)
-    clipped_mesh.compute_vertex_normals()
 
+def load_mesh(file_path):
+    """Step 1: OBJ files go through obj_loader, other formats through Open3D"""
+    if file_path.lower().endswith(".obj"):
+        mesh = fix_obj_loading(file_path)
+    else:
+        mesh = o3d.io.read_triangle_mesh(file_path)
+        mesh.compute_vertex_normals()
+    if mesh is None or len(mesh.triangles) == 0:
+        raise ValueError(f"No triangles in {file_path}")
+    return mesh
+
+
+def sample_points(mesh, number_of_points):
+    """Step 2"""
+    try:
+        point_cloud = mesh.sample_points_poisson_disk(number_of_points=number_of_points)
+        print("✓ Point cloud created using Poisson disk sampling")
+    except Exception:
+        print("⚠ Poisson disk sampling failed, using uniform sampling")
+        point_cloud = mesh.sample_points_uniformly(number_of_points=number_of_points)
+        print("✓ Point cloud created using uniform sampling")
+    return point_cloud
+
+
+def reconstruct(point_cloud, depth):
+    """Step 3: Poisson reconstruction cropped to the cloud, ball pivoting as fallback"""
+    print("Performing Poisson surface reconstruction...")
+    try:
+        mesh_reconstructed, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
+            point_cloud, depth=depth
+        )
+        print("✓ Surface reconstruction completed")
+
+        # Remove artifacts
+        bbox = point_cloud.get_axis_aligned_bounding_box()
+        mesh_reconstructed = mesh_reconstructed.crop(bbox)
+        print("✓ Artifacts removed using bounding box crop")
+
+    except Exception as e:
+        print(f"⚠ Poisson reconstruction failed: {e}")
+        print("Using ball pivoting as fallback...")
+        distances = point_cloud.compute_nearest_neighbor_distance()
+        avg_dist = np.mean(distances)
+        radius = 3 * avg_dist
+        mesh_reconstructed = o3d.geometry.TriangleMesh.create_from_point_cloud_ball_pivoting(
+            point_cloud, o3d.utility.DoubleVector([radius, radius * 2]))
+        print("✓ Surface reconstruction completed using ball pivoting")
+    return mesh_reconstructed
+
+
+def voxelize(point_cloud, voxel_size):
+    """Step 4"""
+    voxel_grid = o3d.geometry.VoxelGrid.create_from_point_cloud(point_cloud, voxel_size)
+    print(f"✓ Voxel grid created with voxel size: {voxel_size}")
+    return voxel_grid
+
+
+def cutting_plane(mesh, bounds=None):
+    """Step 5: a thin vertical box through the center of the mesh (or of bounds = (min, max)), for display"""
+    if bounds is None:
+        bbox = mesh.get_axis_aligned_bounding_box()
+        bounds = (bbox.get_min_bound(), bbox.get_max_bound())
+    bbox_center = (bounds[0] + bounds[1]) / 2
+    bbox_extent = bounds[1] - bounds[0]
+
+    plane_width = bbox_extent[1] * 2.0  # Height of plane
+    plane_depth = 0.05  # Thin plane
+    plane_height = bbox_extent[2] * 2.0  # Width of plane
+
+    # Create vertical plane (rotated)
+    plane = o3d.geometry.TriangleMesh.create_box(width=plane_depth, height=plane_width, depth=plane_height)
+    plane.paint_uniform_color([0.8, 0.3, 0.3])
+    plane.rotate(plane.get_rotation_matrix_from_xyz([0, 0, np.pi/2]))
+
+    # Position to cut through the center of the cat
+    plane.translate(bbox_center - plane.get_center())
+    print("✓ Vertical plane created - cutting through cat")
+    return plane
+
+
+def clip(mesh, clip_offset, split_boundary=True, mesh_center=None):
+    """Step 6: removes the part right of x = center_x - clip_offset"""
+    if len(mesh.vertices) == 0 or len(mesh.triangles) == 0:
+        print("⚠ Cannot perform clipping - no valid geometry")
+        return mesh
+    if mesh_center is None:
+        mesh_center = mesh.get_axis_aligned_bounding_box().get_center()
+    clipping_plane = [1, 0, 0, -mesh_center[0] + clip_offset]  # Plane equation: x - (center_x - offset) = 0
+    # Keep the side where ax + by + cz + d < 0
+    clipped_mesh = mesh_clipping.clip_mesh(mesh, clipping_plane, split_boundary=split_boundary)
     print("✓ Surface clipping completed (removed right side of the object)")
-else:
-    print("⚠ Cannot perform clipping - no valid geometry")
-    clipped_mesh = mesh_reconstructed
+    return clipped_mesh
 
-print("Displaying clipped mesh...")
-o3d.visualization.draw_geometries([clipped_mesh], window_name="Step 6: Clipped Mesh", width=800, height=600)
 
-print(f"Number of remaining vertices: {len(clipped_mesh.vertices)}")
-print(f"Number of remaining triangles: {len(clipped_mesh.triangles)}")
-print(f"Has vertex colors: {clipped_mesh.has_vertex_colors()}")
-print(f"Has vertex normals: {clipped_mesh.has_vertex_normals()}")
+def colorize(mesh, sphere_radius, extremes=None):
+    """Step 7: blue-to-red gradient along Z; returns spheres marking the lowest and highest point.
 
-input("\nPress Enter to continue to Step 7...")
+    extremes = (min_point, max_point) replaces the scan of the mesh vertices when given.
+    """
+    vertices = np.asarray(mesh.vertices)
+    if len(vertices) == 0:
+        print("⚠ Cannot process colors and extremes - no vertices available")
+        return []
 
-# Step 7: Working with Color and Extremes
-print("\n7. WORKING WITH COLOR AND EXTREMES")
-print("-" * 40)
-
-# Remove original colors and apply gradient along Z-axis
-vertices = np.asarray(clipped_mesh.vertices)
-
-if len(vertices) > 0:
     z_coords = vertices[:, 2]
     z_min, z_max = np.min(z_coords), np.max(z_coords)
-
-    # Create color gradient from blue to red based on Z-coordinate
-    colors = np.zeros((len(vertices), 3))
-    for i, z in enumerate(z_coords):
-        # Normalize z coordinate to [0, 1]
-        t = (z - z_min) / (z_max - z_min) if z_max != z_min else 0.5
-        # Blue (0,0,1) to Red (1,0,0) gradient
-        colors[i] = [t, 0.3, 1 - t]
-
-    clipped_mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
+    # Normalized Z: blue (0, 0.3, 1) at the bottom to red (1, 0.3, 0) at the top
+    t = (z_coords - z_min) / (z_max - z_min) if z_max != z_min else np.full(len(z_coords), 0.5)
+    colors = np.column_stack([t, np.full(len(t), 0.3), 1 - t])
+    mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
     print("✓ Original colors removed and Z-axis gradient applied")
 
-    # Find extreme points along Z-axis
-    min_point = vertices[np.argmin(z_coords)]
-    max_point = vertices[np.argmax(z_coords)]
-
+    if extremes is None or extremes[0] is None or extremes[1] is None:
+        extremes = (vertices[np.argmin(z_coords)], vertices[np.argmax(z_coords)])
+    min_point, max_point = extremes
     print(f"Minimum point (lowest Z): ({min_point[0]:.3f}, {min_point[1]:.3f}, {min_point[2]:.3f})")
     print(f"Maximum point (highest Z): ({max_point[0]:.3f}, {max_point[1]:.3f}, {max_point[2]:.3f})")
 
-    # Create spheres to highlight extreme points
-    min_sphere = o3d.geometry.TriangleMesh.create_sphere(radius=0.05)
-    min_sphere.paint_uniform_color([0, 1, 0])  # Green for minimum
-    min_sphere.translate(min_point)
-
-    max_sphere = o3d.geometry.TriangleMesh.create_sphere(radius=0.05)
-    max_sphere.paint_uniform_color([1, 0, 0])  # Red for maximum
-    max_sphere.translate(max_point)
-
+    spheres = []
+    for point, color in ((min_point, [0, 1, 0]), (max_point, [1, 0, 0])):  # Green for minimum, red for maximum
+        sphere = o3d.geometry.TriangleMesh.create_sphere(radius=sphere_radius)
+        sphere.paint_uniform_color(color)
+        sphere.translate(point)
+        spheres.append(sphere)
     print("✓ Extreme points highlighted with spheres")
-    print("Displaying colored mesh with extreme points...")
-    o3d.visualization.draw_geometries([clipped_mesh, min_sphere, max_sphere],
-                                      window_name="Step 7: Gradient Colors & Extreme Points",
-                                      width=800, height=600)
-else:
-    print("⚠ Cannot process colors and extremes - no vertices available")
-
-print("\n=== PROCESSING COMPLETE ===")
-print("All 7 steps have been successfully executed!")
-print(f"Final model has {len(clipped_mesh.vertices)} vertices and {len(clipped_mesh.triangles)} triangles")
\ No newline at end of file
+    return spheres
+
+
+def voxel_centers(voxel_grid):
+    """Point cloud of the voxel centers (the offscreen renderer has no voxel primitive)"""
+    voxels = voxel_grid.get_voxels()
+    indices = np.array([voxel.grid_index for voxel in voxels], dtype=np.float64).reshape(-1, 3)
+    cloud = o3d.geometry.PointCloud()
+    cloud.points = o3d.utility.Vector3dVector(voxel_grid.origin + (indices + 0.5) * voxel_grid.voxel_size)
+    if voxel_grid.has_colors():
+        cloud.colors = o3d.utility.Vector3dVector(np.array([voxel.color for voxel in voxels]).reshape(-1, 3))
+    return cloud
+
+
+def render_png(geometries, path, width=WINDOW_SIZE[0], height=WINDOW_SIZE[1]):
+    """Renders geometries to a PNG without a window (EGL/OSMesa offscreen renderer)"""
+    global _renderer
+    if _renderer is None:
+        _renderer = o3d.visualization.rendering.OffscreenRenderer(width, height)
+    scene = _renderer.scene
+    scene.clear_geometry()
+    scene.set_background([1, 1, 1, 1])
+    for i, geometry in enumerate(geometries):
+        material = o3d.visualization.rendering.MaterialRecord()
+        material.shader = "defaultLit" if isinstance(geometry, o3d.geometry.TriangleMesh) else "defaultUnlit"
+        if isinstance(geometry, o3d.geometry.VoxelGrid):
+            geometry = voxel_centers(geometry)
+        scene.add_geometry(f"geometry_{i}", geometry, material)
+    bounds = scene.bounding_box
+    _renderer.setup_camera(60.0, bounds, bounds.get_center())
+    o3d.io.write_image(path, _renderer.render_to_image())
+
+
+def save_geometry(geometry, path):
+    if isinstance(geometry, o3d.geometry.PointCloud):
+        return o3d.io.write_point_cloud(path, geometry)
+    if isinstance(geometry, o3d.geometry.VoxelGrid):
+        return o3d.io.write_voxel_grid(path, geometry)
+    return o3d.io.write_triangle_mesh(path, geometry)
+
+
+def show_interactive(step, title, geometries):
+    print("Displaying...")
+    o3d.visualization.draw_geometries(geometries, window_name=f"Step {step}: {title}",
+                                      width=WINDOW_SIZE[0], height=WINDOW_SIZE[1])
+    if step < 7:
+        input(f"\nPress Enter to continue to Step {step + 1}...")
+
+
+def offscreen_writer(output_dir, png=True):
+    """Display callback for headless runs: each step's geometry to PLY, the view to PNG"""
+    os.makedirs(output_dir, exist_ok=True)
+    state = {"png": png}
+
+    def write(step, title, geometries):
+        name = f"{step:02d}_{title.lower().replace(' ', '_').replace('&', 'and')}"
+        if step != 5:  # the plane view adds no geometry worth keeping
+            save_geometry(geometries[0], os.path.join(output_dir, name + ".ply"))
+        if state["png"]:
+            try:
+                render_png(geometries, os.path.join(output_dir, name + ".png"))
+            except Exception as e:
+                # No EGL/OSMesa on this machine: keep writing the PLY files
+                print(f"⚠ Offscreen rendering unavailable, skipping PNG output: {e}")
+                state["png"] = False
+
+    return write
+
+
+def run_pipeline(file_path, params=None, display=None, cache_dir=stage_cache.CACHE_DIR):
+    """load → sample → reconstruct → voxelize → clip → colorize for one model.
+
+    display(step, title, geometries) is called after each step: interactive windows, offscreen
+    PLY/PNG output, or nothing when None. Sampling, reconstruction and voxelization results are
+    reused from the stage cache in cache_dir (None disables it) when the input file and the
+    step's parameters are unchanged. Returns {"file", "timings" (seconds per step), "vertices",
+    "triangles"} of the final mesh.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    display = display or (lambda step, title, geometries: None)
+    timings = {}
+
+    def timed(name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    def cached_step(name, key, geometry_type, function, *args):
+        if cache_dir is None:
+            return timed(name, function, *args)
+        geometry, hit = timed(name, stage_cache.cached, key, geometry_type, lambda: function(*args), cache_dir)
+        if hit:
+            print(f"✓ Loaded from stage cache ({key[:12]})")
+        return geometry
+
+    # Each key chains the key of the step's input, down to the content of the model file
+    sample_key = reconstruct_key = voxel_key = None
+    if cache_dir is not None:
+        digest = timed("hash", stage_cache.file_digest, file_path)
+        sample_key = stage_cache.stage_key(digest, "sample", points=params["points"])
+        reconstruct_key = stage_cache.stage_key(sample_key, "reconstruct", depth=params["depth"])
+        voxel_key = stage_cache.stage_key(sample_key, "voxelize", voxel_size=params["voxel_size"])
+
+    print("1. LOADING AND VISUALIZATION")
+    print("-" * 40)
+    mesh = timed("load", load_mesh, file_path)
+    print(f"Number of vertices: {len(mesh.vertices)}")
+    print(f"Number of triangles: {len(mesh.triangles)}")
+    print(f"Has vertex colors: {mesh.has_vertex_colors()}")
+    print(f"Has vertex normals: {mesh.has_vertex_normals()}")
+    display(1, "Loaded Model", [mesh])
+
+    print("\n2. CONVERSION TO POINT CLOUD")
+    print("-" * 40)
+    point_cloud = cached_step("sample", sample_key, o3d.geometry.PointCloud, sample_points, mesh, params["points"])
+    print(f"Number of points: {len(point_cloud.points)}")
+    display(2, "Point Cloud", [point_cloud])
+
+    print("\n3. SURFACE RECONSTRUCTION FROM POINT CLOUD")
+    print("-" * 40)
+    mesh_reconstructed = cached_step("reconstruct", reconstruct_key, o3d.geometry.TriangleMesh,
+                                     reconstruct, point_cloud, params["depth"])
+    print(f"Number of vertices: {len(mesh_reconstructed.vertices)}")
+    print(f"Number of triangles: {len(mesh_reconstructed.triangles)}")
+    display(3, "Reconstructed Mesh", [mesh_reconstructed])
+
+    print("\n4. VOXELIZATION")
+    print("-" * 40)
+    voxel_grid = cached_step("voxelize", voxel_key, o3d.geometry.VoxelGrid, voxelize, point_cloud, params["voxel_size"])
+    print(f"Number of voxels: {len(voxel_grid.get_voxels())}")
+    display(4, "Voxel Grid", [voxel_grid])
+
+    print("\n5. ADDING A PLANE")
+    print("-" * 40)
+    plane = cutting_plane(mesh_reconstructed)
+    display(5, "Plane Cutting Through Cat", [mesh_reconstructed, plane])
+
+    print("\n6. SURFACE CLIPPING")
+    print("-" * 40)
+    clipped_mesh = timed("clip", clip, mesh_reconstructed, params["clip_offset"], params["split_boundary"])
+    print(f"Number of remaining vertices: {len(clipped_mesh.vertices)}")
+    print(f"Number of remaining triangles: {len(clipped_mesh.triangles)}")
+    display(6, "Clipped Mesh", [clipped_mesh])
+
+    print("\n7. WORKING WITH COLOR AND EXTREMES")
+    print("-" * 40)
+    # Lowest/highest vertex of the clipped mesh (including the ones added on the cut), from the node bounds
+    # of an octree over exactly the vertices colorize colors
+    extremes = None
+    if len(clipped_mesh.vertices):
+        octree = timed("octree", PointOctree, np.asarray(clipped_mesh.vertices))
+        print(f"✓ Octree built: {octree.summary_depth + 1} summarized levels, "
+              f"finest cell {octree.cell_size(octree.summary_depth):.4f}")
+        extremes = (octree.extreme_point(2), octree.extreme_point(2, largest=True))
+    spheres = timed("colorize", colorize, clipped_mesh, params["sphere_radius"], extremes)
+    display(7, "Gradient Colors & Extreme Points", [clipped_mesh] + spheres)
+
+    print("\nStep timings: " + " | ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return {"file": file_path, "timings": timings,
+            "vertices": len(clipped_mesh.vertices), "triangles": len(clipped_mesh.triangles)}
+
+
+def model_output_dir(output_dir, file_path):
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(file_path))[0])
+
+
+def process_model(file_path, output_dir, params, png=True, cache_dir=stage_cache.CACHE_DIR):
+    """One batch item, run in a worker process; errors are returned instead of raised"""
+    target = model_output_dir(output_dir, file_path)
+    start = time.perf_counter()
+    try:
+        result = run_pipeline(file_path, params, offscreen_writer(target, png), cache_dir)
+    except Exception as e:
+        return {"file": file_path, "error": str(e), "seconds": time.perf_counter() - start}
+    result["seconds"] = time.perf_counter() - start
+    with open(os.path.join(target, "timings.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def find_models(directory):
+    return sorted(os.path.join(root, name)
+                  for root, _, names in os.walk(directory)
+                  for name in names if name.lower().endswith(MODEL_EXTENSIONS))
+
+
+def write_timings_csv(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(["file", "status", "seconds", *STEPS]) + "\n")
+        for result in sorted(results, key=lambda r: r["file"]):
+            timings = result.get("timings", {})
+            row = [result["file"], "error" if "error" in result else "ok", f"{result['seconds']:.3f}"]
+            row += [f"{timings[step]:.3f}" if step in timings else "" for step in STEPS]
+            f.write(",".join(row) + "\n")
+
+
+def report_model(result):
+    if "error" in result:
+        print(f"❌ {result['file']}: {result['error']}")
+    else:
+        steps = " | ".join(f"{name} {seconds:.2f}s" for name, seconds in result["timings"].items())
+        print(f"✅ {result['file']} in {result['seconds']:.2f}s ({steps})")
+
+
+def run_pool(files, workers, output_dir, params, png, cache_dir):
+    """Runs process_model over files on a fresh pool; returns (results, files lost to a crashed worker)"""
+    results, crashed = [], []
+    # spawn: Open3D's threads and GPU context do not survive a fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(process_model, path, output_dir, params, png, cache_dir): path for path in files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A native crash kills the worker and fails every model still queued or running on the pool
+                crashed.append(futures[future])
+                continue
+            except Exception as e:
+                result = {"file": futures[future], "error": str(e), "seconds": 0.0}
+            results.append(result)
+            report_model(result)
+    return results, sorted(crashed)
+
+
+def run_batch(directory, output_dir=OUTPUT_FOLDER, params=None, workers=None, png=True,
+              cache_dir=stage_cache.CACHE_DIR):
+    """Processes every model under directory on a process pool; per-model outputs go to
+    <output_dir>/<model>/, step timings of all models to <output_dir>/timings.csv
+
+    If a worker process dies (a native Open3D crash), the unfinished models are resubmitted on a
+    fresh pool once; models caught in a second crash run one per pool, so the crash is recorded
+    against the model that causes it and the batch carries on.
+    """
+    files = find_models(directory)
+    if not files:
+        print(f"⚠ No models ({', '.join(MODEL_EXTENSIONS)}) found in {directory}")
+        return []
+    workers = workers or os.cpu_count() or 1
+    # Each worker keeps a core busy already; Open3D's own thread pool would only oversubscribe
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    print(f"Processing {len(files)} models with {workers} workers...")
+
+    start = time.perf_counter()
+    results, crashed = run_pool(files, workers, output_dir, params, png, cache_dir)
+    if crashed:
+        print(f"⚠ A worker process crashed, resubmitting {len(crashed)} unfinished models on a fresh pool")
+        retried, crashed = run_pool(crashed, workers, output_dir, params, png, cache_dir)
+        results += retried
+    if crashed:
+        print(f"⚠ Another worker crashed, running the remaining {len(crashed)} models one at a time")
+    for path in crashed:
+        alone, crashed_again = run_pool([path], 1, output_dir, params, png, cache_dir)
+        results += alone
+        if crashed_again:
+            result = {"file": path, "error": "worker process crashed", "seconds": 0.0}
+            results.append(result)
+            report_model(result)
+
+    os.makedirs(output_dir, exist_ok=True)
+    write_timings_csv(results, os.path.join(output_dir, "timings.csv"))
+    failed = sum("error" in result for result in results)
+    print(f"\n=== BATCH COMPLETE: {len(results) - failed} ok, {failed} failed "
+          f"in {time.perf_counter() - start:.2f}s ===")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="3D processing pipeline with Open3D")
+    parser.add_argument("input", nargs="?", default=DEFAULT_FILE, help="model file, or a directory for batch mode")
+    parser.add_argument("--offscreen", action="store_true",
+                        help="no windows or prompts: write PLY/PNG per step to --output")
+    parser.add_argument("--no-png", action="store_true", help="offscreen: write PLY files only")
+    parser.add_argument("--output", default=OUTPUT_FOLDER)
+    parser.add_argument("--workers", type=int, help="batch mode processes (default: CPU count)")
+    parser.add_argument("--points", type=int, default=DEFAULT_PARAMS["points"])
+    parser.add_argument("--depth", type=int, default=DEFAULT_PARAMS["depth"])
+    parser.add_argument("--voxel-size", type=float, default=DEFAULT_PARAMS["voxel_size"])
+    parser.add_argument("--clip-offset", type=float, default=DEFAULT_PARAMS["clip_offset"])
+    parser.add_argument("--no-split", action="store_true", help="drop boundary triangles instead of cutting them")
+    parser.add_argument("--no-cache", action="store_true", help="recompute sampling, reconstruction and voxelization")
+    parser.add_argument("--cache-dir", default=stage_cache.CACHE_DIR)
+    args = parser.parse_args()
+    params = {"points": args.points, "depth": args.depth, "voxel_size": args.voxel_size,
+              "clip_offset": args.clip_offset, "split_boundary": not args.no_split}
+    cache_dir = None if args.no_cache else args.cache_dir
+
+    if os.path.isdir(args.input):
+        # Batch mode is always headless
+        run_batch(args.input, args.output, params, args.workers, png=not args.no_png, cache_dir=cache_dir)
+    else:
+        print("=== 3D Processing Pipeline with Open3D ===\n")
+        if args.offscreen:
+            display = offscreen_writer(model_output_dir(args.output, args.input), png=not args.no_png)
+        else:
+            display = show_interactive
+        result = run_pipeline(args.input, params, display, cache_dir)
+        print("\n=== PROCESSING COMPLETE ===")
+        print("All 7 steps have been successfully executed!")
+        print(f"Final model has {result['vertices']} vertices and {result['triangles']} triangles")
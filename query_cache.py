@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+import db
+
+CACHE_DIR = os.getenv("QUERY_CACHE_DIR", ".query_cache")
+VERSIONS_FILE = os.path.join(CACHE_DIR, "table_versions.json")
+DEFAULT_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "128"))
+# On-disk Parquet tier, shared between processes (analytics, slider, Main); needs pyarrow
+DISK_TIER = os.getenv("QUERY_CACHE_DISK", "0") == "1"
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_versions_cache = {"mtime": None, "versions": {}}
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+_TABLE_PATTERN = re.compile(r"\b(?:from|join)\s+([a-z_][\w.]*)", re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """Drops comments, collapses whitespace and the trailing semicolon so equivalent SQL shares a key"""
+    sql = re.sub(r"--[^\n]*", " ", sql)
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql):
+    tables = {name.lower().split(".")[-1] for name in _TABLE_PATTERN.findall(sql)}
+    # CTE names look like tables after FROM but are not invalidated by imports
+    ctes = {name.lower() for name in re.findall(r"\b(\w+)\s+AS\s*\(", sql, re.IGNORECASE)}
+    return sorted(tables - ctes)
+
+
+def cache_key(sql, params=None):
+    payload = json.dumps({"sql": normalize_sql(sql), "params": params, "backend": db.QUERY_BACKEND},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def table_versions():
+    """Current version counter per table, re-read only when the versions file changes"""
+    try:
+        mtime = os.path.getmtime(VERSIONS_FILE)
+    except FileNotFoundError:
+        return {}
+    if mtime != _versions_cache["mtime"]:
+        try:
+            with open(VERSIONS_FILE, "r", encoding="utf-8") as f:
+                _versions_cache["versions"] = json.load(f)
+            _versions_cache["mtime"] = mtime
+        except (OSError, json.JSONDecodeError):
+            return _versions_cache["versions"]
+    return _versions_cache["versions"]
+
+
+def invalidate_tables(tables):
+    """Bumps the version of each table so every cached result that read it becomes stale.
+
+    Called by data_import after it loads new rows; works across processes through VERSIONS_FILE.
+    """
+    tables = [table.lower() for table in tables]
+    if not tables:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with _lock:
+        try:
+            with open(VERSIONS_FILE, "r", encoding="utf-8") as f:
+                versions = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            versions = {}
+        for table in tables:
+            versions[table] = versions.get(table, 0) + 1
+        tmp_path = VERSIONS_FILE + f".{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(versions, f)
+        os.replace(tmp_path, VERSIONS_FILE)
+
+
+def _is_fresh(entry, tables, now):
+    if now - entry["created"] > entry["ttl"]:
+        return False
+    versions = table_versions()
+    return all(entry["versions"].get(table, 0) == versions.get(table, 0) for table in tables)
+
+
+def _disk_paths(key):
+    base = os.path.join(CACHE_DIR, "queries", key)
+    return base + ".parquet", base + ".json"
+
+
+def _disk_get(key, tables, now):
+    data_path, meta_path = _disk_paths(key)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if not _is_fresh(meta, tables, now):
+        return None
+    try:
+        return {**meta, "df": pd.read_parquet(data_path)}
+    except Exception:
+        return None
+
+
+def _disk_put(key, df, meta):
+    data_path, meta_path = _disk_paths(key)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    try:
+        df.to_parquet(data_path, index=False)
+    except Exception as e:
+        print(f"⚠ Query cache: could not write Parquet tier ({e})")
+        return
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def cached_query(sql, params=None, ttl=None, runner=None):
+    """Runs sql through the cache: memory LRU, then the optional Parquet tier, then the database.
+
+    Results expire after ttl seconds or as soon as any table the query reads is re-imported.
+    Callers always get their own copy of the DataFrame.
+    """
+    ttl = DEFAULT_TTL if ttl is None else ttl
+    runner = runner or db.run_query
+    key = cache_key(sql, params)
+    tables = referenced_tables(sql)
+    now = time.time()
+
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None and _is_fresh(entry, tables, now):
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return entry["df"].copy()
+
+    if DISK_TIER:
+        entry = _disk_get(key, tables, now)
+        if entry is not None:
+            with _lock:
+                _stats["disk_hits"] += 1
+                _memory[key] = entry
+                _memory.move_to_end(key)
+                _trim()
+            return entry["df"].copy()
+
+    # Versions are captured before the query runs, so an import racing with it invalidates the result
+    versions = table_versions()
+    meta = {"created": now, "ttl": ttl, "versions": {table: versions.get(table, 0) for table in tables}}
+    df = runner(sql, params) if params is not None else runner(sql)
+    with _lock:
+        _stats["misses"] += 1
+        _memory[key] = {**meta, "df": df.copy()}
+        _memory.move_to_end(key)
+        _trim()
+    if DISK_TIER:
+        _disk_put(key, df, meta)
+    return df
+
+
+def _trim():
+    while len(_memory) > MAX_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def clear():
+    with _lock:
+        _memory.clear()
+
+
+def cache_stats():
+    with _lock:
+        return {**_stats, "entries": len(_memory)}
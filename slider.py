@@ -1,17 +1,9 @@
 import pandas as pd
 import plotly.express as px
-from sqlalchemy import create_engine
-
-DB_NAME = "techno_events_db"
-DB_USER = "postgres"
-DB_PASSWORD = "0000"
-DB_HOST = "localhost"
-DB_PORT = "5432"
-
-engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+import query_cache
 
 def run_query(query):
-    return pd.read_sql(query, engine)
+    return query_cache.cached_query(query)
 
 # --- Query for slider ---
 df = run_query("""
@@ -0,0 +1,281 @@
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+import threading
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import duckdb
+import db
+import query_cache
+from data_import import PARTITION_KEYS, resolve_columns
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshot")
+MANIFEST_FILE = "manifest.json"
+CHUNK_SIZE = 100_000
+# Each table is split into part files of at most this many rows; DuckDB scans the parts in parallel
+ROWS_PER_FILE = 1_000_000
+# events and eventhistory are written hive-partitioned by the month of their PARTITION_KEYS date
+# (snapshot/events/event_month=2024-05/part-0.parquet), so DuckDB skips the files of other months
+PARTITION_COLUMN = "event_month"
+UNDATED_PARTITION = "undated"
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 1)))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT")
+
+# Bookkeeping tables that analytics never read
+SKIP_TABLES = {"import_watermarks"}
+
+PG_TO_ARROW = {
+    "smallint": pa.int16(),
+    "integer": pa.int32(),
+    "bigint": pa.int64(),
+    "boolean": pa.bool_(),
+    "real": pa.float32(),
+    "double precision": pa.float64(),
+    # numeric is read as double precision: exact decimals don't matter for the reports
+    "numeric": pa.float64(),
+    "date": pa.date32(),
+    "timestamp without time zone": pa.timestamp("us"),
+    "timestamp with time zone": pa.timestamp("us", tz="UTC"),
+}
+
+# PostgreSQL functions used by queries.sql that DuckDB spells differently
+DUCKDB_MACROS = [
+    """CREATE OR REPLACE MACRO to_char(ts, fmt) AS CASE fmt
+         WHEN 'Day' THEN rpad(dayname(ts), 9, ' ')
+         WHEN 'Month' THEN rpad(monthname(ts), 9, ' ')
+         WHEN 'YYYY' THEN strftime(ts, '%Y')
+         WHEN 'YYYY-MM' THEN strftime(ts, '%Y-%m')
+         WHEN 'YYYY-MM-DD' THEN strftime(ts, '%Y-%m-%d')
+         ELSE error('to_char: unsupported format ' || fmt) END""",
+]
+
+_duck = None
+_duck_lock = threading.Lock()
+_duck_manifest_mtime = None
+
+
+def snapshot_tables(cursor):
+    """Top-level tables of the public schema (partitions are read through their parent)"""
+    cursor.execute("""
+        SELECT relname FROM pg_class
+        WHERE relnamespace = 'public'::regnamespace AND relkind IN ('r', 'p') AND NOT relispartition
+        ORDER BY relname
+    """)
+    return [row[0] for row in cursor.fetchall() if row[0] not in SKIP_TABLES]
+
+
+def table_schema(cursor, table):
+    """Arrow schema of a table plus the SELECT list that produces it (the table is aliased t)"""
+    cursor.execute("SELECT column_name, data_type FROM information_schema.columns "
+                   "WHERE table_schema = 'public' AND table_name = %s ORDER BY ordinal_position", (table,))
+    fields, select = [], []
+    for column, data_type in cursor.fetchall():
+        fields.append(pa.field(column, PG_TO_ARROW.get(data_type, pa.string())))
+        if data_type == "numeric":
+            select.append(f't."{column}"::double precision')
+        elif data_type not in PG_TO_ARROW:
+            select.append(f't."{column}"::text')
+        else:
+            select.append(f't."{column}"')
+    return pa.schema(fields), ", ".join(select)
+
+
+def month_partition(cursor, table):
+    """(month expression, FROM clause) of a month-partitioned table, or None for any other table"""
+    key = PARTITION_KEYS.get(table)
+    if key is None:
+        return None
+    columns = resolve_columns(cursor, table, [key, "EventId"])
+    if key in columns:
+        month = f"to_char(t.\"{columns[key]}\", 'YYYY-MM')"
+        source = f"{table} t"
+    else:
+        # An unpartitioned eventhistory has no EventDate of its own: take its event's date
+        event = resolve_columns(cursor, "events", ["Id", "Date"])
+        month = f"to_char(e.\"{event['Date']}\", 'YYYY-MM')"
+        source = f"{table} t LEFT JOIN events e ON e.\"{event['Id']}\" = t.\"{columns['EventId']}\""
+    return f"COALESCE({month}, '{UNDATED_PARTITION}')", source
+
+
+def export_table(connection, table, out_dir, chunksize=CHUNK_SIZE, rows_per_file=ROWS_PER_FILE):
+    """Streams one table through a server-side cursor into zstd Parquet part files.
+
+    Strings are dictionary-encoded. Tables in PARTITION_KEYS are written hive-partitioned by
+    PARTITION_COLUMN. Returns (rows, part files, bytes written, partition column or None).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    with connection.cursor() as cursor:
+        schema, select = table_schema(cursor, table)
+        partition = month_partition(cursor, table)
+    string_columns = [field.name for field in schema if pa.types.is_string(field.type)]
+    source = f"{table} t"
+    partitioning = None
+    if partition is not None:
+        month, source = partition
+        select += f", {month}"
+        partition_field = pa.field(PARTITION_COLUMN, pa.string())
+        schema = schema.append(partition_field)
+        partitioning = ds.partitioning(pa.schema([partition_field]), flavor="hive")
+
+    rows = 0
+
+    def batches(cursor):
+        nonlocal rows
+        while True:
+            batch = cursor.fetchmany(chunksize)
+            if not batch:
+                return
+            columns = list(zip(*batch))
+            arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+            rows += len(batch)
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    file_format = ds.ParquetFileFormat()
+    with connection.cursor(name=f"snapshot_{table}") as cursor:
+        cursor.itersize = chunksize
+        cursor.execute(f"SELECT {select} FROM {source}")
+        ds.write_dataset(batches(cursor), out_dir, schema=schema, format=file_format,
+                         file_options=file_format.make_write_options(compression="zstd",
+                                                                     use_dictionary=string_columns),
+                         partitioning=partitioning, basename_template="part-{i}.parquet",
+                         max_rows_per_file=rows_per_file, max_rows_per_group=min(rows_per_file, chunksize),
+                         max_partitions=100_000, existing_data_behavior="overwrite_or_ignore")
+    if rows == 0:
+        # Empty table: keep one part file so the schema is still known to DuckDB
+        pq.write_table(schema.empty_table(), os.path.join(out_dir, "part-0.parquet"), compression="zstd")
+
+    paths = [os.path.join(root, name) for root, _, names in os.walk(out_dir) for name in names
+             if name.endswith(".parquet")]
+    return rows, len(paths), sum(os.path.getsize(path) for path in paths), \
+        PARTITION_COLUMN if partitioning is not None else None
+
+
+def create_snapshot(tables=None, snapshot_dir=SNAPSHOT_DIR, chunksize=CHUNK_SIZE):
+    """Exports tables (default: all) to snapshot_dir/<table>/[event_month=YYYY-MM/]part-*.parquet
+    from one consistent transaction.
+
+    Each table is written next to the old copy and swapped in when complete, so readers never see
+    a half-written table.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {"tables": {}}
+
+    exported = []
+    with db.get_connection() as connection:
+        with connection.cursor() as cursor:
+            # Every table is read from the same MVCC snapshot
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            tables = tables or snapshot_tables(cursor)
+
+        for table in tables:
+            target = os.path.join(snapshot_dir, table)
+            staging = target + ".new"
+            shutil.rmtree(staging, ignore_errors=True)
+            try:
+                start = time.perf_counter()
+                rows, files, size, partitioned_by = export_table(connection, table, staging, chunksize)
+                elapsed = max(time.perf_counter() - start, 1e-9)
+            except Exception as e:
+                shutil.rmtree(staging, ignore_errors=True)
+                print(f"❌ Error exporting {table}: {e}")
+                connection.rollback()
+                break
+
+            if os.path.exists(target):
+                shutil.rmtree(target + ".old", ignore_errors=True)
+                os.replace(target, target + ".old")
+            os.replace(staging, target)
+            shutil.rmtree(target + ".old", ignore_errors=True)
+
+            manifest["tables"][table] = {"rows": rows, "files": files, "bytes": size,
+                                         "partitioned_by": partitioned_by}
+            exported.append(table)
+            print(f"✅ Snapshot {table}: {rows} rows, {files} files, {size / 1024 / 1024:.2f} MB "
+                  f"in {elapsed:.2f}s | {rows / elapsed:,.0f} rows/s")
+        connection.rollback()
+
+    manifest["created"] = datetime.now().isoformat(timespec="seconds")
+    tmp_path = manifest_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    # Cached DuckDB results were computed from the previous snapshot
+    query_cache.invalidate_tables(exported)
+    return exported
+
+
+def get_duckdb(snapshot_dir=SNAPSHOT_DIR):
+    """In-process DuckDB with one view per snapshot table, rebuilt when the manifest changes"""
+    global _duck, _duck_manifest_mtime
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except FileNotFoundError:
+        raise RuntimeError(f"No Parquet snapshot in '{snapshot_dir}', run `python snapshot.py` first")
+
+    with _duck_lock:
+        if _duck is None:
+            _duck = duckdb.connect()
+            _duck.execute(f"SET threads TO {DUCKDB_THREADS}")
+            if DUCKDB_MEMORY_LIMIT:
+                _duck.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+            for macro in DUCKDB_MACROS:
+                _duck.execute(macro)
+        if mtime != _duck_manifest_mtime:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                tables = json.load(f)["tables"]
+            for table, info in tables.items():
+                pattern = os.path.join(snapshot_dir, table, "**", "*.parquet").replace("'", "''")
+                hive = "true" if info.get("partitioned_by") else "false"
+                _duck.execute(f"CREATE OR REPLACE VIEW {table} AS "
+                              f"SELECT * FROM read_parquet('{pattern}', hive_partitioning = {hive})")
+            _duck_manifest_mtime = mtime
+        # A cursor is a separate connection to the same database, safe to use from this thread
+        return _duck.cursor()
+
+
+def run_query(query, params=None):
+    """Runs a PostgreSQL-flavoured SELECT on the snapshot with DuckDB and returns a DataFrame.
+
+    psycopg2 placeholders are accepted: %(name)s with a dict, %s with a sequence.
+    """
+    if isinstance(params, dict):
+        query = re.sub(r"%\((\w+)\)s", r"$\1", query)
+    elif params is not None:
+        query = query.replace("%s", "?")
+    cursor = get_duckdb()
+    try:
+        return cursor.execute(query, params).df() if params is not None else cursor.execute(query).df()
+    finally:
+        cursor.close()
+
+
+def _reset_after_fork():
+    # DuckDB connections can't cross a fork; the child opens its own on first use
+    global _duck, _duck_lock, _duck_manifest_mtime
+    _duck = None
+    _duck_lock = threading.Lock()
+    _duck_manifest_mtime = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot PostgreSQL tables to Parquet for offline DuckDB analytics")
+    parser.add_argument("--tables", nargs="+", help="tables to export (default: all)")
+    parser.add_argument("--output", default=SNAPSHOT_DIR)
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    create_snapshot(args.tables, args.output, args.chunksize)
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import open3d as o3d
+
+CACHE_DIR = os.getenv("STAGE_CACHE_DIR", ".stage_cache")
+MAX_BYTES = int(os.getenv("STAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Bump when the stored layout or a cached step's code changes, so old entries stop matching
+CACHE_VERSION = 1
+HASH_BLOCK = 8 * 1024 * 1024
+
+# Entries are files named <key>.<kind>.<ext>; the directory itself is the index and file mtimes
+# are the LRU clock, so batch workers in separate processes can share the cache without a manifest.
+KINDS = {
+    o3d.geometry.PointCloud: ("points", ".npz"),
+    o3d.geometry.TriangleMesh: ("mesh", ".npz"),
+    o3d.geometry.VoxelGrid: ("voxels", ".ply"),
+}
+
+_digests = {}
+
+
+def file_digest(path):
+    """sha256 of a file's content, remembered per (path, size, mtime) within the process"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(block)
+        _digests[memo_key] = digest.hexdigest()
+    return _digests[memo_key]
+
+
+def stage_key(upstream, stage, **params):
+    """Content address of a step result: the key (or file digest) of its input plus its parameters"""
+    payload = json.dumps({"version": CACHE_VERSION, "upstream": upstream, "stage": stage, "params": params},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _path(key, geometry_type, cache_dir):
+    kind, ext = KINDS[geometry_type]
+    return os.path.join(cache_dir, f"{key}.{kind}{ext}")
+
+
+def _optional(values):
+    return np.asarray(values) if len(values) else np.empty((0, 3))
+
+
+def save_geometry(geometry, path):
+    """Point clouds and meshes as raw arrays (.npz), voxel grids as Open3D's voxel PLY"""
+    if isinstance(geometry, o3d.geometry.PointCloud):
+        np.savez(path, points=np.asarray(geometry.points), normals=_optional(geometry.normals),
+                 colors=_optional(geometry.colors))
+    elif isinstance(geometry, o3d.geometry.TriangleMesh):
+        np.savez(path, vertices=np.asarray(geometry.vertices),
+                 triangles=np.asarray(geometry.triangles).astype(np.int32),
+                 vertex_normals=_optional(geometry.vertex_normals), vertex_colors=_optional(geometry.vertex_colors))
+    elif not o3d.io.write_voxel_grid(path, geometry):
+        raise IOError(f"Could not write {path}")
+
+
+def load_geometry(path, geometry_type):
+    if geometry_type is o3d.geometry.VoxelGrid:
+        return o3d.io.read_voxel_grid(path)
+    with np.load(path) as data:
+        if geometry_type is o3d.geometry.PointCloud:
+            geometry = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(data["points"]))
+            if len(data["normals"]):
+                geometry.normals = o3d.utility.Vector3dVector(data["normals"])
+            if len(data["colors"]):
+                geometry.colors = o3d.utility.Vector3dVector(data["colors"])
+        else:
+            geometry = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(data["vertices"]),
+                                                 o3d.utility.Vector3iVector(data["triangles"]))
+            if len(data["vertex_normals"]):
+                geometry.vertex_normals = o3d.utility.Vector3dVector(data["vertex_normals"])
+            if len(data["vertex_colors"]):
+                geometry.vertex_colors = o3d.utility.Vector3dVector(data["vertex_colors"])
+    return geometry
+
+
+def get(key, geometry_type, cache_dir=CACHE_DIR):
+    """Cached geometry for key, or None. A hit refreshes the entry's position in the LRU order"""
+    path = _path(key, geometry_type, cache_dir)
+    try:
+        geometry = load_geometry(path, geometry_type)
+        os.utime(path)
+        return geometry
+    except (FileNotFoundError, OSError, ValueError, KeyError):
+        # Missing, evicted by another process meanwhile, or a damaged file: recompute
+        return None
+
+
+def put(key, geometry, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _path(key, type(geometry), cache_dir)
+    # Written under a temporary name and renamed, so readers never see a partial file
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    try:
+        save_geometry(geometry, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠ Could not cache {os.path.basename(path)}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict(max_bytes, cache_dir)
+
+
+def cached(key, geometry_type, compute, cache_dir=CACHE_DIR):
+    """Returns (geometry, hit): the cached result for key, or compute() stored under key"""
+    geometry = get(key, geometry_type, cache_dir)
+    if geometry is not None:
+        return geometry, True
+    geometry = compute()
+    put(key, geometry, cache_dir)
+    return geometry, False
+
+
+def entries(cache_dir=CACHE_DIR):
+    """[(path, size, mtime)] of finished entries, least recently used first"""
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return []
+    result = []
+    for name in names:
+        if ".tmp" in name:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        result.append((path, stat.st_size, stat.st_mtime))
+    return sorted(result, key=lambda entry: entry[2])
+
+
+def evict(max_bytes=MAX_BYTES, cache_dir=CACHE_DIR):
+    """Drops least recently used entries until the cache fits in max_bytes"""
+    cached_entries = entries(cache_dir)
+    total_bytes = sum(size for _, size, _ in cached_entries)
+    evicted = 0
+    for path, size, _ in cached_entries:
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        evicted += 1
+    return evicted
+
+
+def clear(cache_dir=CACHE_DIR):
+    return evict(0, cache_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open3D stage cache (sampling, reconstruction, voxelization)")
+    parser.add_argument("--clear", action="store_true", help="remove every cached stage result")
+    parser.add_argument("--dir", default=CACHE_DIR)
+    args = parser.parse_args()
+    if args.clear:
+        print(f"✅ Removed {clear(args.dir)} cached stage results")
+    cached_entries = entries(args.dir)
+    total_mb = sum(size for _, size, _ in cached_entries) / 1024 / 1024
+    print(f"{len(cached_entries)} entries, {total_mb:.1f} MB of {MAX_BYTES / 1024 / 1024:.0f} MB in {args.dir}")
+    if cached_entries:
+        print(f"Oldest entry last used {time.ctime(cached_entries[0][2])}")
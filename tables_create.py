@@ -1,7 +1,10 @@
+import re
+import os
+import argparse
+from datetime import date, datetime
 import psycopg2
 
-def create_tables(db_name="techno_events", user="postgres", password="0000", host="localhost", port="5432"):
-    schema = """
+SCHEMA = """
     CREATE TABLE IF NOT EXISTS countries (
       Id SERIAL PRIMARY KEY,
       Name VARCHAR(100) NOT NULL
@@ -81,18 +84,195 @@ def create_tables(db_name="techno_events", user="postgres", password="0000", hos
     CREATE INDEX IF NOT EXISTS idx_events_location ON events(LocationId);
     CREATE INDEX IF NOT EXISTS idx_events_genre ON events(GenreId);
     CREATE INDEX IF NOT EXISTS idx_users_location ON users(LocationId);
+    CREATE INDEX IF NOT EXISTS idx_eventhistory_event ON eventhistory(EventId);
+    CREATE INDEX IF NOT EXISTS idx_eventhistory_user ON eventhistory(UserId);
+    CREATE INDEX IF NOT EXISTS idx_eventartists_event ON eventartists(EventId);
+    CREATE INDEX IF NOT EXISTS idx_eventartists_artist ON eventartists(ArtistId);
+    CREATE INDEX IF NOT EXISTS idx_favoriteartists_artist ON favoriteartists(ArtistId);
+    CREATE INDEX IF NOT EXISTS idx_favoritegenres_genre ON favoritegenres(GenreId);
     """
 
+
+# Optional time-partitioned layout: events by Date and eventhistory by the date of its event, one
+# partition per month. eventhistory carries EventDate so time-bounded queries prune both tables.
+# A foreign key into a partitioned table has to include the partition key, so eventhistory references
+# events(Id, Date) and eventartists.EventId is left without a foreign key.
+PARTITIONED_EVENTS = """
+    CREATE TABLE IF NOT EXISTS events (
+      Id SERIAL,
+      Name VARCHAR(200) NOT NULL,
+      Description TEXT,
+      Date TIMESTAMP NOT NULL,
+      GenreId INTEGER REFERENCES genres(Id),
+      LocationId INTEGER REFERENCES locations(Id),
+      Venue VARCHAR(200),
+      CoverUrl TEXT,
+      PRIMARY KEY (Id, Date)
+    ) PARTITION BY RANGE (Date);
+
+    CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT;
+
+    CREATE TABLE IF NOT EXISTS eventhistory (
+      Id SERIAL,
+      UserId INTEGER REFERENCES users(Id),
+      EventId INTEGER NOT NULL,
+      EventDate TIMESTAMP NOT NULL,
+      HasAttended BOOLEAN DEFAULT FALSE,
+      IsInterested BOOLEAN DEFAULT FALSE,
+      Rate SMALLINT CHECK (rate >= 1 AND rate <= 5),
+      PRIMARY KEY (Id, EventDate),
+      FOREIGN KEY (EventId, EventDate) REFERENCES events(Id, Date)
+    ) PARTITION BY RANGE (EventDate);
+
+    CREATE TABLE IF NOT EXISTS eventhistory_default PARTITION OF eventhistory DEFAULT;
+"""
+
+# Referencing table first: an events partition can only be detached once its eventhistory rows are gone
+PARTITIONED_TABLES = ["eventhistory", "events"]
+
+
+def table_dependencies(schema=SCHEMA):
+    """Returns {table: set of tables it references} parsed from the CREATE TABLE statements"""
+    dependencies = {}
+    for table, body in re.findall(r"CREATE TABLE IF NOT EXISTS (\w+) \((.*?)\n\s*\)[^;]*;", schema, re.S):
+        referenced = set(re.findall(r"REFERENCES (\w+)\(", body))
+        referenced.discard(table)
+        dependencies[table.lower()] = {ref.lower() for ref in referenced}
+    return dependencies
+
+
+def load_levels(dependencies=None):
+    """Groups tables into levels: every table only references tables from earlier levels"""
+    if dependencies is None:
+        dependencies = table_dependencies()
+    remaining = {table: set(refs) & set(dependencies) for table, refs in dependencies.items()}
+    levels = []
+    while remaining:
+        level = sorted(table for table, refs in remaining.items() if not refs)
+        if not level:
+            raise ValueError(f"Circular foreign keys between: {', '.join(sorted(remaining))}")
+        levels.append(level)
+        for table in level:
+            del remaining[table]
+        for refs in remaining.values():
+            refs.difference_update(level)
+    return levels
+
+
+def partitioned_schema(schema=SCHEMA):
+    """SCHEMA with events and eventhistory replaced by their monthly range-partitioned versions"""
+    schema = re.sub(r"\n\s*CREATE TABLE IF NOT EXISTS (events|eventhistory) \(.*?\n\s*\);", "", schema, flags=re.S)
+    schema = schema.replace("EventId INTEGER REFERENCES events(Id)", "EventId INTEGER")
+    # Tables are created in order, so the partitioned pair goes right after users
+    users_end = schema.index(");", schema.index("CREATE TABLE IF NOT EXISTS users")) + 2
+    return schema[:users_end] + "\n\n" + PARTITIONED_EVENTS.strip("\n") + schema[users_end:]
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def month_range(first, last):
+    """First day of every month from first to last, inclusive"""
+    month = date(first.year, first.month, 1)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def ensure_partitions(cursor, table, first, last):
+    """Creates the monthly partitions of table covering first..last that don't exist yet.
+
+    Run it before loading rows: a partition can't be created while the default partition holds rows
+    of its range. Existing partitions are looked up in the catalog within the caller's transaction,
+    so partitions created by a transaction that was rolled back are created again next time.
+    """
+    months = list(month_range(first, last))
+    names = [partition_name(table, month) for month in months]
+    cursor.execute("SELECT relname FROM pg_class WHERE relname = ANY(%s) "
+                   "AND relnamespace = 'public'::regnamespace", (names,))
+    existing = {row[0] for row in cursor.fetchall()}
+    created = []
+    for month, name in zip(months, names):
+        if name in existing:
+            continue
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                       f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')")
+        created.append(name)
+    return created
+
+
+def detach_partitions(cursor, table, before, archive_dir=None):
+    """Detaches every monthly partition of table that ends on or before `before`.
+
+    Detached partitions stay as plain tables; with archive_dir they are written to
+    archive_dir/<partition>.csv and dropped. Returns the partition names.
+    """
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass ORDER BY c.relname
+    """, (table,))
+    detached = []
+    for (name,) in cursor.fetchall():
+        match = re.fullmatch(rf"{table}_p(\d{{4}})(\d{{2}})", name)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if next_month(month) > before:
+            continue
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            with open(os.path.join(archive_dir, f"{name}.csv"), "w", encoding="utf-8", newline="") as f:
+                cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+            cursor.execute(f"DROP TABLE {name}")
+        detached.append(name)
+    return detached
+
+
+def create_tables(db_name="techno_events", user="postgres", password="0000", host="localhost", port="5432",
+                  partitioned=False):
     try:
         conn = psycopg2.connect(dbname=db_name, user=user, password=password, host=host, port=port)
         cursor = conn.cursor()
-        cursor.execute(schema)
+        cursor.execute(partitioned_schema() if partitioned else SCHEMA)
         conn.commit()
         cursor.close()
         conn.close()
-        print("Tables created successfully.")
+        print("Tables created successfully." + (" (events/eventhistory partitioned by month)" if partitioned else ""))
     except Exception as e:
         print("Error creating tables:", e)
 
+
+def detach_old_partitions(before, archive_dir=None, db_name="techno_events", user="postgres", password="0000",
+                          host="localhost", port="5432"):
+    try:
+        conn = psycopg2.connect(dbname=db_name, user=user, password=password, host=host, port=port)
+        cursor = conn.cursor()
+        for table in PARTITIONED_TABLES:
+            detached = detach_partitions(cursor, table, before, archive_dir)
+            conn.commit()
+            action = f"archived to {archive_dir}" if archive_dir else "detached"
+            print(f"✅ {table}: {len(detached)} partitions {action}" + (f" ({', '.join(detached)})" if detached else ""))
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        print("Error detaching partitions:", e)
+
 if __name__ == "__main__":
-    create_tables()
+    parser = argparse.ArgumentParser(description="Create the techno events tables")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="range-partition events and eventhistory by month")
+    parser.add_argument("--detach-before", metavar="YYYY-MM-DD",
+                        help="instead of creating tables, detach partitions that end on or before this date")
+    parser.add_argument("--archive", metavar="DIR", help="with --detach-before: write detached partitions "
+                                                         "to DIR as CSV and drop them")
+    args = parser.parse_args()
+    if args.detach_before:
+        detach_old_partitions(datetime.strptime(args.detach_before, "%Y-%m-%d").date(), args.archive)
+    else:
+        create_tables(partitioned=args.partitioned)